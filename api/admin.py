@@ -1,10 +1,22 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import path, reverse
 from django.utils import timezone
-from .models import Service, Doctor, Appointment
+from .booking import find_conflicts
+from .daily_schedule import refresh_days
+from .models import Service, Doctor, Appointment, ArchivedAppointment
+from .search import search
+from .stats import dashboard, month_start, record as record_stats, status_change
+from .transfer import REPORT_FORMATS, iter_report
 from django.contrib import messages
+from django.db import connection, transaction
+from django.db.models import Count
 import json
+from datetime import datetime, timedelta
 from django.contrib.admin import AdminSite
 
 class CustomAdminSite(AdminSite):
@@ -49,10 +61,15 @@ class ServiceAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     list_editable = ['price', 'duration', 'is_active']
 
+    def get_queryset(self, request):
+        # Количество записей считается в том же запросе, а не по запросу на строку
+        return super().get_queryset(request).annotate(appointments_count=Count('appointment'))
+
     def get_appointments_count(self, obj):
-        return obj.appointment_set.count()
+        return obj.appointments_count
 
     get_appointments_count.short_description = 'Кол-во записей'
+    get_appointments_count.admin_order_field = 'appointments_count'
 
 
 @admin.register(Doctor)
@@ -78,12 +95,16 @@ class DoctorAdmin(admin.ModelAdmin):
 
     get_photo_preview.short_description = 'Предпросмотр фото'
 
+    def get_queryset(self, request):
+        # Количество записей считается в том же запросе, а не по запросу на строку
+        return super().get_queryset(request).annotate(appointments_count=Count('appointment'))
+
     def get_appointments_count(self, obj):
-        count = obj.appointment_set.count()
         url = reverse('admin:api_appointment_changelist') + f'?doctor__id__exact={obj.id}'
-        return format_html('<a href="{}">{}</a>', url, count)
+        return format_html('<a href="{}">{}</a>', url, obj.appointments_count)
 
     get_appointments_count.short_description = 'Записей'
+    get_appointments_count.admin_order_field = 'appointments_count'
 
 
 @admin.register(Appointment)
@@ -98,11 +119,12 @@ class AppointmentAdmin(admin.ModelAdmin):
         'get_status_display',
         'created_at'
     ]
+    list_select_related = ['doctor', 'service']
     list_filter = [StatusFilter, 'status', 'date', 'doctor', 'service']
     search_fields = ['patient_name', 'patient_phone', 'patient_email', 'doctor__name']
     readonly_fields = ['created_at', 'updated_at', 'get_timeline']
     date_hierarchy = 'date'
-    actions = ['confirm_selected', 'cancel_selected', 'mark_completed']
+    actions = ['confirm_selected', 'cancel_selected', 'mark_completed', 'export_csv', 'export_xlsx']
 
     fieldsets = (
         ('Данные пациента', {
@@ -148,33 +170,129 @@ class AppointmentAdmin(admin.ModelAdmin):
 
     get_timeline.short_description = 'Таймлайн'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по FTS5-индексу (api/search.py) вместо LIKE по search_fields
+        if connection.vendor != 'sqlite' or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return search(queryset, search_term), False
+
     # Действия массового редактирования
+    def update_status(self, queryset, status):
+        """
+        Меняет статус записей; возвращает (число измененных, пропущенные записи).
+        Отмененные и завершенные записи, которые снова займут время, проверяются
+        на пересечения как при записи на прием (``find_conflicts``); пересекающиеся
+        пропускаются.
+        """
+        # update() не отправляет post_save - расписание по дням и статистику
+        # обновляем сами, затронутые записи группируем до update
+        with transaction.atomic():
+            skipped = []
+            if status in Appointment.ACTIVE_STATUSES:
+                reactivated = list(queryset.exclude(status__in=Appointment.ACTIVE_STATUSES).only(
+                    'patient_name', 'doctor_id', 'service_id', 'date', 'time', 'end_time', 'status',
+                ).order_by('date', 'time', 'pk'))
+                for appointment in reactivated:
+                    appointment.status = status
+                skipped = [reactivated[index] for index in find_conflicts(reactivated)]
+                if skipped:
+                    queryset = queryset.exclude(pk__in=[appointment.pk for appointment in skipped])
+            changes = status_change(queryset, status)
+            updated = queryset.update(status=status)
+            refresh_days((values['doctor_id'], values['date']) for values, _ in changes)
+            record_stats(changes)
+        return updated, skipped
+
+    def change_status(self, request, queryset, status, message, level):
+        updated, skipped = self.update_status(queryset, status)
+        self.message_user(request, f'{updated} {message}', level)
+        if skipped:
+            self.message_user(request, 'Время уже занято, записи пропущены: ' + '; '.join(
+                f'{a.patient_name} ({a.date:%d.%m.%Y} {a.time:%H:%M})' for a in skipped
+            ), messages.ERROR)
+
     def confirm_selected(self, request, queryset):
-        updated = queryset.update(status='confirmed')
-        self.message_user(request, f'{updated} записей подтверждено.', messages.SUCCESS)
+        self.change_status(request, queryset, 'confirmed', 'записей подтверждено.', messages.SUCCESS)
 
     confirm_selected.short_description = 'Подтвердить выбранные записи'
 
     def cancel_selected(self, request, queryset):
-        updated = queryset.update(status='cancelled')
-        self.message_user(request, f'{updated} записей отменено.', messages.WARNING)
+        self.change_status(request, queryset, 'cancelled', 'записей отменено.', messages.WARNING)
 
     cancel_selected.short_description = 'Отменить выбранные записи'
 
     def mark_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
-        self.message_user(request, f'{updated} записей отмечено как завершенные.', messages.INFO)
+        self.change_status(request, queryset, 'completed', 'записей отмечено как завершенные.', messages.INFO)
 
     mark_completed.short_description = 'Отметить как завершенные'
 
+    # Выгрузка в CSV/XLSX
+    def export_response(self, queryset, fmt):
+        _, content_type = REPORT_FORMATS[fmt]
+        response = StreamingHttpResponse(iter_report(queryset, fmt), content_type=content_type)
+        filename = f'appointments_{timezone.localdate():%Y-%m-%d}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.action(description='Выгрузить выбранные записи в CSV', permissions=['view'])
+    def export_csv(self, request, queryset):
+        return self.export_response(queryset, 'csv')
+
+    @admin.action(description='Выгрузить выбранные записи в Excel (XLSX)', permissions=['view'])
+    def export_xlsx(self, request, queryset):
+        return self.export_response(queryset, 'xlsx')
+
+    def get_urls(self):
+        urls = [
+            path('export/', self.admin_site.admin_view(self.export_view), name='api_appointment_export'),
+            path('stats/', self.admin_site.admin_view(self.stats_view), name='api_appointment_stats'),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        """Выгрузка всего списка с текущими фильтрами, поиском и date_hierarchy."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        # format - не фильтр списка, ChangeList его не знает
+        request.GET = request.GET.copy()
+        fmt = request.GET.pop('format', ['csv'])[-1]
+        if fmt not in REPORT_FORMATS:
+            return HttpResponseBadRequest('Неизвестный формат выгрузки')
+
+        try:
+            changelist = self.get_changelist_instance(request)
+        except IncorrectLookupParameters:
+            return HttpResponseRedirect(reverse('admin:api_appointment_changelist') + '?e=1')
+        return self.export_response(changelist.queryset, fmt)
+
+    def stats_view(self, request):
+        """Статистика за месяц (``?month=2030-01``) - только из сводных таблиц, см. api/stats.py."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        try:
+            month = datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+        except ValueError:
+            month = month_start(timezone.localdate())
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Статистика записей за {month:%m.%Y}',
+            'opts': self.model._meta,
+            'previous_month': month_start(month - timedelta(days=1)),
+            'next_month': month_start(month + timedelta(days=31)),
+            **dashboard(month),
+        }
+        return TemplateResponse(request, 'admin/api/appointment/stats.html', context)
+
     # Валидация при сохранении
     def save_model(self, request, obj, form, change):
-        # Проверяем, не занято ли время у врача
-        if change and 'date' in form.changed_data or 'time' in form.changed_data:
-            conflicting = Appointment.objects.filter(
-                doctor=obj.doctor,
-                date=obj.date,
-                time=obj.time
+        # Проверяем, не пересекается ли прием с другими записями врача
+        fields = {'doctor', 'service', 'date', 'time', 'status'}
+        if obj.status in Appointment.ACTIVE_STATUSES and (not change or fields & set(form.changed_data)):
+            conflicting = Appointment.objects.overlapping(
+                obj.doctor, obj.date, obj.time, obj.compute_end_time()
             ).exclude(pk=obj.pk)
 
             if conflicting.exists():
@@ -187,6 +305,29 @@ class AppointmentAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    """Архив записей (см. api/archive.py) - только просмотр и поиск."""
+    list_display = ['patient_name', 'patient_phone', 'doctor', 'service', 'date', 'time', 'get_status_display']
+    list_select_related = ['doctor', 'service']
+    list_filter = ['status', 'doctor', 'service']
+    search_fields = ['patient_name', 'patient_phone', 'patient_email', 'doctor__name']
+    date_hierarchy = 'date'
+    # Архив большой: без второго COUNT(*) по всей таблице при поиске и фильтрах
+    show_full_result_count = False
+
+    get_status_display = AppointmentAdmin.get_status_display
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Настройка админ-панели
 admin.site.site_header = 'Панель управления стоматологической клиникой'
 admin.site.site_title = 'Стоматология "Улыбка"'
@@ -0,0 +1,71 @@
+"""
+Перенос старых записей в архив (``ArchivedAppointment``).
+
+Завершенные и отмененные записи старше горизонта переносятся пачками, самые
+старые первыми: id пачки берутся по индексу ``(status, date, time)`` без
+сортировки всей выборки, каждая пачка - одна короткая транзакция
+``INSERT ... SELECT`` в архив и ``DELETE`` из ``Appointment``, без загрузки
+объектов. Прерванный перенос продолжается с того же места: перенесенные
+пачки уже закоммичены, а оставшиеся записи снова подходят под условие.
+
+Сигналы не отправляются. Статистика (``api/stats.py``) учитывает и архив,
+поэтому сводные таблицы не меняются; строки ``DoctorDay`` затронутых дней
+удаляются и строятся заново при чтении уже без архивных записей.
+"""
+from django.db import connections, router, transaction
+from django.db.models import DateTimeField, Value
+from django.utils import timezone
+
+from .daily_schedule import forget_days
+from .models import Appointment, ArchivedAppointment
+
+# Статусы, которые переносятся в архив: запись уже ничего не занимает
+ARCHIVE_STATUSES = ('completed', 'cancelled')
+
+
+def archivable(before, statuses=ARCHIVE_STATUSES):
+    """Записи, которые переносятся в архив: раньше даты ``before``."""
+    # Активные записи занимают время - из архива их не видят проверки пересечений
+    if not set(statuses) <= set(ARCHIVE_STATUSES):
+        raise ValueError(f'В архив переносятся только статусы {", ".join(ARCHIVE_STATUSES)}')
+    return Appointment.objects.filter(date__lt=before, status__in=statuses).order_by()
+
+
+def archive_batch(before, batch_size, statuses=ARCHIVE_STATUSES):
+    """Переносит в архив до ``batch_size`` самых старых записей; возвращает их число."""
+    connection = connections[router.db_for_write(Appointment)]
+    quote = connection.ops.quote_name
+    fields = [field.name for field in Appointment._meta.concrete_fields]
+    columns = ', '.join(
+        quote(ArchivedAppointment._meta.get_field(name).column) for name in [*fields, 'archived_at']
+    )
+
+    with transaction.atomic(using=connection.alias):
+        ids = []
+        # По одному статусу: с status IN (...) SQLite сортирует все подходящие записи
+        for status in statuses:
+            ids += archivable(before, [status]).order_by('date', 'time').values_list(
+                'pk', flat=True,
+            )[:batch_size - len(ids)]
+            if len(ids) >= batch_size:
+                break
+        if not ids:
+            return 0
+        batch = Appointment.objects.filter(pk__in=ids)
+        days = set(batch.values_list('doctor_id', 'date').distinct())
+
+        rows = batch.annotate(
+            archived=Value(timezone.now(), output_field=DateTimeField()),
+        ).values_list(*fields, 'archived')
+        select_sql, select_params = rows.query.sql_with_params()
+        ids_sql, ids_params = batch.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(ArchivedAppointment._meta.db_table)} ({columns}) {select_sql}', select_params,
+            )
+            cursor.execute(
+                f'DELETE FROM {quote(Appointment._meta.db_table)} WHERE {quote(Appointment._meta.pk.column)} '
+                f'IN ({ids_sql})', ids_params,
+            )
+        forget_days(days)
+    return len(ids)
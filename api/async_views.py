@@ -0,0 +1,125 @@
+"""
+Async-версии публичных эндпоинтов каталога и записи на прием для ASGI.
+
+DRF не умеет async-представления, поэтому здесь обычные async-функции
+Django с теми же URL, ответами и заголовками, что у представлений из
+``api/views.py`` (какие из них подключаются, решает ``settings.ASYNC_API``).
+
+Частый путь - ответ каталога из кэша или 304 - не занимает поток: версия
+каталога и JSON берутся из кэша асинхронно. Страницы ``/api/services/`` и
+``/api/doctors/`` при промахе кэша строит синхронное DRF-представление в
+потоке (пагинация, ``?fields=`` и ошибки валидации остаются одни), а
+``/api/catalog/`` читается async-ORM.
+
+Запись: данные проверяет тот же сериализатор (в потоке), занятое время
+отсекается async-запросом ``aexists()``, а сама вставка идет через
+``claim_slot`` - транзакции в async-ORM нет, проверка и вставка должны
+выполняться в одной транзакции в потоке.
+"""
+import json
+from datetime import date as datetime_date
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from rest_framework import serializers
+
+from .booking import BOOKING_SUCCESS_MESSAGE, SLOT_UNAVAILABLE_MESSAGE, SlotUnavailable
+from .catalog import aget_cached_catalog_json, aget_catalog_json, aget_catalog_state, arender_bootstrap
+from .models import Appointment
+from .serializers import AppointmentCreateSerializer
+from .views import (
+    CatalogPageMixin, DoctorList, ServiceList,
+    catalog_validators, catalog_variant, set_catalog_headers,
+)
+
+
+async def _catalog_response(request, kind, variant_params, build, origin=False):
+    """
+    Ответ каталога с ETag/Last-Modified. ``build(state, variant)`` - корутина,
+    которая возвращает HttpResponse при промахе кэша.
+    """
+    state = await aget_catalog_state()
+    variant = catalog_variant(request, request.GET, variant_params, origin)
+    etag, last_modified = catalog_validators(kind, state, variant)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content = await aget_cached_catalog_json(kind, state, variant)
+        if content is None:
+            # Синхронное представление само строит ответ, кладет его в кэш
+            # и ставит заголовки (или возвращает ошибку валидации)
+            return await build(state, variant)
+        response = HttpResponse(content, content_type='application/json')
+    return set_catalog_headers(response, etag, last_modified)
+
+
+def _page_view(view_class):
+    sync_view = view_class.as_view()
+
+    @require_safe
+    async def view(request):
+        async def build(state, variant):
+            return await sync_to_async(sync_view)(request)
+
+        return await _catalog_response(
+            request, view_class.catalog_kind, CatalogPageMixin.variant_params, build, CatalogPageMixin.origin_dependent,
+        )
+
+    view.__name__ = view_class.__name__
+    return view
+
+
+service_list = _page_view(ServiceList)
+doctor_list = _page_view(DoctorList)
+
+
+@require_safe
+async def catalog_bootstrap(request):
+    async def build(state, variant):
+        content = await aget_catalog_json('bootstrap', lambda: arender_bootstrap(state), state)
+        etag, last_modified = catalog_validators('bootstrap', state)
+        return set_catalog_headers(HttpResponse(content, content_type='application/json'), etag, last_modified)
+
+    return await _catalog_response(request, 'bootstrap', (), build)
+
+
+def _json(data, status):
+    # Без \uXXXX, как у JSONRenderer DRF
+    return JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _booking_error(message):
+    # Тот же формат, что у AppointmentCreate
+    return _json({'error': str(serializers.ValidationError(message))}, 400)
+
+
+@csrf_exempt
+@require_POST
+async def appointment_create(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return _json({'detail': 'Некорректный JSON.'}, 400)
+
+    serializer = AppointmentCreateSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return _json(serializer.errors, 400)
+
+    fields = serializer.validated_data
+    if fields['date'] < datetime_date.today():
+        return _booking_error("Нельзя записаться на прошедшую дату.")
+
+    # Быстрый отказ без транзакции; окончательную проверку делает claim_slot
+    end_time = Appointment(service=fields['service'], date=fields['date'], time=fields['time']).compute_end_time()
+    if await Appointment.objects.overlapping(fields['doctor'], fields['date'], fields['time'], end_time).aexists():
+        return _booking_error(SLOT_UNAVAILABLE_MESSAGE)
+
+    try:
+        await sync_to_async(serializer.save)(status='pending')
+    except SlotUnavailable as e:
+        return _booking_error(str(e))
+
+    return _json({'message': BOOKING_SUCCESS_MESSAGE}, 201)
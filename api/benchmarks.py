@@ -0,0 +1,203 @@
+"""
+Общие помощники для команд-бенчмарков (``bench_*``).
+
+Данные создаются внутри транзакции, которая в конце откатывается
+(``api.db.rolled_back``), так что бенчмарк можно запускать на рабочей базе,
+не оставляя в ней следов.
+
+``asgi_request`` вызывает ASGI-приложение напрямую, без сервера и сети -
+так нагрузочные бенчмарки меряют только Django и базу. ``run_clients``
+запускает одновременных клиентов, ``summarize`` считает по их задержкам
+перцентили, а ``compare`` сравнивает результаты с базовыми (``bench_endpoints``).
+"""
+import asyncio
+import random
+import statistics
+import time as clock
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, Doctor, Service
+from .working_hours import compile_working_hours
+
+WORKING_HOURS = {
+    'пн': '09:00-18:00',
+    'вт': '09:00-18:00',
+    'ср': '09:00-18:00',
+    'чт': '09:00-18:00',
+    'пт': '09:00-18:00',
+    'сб': '10:00-16:00',
+    'вс': 'выходной'
+}
+
+# Сетка записей при заполнении: 09:00-18:00 по 30 минут
+SEED_DAY_START = 9 * 60
+SEED_SLOT = 30
+SEED_SLOTS_PER_DAY = 18
+
+STATUS_WEIGHTS = {'pending': 15, 'confirmed': 35, 'cancelled': 10, 'completed': 40}
+
+
+def seed_catalog(services=10, doctors=20, rng=None):
+    rng = rng or random.Random(0)
+    created_services = Service.objects.bulk_create([
+        Service(name=f'Бенчмарк: услуга {i}', price=rng.randint(5, 200) * 100, duration=30)
+        for i in range(services)
+    ])
+    compiled = compile_working_hours(WORKING_HOURS)
+    created_doctors = Doctor.objects.bulk_create([
+        Doctor(
+            name=f'Бенчмарк: врач {i}', specialty=rng.choice(['Терапевт', 'Хирург', 'Ортодонт']),
+            working_hours=WORKING_HOURS, compiled_schedule=compiled,
+        )
+        for i in range(doctors)
+    ])
+    Doctor.services.through.objects.bulk_create([
+        Doctor.services.through(doctor_id=doctor.id, service_id=service.id)
+        for doctor in created_doctors
+        for service in rng.sample(created_services, min(3, len(created_services)))
+    ])
+    return created_services, created_doctors
+
+
+def iter_seed_appointments(doctors, services, count, rng=None, start=None):
+    """
+    Генерирует ``count`` записей без пересечений: врачи по кругу, у каждого
+    подряд идущие 30-минутные слоты, дни - от ``start`` вперед.
+    """
+    rng = rng or random.Random(0)
+    start = start or timezone.localdate() - timedelta(days=365)
+    statuses, weights = zip(*STATUS_WEIGHTS.items())
+
+    for index in range(count):
+        doctor = doctors[index % len(doctors)]
+        slot = index // len(doctors)
+        minutes = SEED_DAY_START + (slot % SEED_SLOTS_PER_DAY) * SEED_SLOT
+        yield Appointment(
+            patient_name=f'Пациент {index}',
+            patient_phone=f'+996{rng.randint(500000000, 799999999)}',
+            doctor=doctor,
+            service=rng.choice(services),
+            date=start + timedelta(days=slot // SEED_SLOTS_PER_DAY),
+            time=time(minutes // 60, minutes % 60),
+            end_time=time((minutes + SEED_SLOT) // 60, (minutes + SEED_SLOT) % 60),
+            status=rng.choices(statuses, weights)[0],
+        )
+
+
+def seed_appointments(doctors, services, count, rng=None, batch_size=5000):
+    batch = []
+    for appointment in iter_seed_appointments(doctors, services, count, rng):
+        batch.append(appointment)
+        if len(batch) >= batch_size:
+            Appointment.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Appointment.objects.bulk_create(batch)
+
+
+async def asgi_request(app, method, path, query='', body=b'', headers=()):
+    """Один HTTP-запрос к ASGI-приложению; возвращает (статус, тело)."""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'content-length', str(len(body)).encode()), *headers],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # Клиент не отключается, пока ответ не отправлен
+        await response_done.wait()
+        return {'type': 'http.disconnect'}
+
+    status = None
+    chunks = []
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                response_done.set()
+
+    await app(scope, receive, send)
+    return status, b''.join(chunks)
+
+
+async def run_clients(send, clients, per_client):
+    """
+    ``clients`` одновременных клиентов, каждый делает ``per_client`` запросов
+    подряд; ``await send(номер запроса)`` возвращает HTTP-статус.
+    Возвращает (общее время, [(задержка, статус), ...]).
+    """
+    results = []
+
+    async def client(number):
+        for request_index in range(per_client):
+            started = clock.perf_counter()
+            status = await send(number * per_client + request_index)
+            results.append((clock.perf_counter() - started, status))
+
+    started = clock.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    return clock.perf_counter() - started, results
+
+
+def summarize(elapsed, results):
+    """Запросов в секунду, p50/p95/p99 в миллисекундах и число ответов с ошибкой."""
+    latencies = [latency * 1000 for latency, _ in results]
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    else:
+        quantiles = latencies * 99
+    return {
+        'rps': round(len(results) / elapsed, 1),
+        'p50_ms': round(quantiles[49], 2),
+        'p95_ms': round(quantiles[94], 2),
+        'p99_ms': round(quantiles[98], 2),
+        'errors': sum(1 for _, status in results if status >= 400),
+    }
+
+
+# Разница задержки меньше этой не считается регрессией: шум измерения
+MIN_LATENCY_DELTA_MS = 1.0
+
+
+def compare(results, baseline, tolerance):
+    """
+    Регрессии ``results`` относительно ``baseline`` (оба - {сценарий: summarize()
+    + 'queries'}): задержка p95 или пропускная способность хуже больше чем на
+    долю ``tolerance``, больше SQL-запросов или ошибок. Возвращает список строк.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        p95, base_p95 = current['p95_ms'], base['p95_ms']
+        if p95 > base_p95 * (1 + tolerance) and p95 - base_p95 > MIN_LATENCY_DELTA_MS:
+            regressions.append(f'{name}: p95 {base_p95} -> {p95} мс')
+        if current['rps'] < base['rps'] / (1 + tolerance):
+            regressions.append(f'{name}: запр/с {base["rps"]} -> {current["rps"]}')
+        if current['queries'] > base['queries']:
+            regressions.append(f'{name}: SQL-запросов {base["queries"]} -> {current["queries"]}')
+        if current['errors'] > base['errors']:
+            regressions.append(f'{name}: ошибок {base["errors"]} -> {current["errors"]}')
+    return regressions
@@ -0,0 +1,117 @@
+"""
+Атомарное занятие времени врача.
+
+Проверка пересечений и вставка записи выполняются в одной транзакции.
+SQLite открывает ее как ``BEGIN IMMEDIATE`` (см. ``transaction_mode`` в
+настройках БД), поэтому конкурентные записи на одно время выполняются
+строго по очереди и проигравший получает ``SlotUnavailable``, а не
+``IntegrityError``. Частичный уникальный индекс по активным статусам
+страхует от двойной записи на одно и то же время начала.
+
+Пачка записей (``claim_slots``) проверяется одним запросом на все врачи и
+даты пачки и сохраняется одним ``bulk_create`` - все или ничего.
+
+Обе транзакции выполняются в потоке записи (``api/write_queue.py``), по
+одной на процесс.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from . import write_queue
+from .daily_schedule import refresh_days
+from .models import Appointment
+from .stats import record as record_stats
+
+SLOT_UNAVAILABLE_MESSAGE = "Это время уже занято у доктора. Пожалуйста, выберите другое время."
+
+BOOKING_SUCCESS_MESSAGE = "Запись успешно отправлена! Наш администратор свяжется с вами для подтверждения."
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+class SlotsUnavailable(SlotUnavailable):
+    """Часть записей пачки пересекается с занятым временем; ``indexes`` - их номера."""
+
+    def __init__(self, indexes):
+        super().__init__(SLOT_UNAVAILABLE_MESSAGE)
+        self.indexes = indexes
+
+
+def claim_slot(**fields):
+    """Создает запись, если время врача свободно, иначе бросает SlotUnavailable."""
+    appointment = Appointment(**fields)
+    return write_queue.run(_save_if_free, appointment, appointment.compute_end_time())
+
+
+def _save_if_free(appointment, end_time):
+    try:
+        with transaction.atomic():
+            if appointment.status in Appointment.ACTIVE_STATUSES and Appointment.objects.overlapping(
+                appointment.doctor, appointment.date, appointment.time, end_time
+            ).exists():
+                raise SlotUnavailable(SLOT_UNAVAILABLE_MESSAGE)
+            appointment.save()
+    except IntegrityError:
+        raise SlotUnavailable(SLOT_UNAVAILABLE_MESSAGE)
+
+    return appointment
+
+
+def find_conflicts(appointments):
+    """
+    Номера записей (с заполненным ``end_time``), которые пересекаются с
+    активными записями в базе или с предыдущими записями того же списка.
+    Занятое время всех врачей и дат читается одним запросом.
+    """
+    active = [a for a in appointments if a.status in Appointment.ACTIVE_STATUSES]
+    if not active:
+        return []
+
+    busy = defaultdict(list)
+    taken = Appointment.objects.active().filter(
+        doctor_id__in={a.doctor_id for a in active},
+        date__in={a.date for a in active},
+    ).order_by().values_list('doctor_id', 'date', 'time', 'end_time')
+    for doctor_id, date, start, end in taken:
+        busy[doctor_id, date].append((start, end))
+
+    conflicts = []
+    for index, appointment in enumerate(appointments):
+        if appointment.status not in Appointment.ACTIVE_STATUSES:
+            continue
+        intervals = busy[appointment.doctor_id, appointment.date]
+        if any(start < appointment.end_time and end > appointment.time for start, end in intervals):
+            conflicts.append(index)
+        else:
+            intervals.append((appointment.time, appointment.end_time))
+    return conflicts
+
+
+def claim_slots(appointments):
+    """
+    Создает все записи одной транзакцией или ни одной. Если время части
+    записей занято, бросает SlotsUnavailable с их номерами.
+    """
+    # bulk_create не вызывает save()
+    for appointment in appointments:
+        appointment.end_time = appointment.compute_end_time()
+    return write_queue.run(_create_if_free, appointments)
+
+
+def _create_if_free(appointments):
+    try:
+        with transaction.atomic():
+            conflicts = find_conflicts(appointments)
+            if conflicts:
+                raise SlotsUnavailable(conflicts)
+            Appointment.objects.bulk_create(appointments)
+            # bulk_create не отправляет post_save
+            refresh_days((a.doctor_id, a.date) for a in appointments)
+            record_stats((a.tracked_values(), 1) for a in appointments)
+    except IntegrityError:
+        raise SlotUnavailable(SLOT_UNAVAILABLE_MESSAGE)
+
+    return appointments
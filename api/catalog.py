@@ -0,0 +1,162 @@
+"""
+Кэш публичного каталога услуг и врачей.
+
+Каталог меняется редко, поэтому ответы ``ServiceList``/``DoctorList``/
+``CatalogBootstrap`` хранятся в кэше уже сериализованными в JSON. При любом изменении услуг и
+врачей сигналы (см. ``api/signals.py``) увеличивают ``CatalogVersion``;
+ключи кэша содержат версию, так что старые ответы просто перестают
+использоваться. Версия и время изменения каталога сами лежат в кэше, но
+только ``STATE_TIMEOUT`` секунд: кэш по умолчанию (LocMemCache) у каждого
+воркера свой, и изменение сбрасывает версию только в воркере, который его
+сохранил. Остальные увидят новую версию (и перестанут отвечать 304 на
+старый ETag) не позже чем через ``STATE_TIMEOUT``. Попадание в кэш не
+делает ни одного запроса к БД.
+
+Функции с префиксом ``a`` - то же для async-представлений (``api/async_views.py``).
+"""
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Service, Doctor, CatalogVersion
+from .serializers import CatalogServiceSerializer, CatalogDoctorSerializer
+
+STATE_KEY = 'catalog:state'
+
+# Ключи ответов содержат версию каталога, таймаут - только уборка старых версий
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# Сколько воркер может не замечать изменение каталога в другом воркере
+STATE_TIMEOUT = 5
+
+
+def active_services():
+    return Service.objects.filter(is_active=True)
+
+
+def _bootstrap_querysets():
+    links = Doctor.services.through.objects.filter(
+        doctor__is_active=True, service__is_active=True
+    ).values_list('doctor_id', 'service_id')
+    return active_services(), Doctor.objects.filter(is_active=True), links
+
+
+def _bootstrap_payload(state, services, doctors, links):
+    doctor_services = {}
+    for doctor_id, service_id in links:
+        doctor_services.setdefault(str(doctor_id), []).append(service_id)
+
+    return {
+        'version': state['version'],
+        'services': CatalogServiceSerializer(services, many=True).data,
+        'doctors': CatalogDoctorSerializer(doctors, many=True).data,
+        'doctor_services': doctor_services,
+    }
+
+
+def render_bootstrap(state):
+    """Все, что нужно главной странице и форме записи, одним ответом."""
+    return _bootstrap_payload(state, *_bootstrap_querysets())
+
+
+async def arender_bootstrap(state):
+    services, doctors, links = _bootstrap_querysets()
+    return _bootstrap_payload(
+        state,
+        [service async for service in services],
+        [doctor async for doctor in doctors],
+        [link async for link in links],
+    )
+
+
+def get_catalog_state():
+    """{'version': int, 'updated_at': datetime} текущей версии каталога."""
+    state = cache.get(STATE_KEY)
+    if state is None:
+        row, _ = CatalogVersion.objects.get_or_create(pk=1)
+        state = {'version': row.version, 'updated_at': row.updated_at}
+        cache.set(STATE_KEY, state, STATE_TIMEOUT)
+    return state
+
+
+async def _cache_aget(key):
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    # LocMemCache - словарь процесса под коротким threading.Lock, читать его
+    # из цикла событий безопасно. Его aget() в Django - sync_to_async(get),
+    # то есть лишний переход в поток на каждом запросе
+    if isinstance(backend, LocMemCache):
+        return backend.get(key)
+    return await backend.aget(key)
+
+
+async def _cache_aset(key, value, timeout):
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, LocMemCache):
+        backend.set(key, value, timeout)
+    else:
+        await backend.aset(key, value, timeout)
+
+
+async def aget_catalog_state():
+    state = await _cache_aget(STATE_KEY)
+    if state is None:
+        row, _ = await CatalogVersion.objects.aget_or_create(pk=1)
+        state = {'version': row.version, 'updated_at': row.updated_at}
+        await _cache_aset(STATE_KEY, state, STATE_TIMEOUT)
+    return state
+
+
+def bump_catalog_version():
+    updated = CatalogVersion.objects.filter(pk=1).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    cache.delete(STATE_KEY)
+
+
+def forget_catalog_state():
+    cache.delete(STATE_KEY)
+
+
+def invalidate_catalog():
+    # Версию из кэша сбрасываем еще раз после коммита: иначе параллельный
+    # запрос успеет закэшировать версию, прочитанную до фиксации транзакции
+    bump_catalog_version()
+    transaction.on_commit(forget_catalog_state)
+
+
+def get_catalog_json(kind, render, state=None, variant=''):
+    """
+    JSON ответа каталога из кэша; при промахе вызывает ``render()``.
+
+    ``variant`` различает ответы одного вида (страница, набор полей).
+    """
+    state = state or get_catalog_state()
+    key = catalog_key(kind, state, variant)
+    content = cache.get(key)
+    if content is None:
+        content = JSONRenderer().render(render())
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
+
+
+def catalog_key(kind, state, variant=''):
+    return f'catalog:{kind}:{state["version"]}:{variant}'
+
+
+async def aget_cached_catalog_json(kind, state, variant=''):
+    """JSON ответа из кэша или None - без построения ответа."""
+    return await _cache_aget(catalog_key(kind, state, variant))
+
+
+async def aget_catalog_json(kind, arender, state, variant=''):
+    """Как ``get_catalog_json``, ``arender()`` - корутина."""
+    content = await aget_cached_catalog_json(kind, state, variant)
+    if content is None:
+        content = JSONRenderer().render(await arender())
+        await _cache_aset(catalog_key(kind, state, variant), content, CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,126 @@
+"""
+Расписание врачей по дням для экранов регистратуры.
+
+``DoctorDay`` хранит для каждой пары (врач, дата) готовый список записей
+дня и свободные промежутки, поэтому опрос расписания на день или неделю -
+одно чтение по индексу ``doctor_day_unique`` без расчета.
+
+Строка дня пересчитывается целиком (записи дня одним запросом) в той же
+транзакции, что и изменение записи: ``post_save``/``post_delete`` записи
+(см. ``api/signals.py``), а массовые операции без сигналов (запись пачкой,
+смена статуса действием админки) вызывают ``refresh_days`` сами. Когда
+меняется то, от чего зависят сразу многие дни (график врача, услуга,
+импорт), строки удаляются (``forget_*``) и строятся заново при чтении.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+
+from .models import Appointment, Doctor, DoctorDay
+from .scheduling import free_gaps, to_minutes
+from .working_hours import format_minutes, shifts_for
+
+
+def _format(value):
+    """time(9, 30) -> '09:30', time.max -> '24:00'."""
+    return format_minutes(to_minutes(value))
+
+
+def build_days(pairs):
+    """Несохраненные ``DoctorDay`` для пар (id врача, дата): два запроса на все пары."""
+    pairs = set(pairs)
+    if not pairs:
+        return []
+
+    schedules = dict(
+        Doctor.objects.filter(pk__in={doctor_id for doctor_id, _ in pairs}).values_list('pk', 'compiled_schedule')
+    )
+    rows = Appointment.objects.filter(
+        doctor_id__in=schedules, date__in={day for _, day in pairs},
+    ).order_by('time').values_list(
+        'doctor_id', 'date', 'id', 'time', 'end_time', 'status', 'patient_name', 'patient_phone', 'service__name',
+    )
+    by_day = defaultdict(list)
+    for doctor_id, day, *row in rows:
+        if (doctor_id, day) in pairs:
+            by_day[doctor_id, day].append(row)
+
+    days = []
+    for doctor_id, day in pairs:
+        if doctor_id not in schedules:
+            # Врача удалили - его строки удалятся каскадно
+            continue
+        appointments = []
+        busy = []
+        for pk, start, end, status, patient_name, patient_phone, service in by_day[doctor_id, day]:
+            end = end or start
+            appointments.append({
+                'id': pk,
+                'time': _format(start),
+                'end': _format(end),
+                'status': status,
+                'patient_name': patient_name,
+                'patient_phone': patient_phone,
+                'service': service,
+            })
+            if status in Appointment.ACTIVE_STATUSES:
+                busy.append((to_minutes(start), to_minutes(end)))
+
+        gaps = free_gaps(shifts_for(schedules[doctor_id], day.weekday()), busy)
+        days.append(DoctorDay(
+            doctor_id=doctor_id, date=day, appointments=appointments,
+            free=[[format_minutes(start), format_minutes(end)] for start, end in gaps],
+        ))
+    return days
+
+
+def refresh_days(pairs):
+    """Пересчитывает и сохраняет (upsert) расписание для пар (id врача, дата)."""
+    DoctorDay.objects.bulk_create(
+        build_days(pairs),
+        update_conflicts=True,
+        unique_fields=['doctor', 'date'],
+        update_fields=['appointments', 'free', 'updated_at'],
+    )
+
+
+def forget_days(pairs):
+    """Удаляет расписание дней (и, возможно, соседних по врачу/дате) - пересчитается при чтении."""
+    pairs = set(pairs)
+    if pairs:
+        DoctorDay.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in pairs},
+            date__in={day for _, day in pairs},
+        ).delete()
+
+
+def forget_doctor_days(doctor_ids):
+    DoctorDay.objects.filter(doctor_id__in=doctor_ids).delete()
+
+
+def forget_service_days(service_ids):
+    """Дни, в которых есть записи на услуги (сменились название или длительность)."""
+    DoctorDay.objects.filter(Exists(Appointment.objects.filter(
+        doctor_id=OuterRef('doctor_id'), date=OuterRef('date'), service_id__in=service_ids,
+    ))).delete()
+
+
+def get_days(doctor_ids, date_from, date_to):
+    """
+    {(id врача, дата): DoctorDay} за диапазон дат. Недостающие строки
+    строятся и сохраняются; если все есть - один запрос.
+    """
+    days = {
+        (day.doctor_id, day.date): day
+        for day in DoctorDay.objects.filter(doctor_id__in=doctor_ids, date__range=(date_from, date_to))
+    }
+
+    dates = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    missing = [(doctor_id, day) for doctor_id in doctor_ids for day in dates if (doctor_id, day) not in days]
+    if missing:
+        built = build_days(missing)
+        # Параллельная запись могла уже сохранить более свежую строку - не перетираем
+        DoctorDay.objects.bulk_create(built, ignore_conflicts=True)
+        days.update(((day.doctor_id, day.date), day) for day in built)
+    return days
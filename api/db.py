@@ -0,0 +1,19 @@
+"""Общие помощники для работы с транзакциями."""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Выполняет блок в транзакции и откатывает все изменения."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
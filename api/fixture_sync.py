@@ -0,0 +1,176 @@
+"""
+Загрузка справочников (услуги, врачи) из фикстур сравнением с базой.
+
+Существующие объекты читаются одним запросом в словарь по названию, строки
+фикстуры сравниваются с ними поле за полем: новые сохраняются через
+``bulk_create``, измененные - одним ``bulk_update``, связи врач-услуга
+пишутся прямо в промежуточную таблицу. План (``SyncPlan``) строится без
+изменений в базе, поэтому его можно просто вывести - это режим ``--dry-run``
+команд ``load_services``/``load_doctors``.
+
+Массовые операции не вызывают ``save()`` и сигналы, поэтому производные
+поля (``compiled_schedule`` врача, ``end_time`` записей), версия каталога и
+расписание по дням обновляются здесь явно.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .daily_schedule import forget_doctor_days, forget_service_days
+from .models import Doctor, Service, refresh_end_times
+from .working_hours import compile_working_hours
+
+SERVICE_FIELDS = ['description', 'price', 'duration', 'is_active']
+DOCTOR_FIELDS = ['specialty', 'experience', 'education', 'description', 'is_active', 'working_hours']
+
+BATCH_SIZE = 500
+
+
+@dataclass
+class SyncPlan:
+    # Объекты из базы по названию
+    existing: dict = field(default_factory=dict)
+    created: list = field(default_factory=list)
+    # (объект, {поле: (было, стало)}); новые значения уже присвоены объекту
+    updated: list = field(default_factory=list)
+    unchanged: int = 0
+    # Связи врач-услуга: (врач, услуга, id услуги[, id связи])
+    links_added: list = field(default_factory=list)
+    links_removed: list = field(default_factory=list)
+    # (врач, услуга) - услуги с таким названием нет в базе
+    missing: list = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return bool(self.created or self.updated or self.links_added or self.links_removed)
+
+
+def _unique_rows(rows):
+    # Повтор названия в фикстуре перекрывает предыдущую строку
+    return list({row['name']: row for row in rows}.values())
+
+
+def _plan_rows(model, rows, fields):
+    plan = SyncPlan()
+    for obj in model.objects.only('name', *fields).order_by('pk'):
+        # При дублях названия в базе обновляется первый созданный объект
+        plan.existing.setdefault(obj.name, obj)
+
+    opts = model._meta
+    for row in rows:
+        values = {name: opts.get_field(name).to_python(row[name]) for name in fields}
+        obj = plan.existing.get(row['name'])
+        if obj is None:
+            plan.created.append(model(name=row['name'], **values))
+            continue
+
+        changes = {
+            name: (getattr(obj, name), value)
+            for name, value in values.items() if getattr(obj, name) != value
+        }
+        if not changes:
+            plan.unchanged += 1
+            continue
+        for name, (_, value) in changes.items():
+            setattr(obj, name, value)
+        plan.updated.append((obj, changes))
+    return plan
+
+
+def _save(model, plan, derived=()):
+    model.objects.bulk_create(plan.created, batch_size=BATCH_SIZE)
+    if not plan.updated:
+        return
+
+    # bulk_update не заполняет auto_now
+    now = timezone.now()
+    fields = {'updated_at', *derived}
+    for obj, changes in plan.updated:
+        obj.updated_at = now
+        fields.update(changes)
+    model.objects.bulk_update([obj for obj, _ in plan.updated], sorted(fields), batch_size=BATCH_SIZE)
+
+
+def describe_changes(model, changes):
+    """{'price': (500, 600)} -> 'Цена: 500 -> 600'."""
+    return ', '.join(
+        f'{model._meta.get_field(name).verbose_name}: {old} -> {new}'
+        for name, (old, new) in changes.items()
+    )
+
+
+def plan_services(rows):
+    """``rows`` - словари с ``name`` и полями ``SERVICE_FIELDS``."""
+    return _plan_rows(Service, _unique_rows(rows), SERVICE_FIELDS)
+
+
+def apply_services(plan):
+    with transaction.atomic():
+        _save(Service, plan)
+        duration_changed = [obj for obj, changes in plan.updated if 'duration' in changes]
+        if duration_changed:
+            refresh_end_times(duration_changed)
+        if plan.updated:
+            forget_service_days([obj.pk for obj, _ in plan.updated])
+        if plan.changed:
+            invalidate_catalog()
+
+
+def plan_doctors(rows):
+    """``rows`` - словари с ``name``, полями ``DOCTOR_FIELDS`` и ``services_names``."""
+    rows = _unique_rows(rows)
+    plan = _plan_rows(Doctor, rows, DOCTOR_FIELDS)
+    for obj in [*plan.created, *(obj for obj, _ in plan.updated)]:
+        obj.compiled_schedule = compile_working_hours(obj.working_hours)
+
+    service_ids = {}
+    for service_id, name in Service.objects.order_by('pk').values_list('pk', 'name'):
+        service_ids.setdefault(name, service_id)
+    service_names = {service_id: name for name, service_id in service_ids.items()}
+
+    doctor_names = {obj.pk: name for name, obj in plan.existing.items()}
+    current = {}
+    links = Doctor.services.through.objects.values_list('pk', 'doctor_id', 'service_id')
+    for link_id, doctor_id, service_id in links:
+        if doctor_id in doctor_names:
+            current.setdefault(doctor_names[doctor_id], {})[service_id] = link_id
+
+    for row in rows:
+        wanted = set()
+        for service_name in row['services_names']:
+            if service_name in service_ids:
+                wanted.add(service_ids[service_name])
+            else:
+                plan.missing.append((row['name'], service_name))
+
+        have = current.get(row['name'], {})
+        for service_id in sorted(wanted - have.keys()):
+            plan.links_added.append((row['name'], service_names[service_id], service_id))
+        for service_id in sorted(have.keys() - wanted):
+            plan.links_removed.append(
+                (row['name'], service_names.get(service_id, service_id), service_id, have[service_id])
+            )
+    return plan
+
+
+def apply_doctors(plan):
+    through = Doctor.services.through
+    with transaction.atomic():
+        _save(Doctor, plan, derived=['compiled_schedule'])
+        if plan.updated:
+            forget_doctor_days([obj.pk for obj, _ in plan.updated])
+
+        # После bulk_create у новых врачей есть id (SQLite >= 3.35 возвращает их)
+        doctor_ids = {name: obj.pk for name, obj in plan.existing.items()}
+        doctor_ids.update((obj.name, obj.pk) for obj in plan.created)
+
+        through.objects.filter(pk__in=[link[3] for link in plan.links_removed]).delete()
+        through.objects.bulk_create([
+            through(doctor_id=doctor_ids[doctor_name], service_id=service_id)
+            for doctor_name, _, service_id in plan.links_added
+        ], batch_size=BATCH_SIZE)
+
+        if plan.changed:
+            invalidate_catalog()
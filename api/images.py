@@ -0,0 +1,85 @@
+"""
+Производные изображения (уменьшенные WebP/JPEG) для фото врачей и услуг.
+
+Оригиналы загружаются как есть и могут весить сотни килобайт, а на
+странице показываются 150x150 (врачи) и высотой 200px (услуги). При
+сохранении модели с новым файлом рядом с ним создаются уменьшенные копии
+``<папка>/derivatives/<имя>_<ширина>.<webp|jpg>``, а их имена сохраняются
+в JSON-поле модели::
+
+    {'source': 'doctors/debt.jpg',
+     'webp': {'150': 'doctors/derivatives/debt_150.webp', ...},
+     'jpeg': {'150': 'doctors/derivatives/debt_150.jpg', ...}}
+
+Модуль работает с путями файловой системы и не трогает ORM, поэтому
+функцию ``generate_derivatives`` можно вызывать в отдельных процессах
+(см. команду ``build_image_derivatives``).
+"""
+import os
+
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+# Ошибки чтения файла: его нет, это не изображение или оно слишком большое
+# (распаковка "бомбы" на сотни мегапикселей съест память процесса)
+IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+
+# Ширины производных (1x и 2x) и нужна ли квадратная обрезка
+DOCTOR_PHOTO = {'widths': (150, 300), 'square': True}
+SERVICE_IMAGE = {'widths': (400, 800), 'square': False}
+
+
+def derivative_name(name, width, extension):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'derivatives', f'{stem}_{width}.{extension}')
+
+
+def _flatten(image):
+    """RGBA/P -> RGB на белом фоне (JPEG не умеет прозрачность)."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_derivatives(media_root, name, widths, square=False):
+    """Создает производные для файла ``name`` внутри ``media_root`` и возвращает их описание."""
+    variants = {'source': name, 'webp': {}, 'jpeg': {}}
+
+    with Image.open(os.path.join(media_root, name)) as original:
+        original = _flatten(ImageOps.exif_transpose(original))
+
+        for width in widths:
+            if square:
+                side = min(width, *original.size)
+                image = ImageOps.fit(original, (side, side), Image.LANCZOS)
+            else:
+                image = original.copy()
+                # Не увеличиваем изображения меньше нужной ширины
+                image.thumbnail((min(width, original.width), original.height * 10), Image.LANCZOS)
+
+            for key, (pil_format, extension, options) in FORMATS.items():
+                target = derivative_name(name, width, extension)
+                path = os.path.join(media_root, target)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                image.save(path, pil_format, **options)
+                variants[key][str(width)] = target
+
+    return variants
+
+
+def variants_are_current(variants, name):
+    return bool(name) and (variants or {}).get('source') == name
+
+
+def build_srcset(variants, key, url):
+    """'url 150w, url 300w' для формата ``key``; ``url`` превращает имя файла в URL."""
+    items = sorted((variants or {}).get(key, {}).items(), key=lambda item: int(item[0]))
+    return ', '.join(f'{url(name)} {width}w' for width, name in items)
@@ -0,0 +1,54 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import ARCHIVE_STATUSES, archivable, archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит завершенные и отмененные записи старше горизонта в архив пачками. '
+        'Прерванный перенос можно просто запустить снова'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=730, help='Горизонт в днях, по умолчанию 730')
+        parser.add_argument('--before', type=date.fromisoformat, help='Или дата ГГГГ-ММ-ДД: записи раньше нее')
+        parser.add_argument(
+            '--status', action='append', choices=ARCHIVE_STATUSES,
+            help=f'Статусы для переноса, по умолчанию {", ".join(ARCHIVE_STATUSES)}',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Записей в одной транзакции')
+        parser.add_argument('--limit', type=int, help='Перенести не больше стольких записей')
+        parser.add_argument('--pause', type=float, default=0, help='Пауза между пачками, с')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать записи для переноса')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        before = options['before'] or timezone.localdate() - timedelta(days=options['older_than_days'])
+        statuses = options['status'] or ARCHIVE_STATUSES
+        total = archivable(before, statuses).count()
+        if options['limit'] is not None:
+            total = min(total, options['limit'])
+        self.stdout.write(f'Записей раньше {before:%d.%m.%Y} для переноса: {total}')
+        if options['dry_run'] or not total:
+            return
+
+        started = time.perf_counter()
+        moved = 0
+        while moved < total:
+            count = archive_batch(before, min(options['batch_size'], total - moved), statuses)
+            if not count:
+                break
+            moved += count
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'Перенесено {moved}/{total}')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено в архив: {moved} за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.benchmarks import seed_appointments, seed_catalog
+from api.db import rolled_back
+
+PAGES = [
+    ('Услуги', 'admin:api_service_changelist', ''),
+    ('Врачи', 'admin:api_doctor_changelist', ''),
+    ('Записи', 'admin:api_appointment_changelist', ''),
+    ('Записи: на сегодня', 'admin:api_appointment_changelist', '?status=today'),
+    ('Записи: ожидают', 'admin:api_appointment_changelist', '?status__exact=pending'),
+    ('Записи: поиск', 'admin:api_appointment_changelist', '?q=Пациент+42'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк страниц списков в админке (данные создаются во временной транзакции)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=1_000_000)
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--services', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        services, doctors = seed_catalog(options['services'], options['doctors'], rng)
+        seed_appointments(doctors, services, options['appointments'], rng)
+        self.stdout.write(
+            f"Создано записей: {options['appointments']} за {time.perf_counter() - started:.1f} с"
+        )
+
+        user = get_user_model().objects.create_superuser('bench_admin', 'bench@example.com', 'bench')
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        for title, url_name, query in PAGES:
+            url = reverse(url_name) + query
+            timings = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    page_started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append(time.perf_counter() - page_started)
+                if response.status_code != 200:
+                    self.stdout.write(self.style.ERROR(f'{title}: HTTP {response.status_code}'))
+                    break
+            else:
+                self.stdout.write(
+                    f'{title:<22} SQL-запросов: {len(queries):>3}  '
+                    f'лучшее: {min(timings) * 1000:8.1f} мс  среднее: {sum(timings) / len(timings) * 1000:8.1f} мс'
+                )
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import random
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from api.benchmarks import (
+    SEED_DAY_START, SEED_SLOT, SEED_SLOTS_PER_DAY, asgi_request, run_clients, seed_catalog, summarize,
+)
+from api.catalog import bump_catalog_version, get_catalog_state
+from api.models import Doctor, Service
+from api.urls import build_urlconf
+from api.views import catalog_validators
+
+SCENARIOS = ['catalog', 'revalidate', 'services', 'booking']
+
+MODES = [('sync', False), ('async', True)]
+
+# Без middleware Django на MiddlewareMixin: под ASGI каждая из них вызывает
+# process_request/process_response через sync_to_async, и эти переходы
+# в поток, а не представление, ограничивают пропускную способность
+MINIMAL_MIDDLEWARE = ['corsheaders.middleware.CorsMiddleware']
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест синхронных и async-представлений через ASGI-приложение '
+        '(N одновременных клиентов, без сети). Данные бенчмарка удаляются в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=4, help='Запросов на клиента')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='По умолчанию - все')
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument(
+            '--minimal-middleware', action='store_true',
+            help='Только CorsMiddleware - показать разницу самих представлений',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Запросы идут в отдельных потоках со своими соединениями, поэтому
+        # откатываемая транзакция (как в других bench_*) не подходит
+        services, doctors = seed_catalog(10, options['doctors'], random.Random(options['seed']))
+        bump_catalog_version()
+        try:
+            self.run(options, services, doctors)
+        finally:
+            Doctor.objects.filter(pk__in=[doctor.pk for doctor in doctors]).delete()
+            Service.objects.filter(pk__in=[service.pk for service in services]).delete()
+
+    def run(self, options, services, doctors):
+        middleware = MINIMAL_MIDDLEWARE if options['minimal_middleware'] else settings.MIDDLEWARE
+        clients, per_client = options['clients'], options['requests']
+        self.stdout.write(f'Клиентов: {clients}, запросов на клиента: {per_client}')
+        self.stdout.write(f'{"Сценарий":<12}{"Режим":<8}{"Запр/с":>9}{"p50, мс":>10}{"p95, мс":>10}{"Ошибок":>8}')
+
+        for scenario in options['scenario'] or SCENARIOS:
+            for mode_index, (mode, async_api) in enumerate(MODES):
+                mode_settings = override_settings(
+                    ROOT_URLCONF=build_urlconf(async_api), MIDDLEWARE=middleware,
+                    DEBUG=False, ALLOWED_HOSTS=['localhost'],
+                )
+                with mode_settings:
+                    # Цепочка middleware собирается при создании обработчика
+                    app = ASGIHandler()
+                    make_request = self.request_factory(scenario, services, doctors, mode_index)
+                    # Прогрев: кэш каталога и ETag для сценария revalidate
+                    asyncio.run(asgi_request(app, *make_request(-1)))
+                    result = summarize(*asyncio.run(self.load(app, make_request, clients, per_client)))
+
+                self.stdout.write(
+                    f'{scenario:<12}{mode:<8}{result["rps"]:>9.0f}{result["p50_ms"]:>10.1f}'
+                    f'{result["p95_ms"]:>10.1f}{result["errors"]:>8}'
+                )
+
+    def request_factory(self, scenario, services, doctors, mode_index):
+        if scenario == 'catalog':
+            return lambda index: ('GET', '/api/catalog/')
+        if scenario == 'services':
+            return lambda index: ('GET', '/api/services/', 'page_size=20')
+        if scenario == 'revalidate':
+            etag, _ = catalog_validators('bootstrap', get_catalog_state())
+            headers = [(b'if-none-match', etag.encode())]
+            return lambda index: ('GET', '/api/catalog/', '', b'', headers)
+
+        # booking: у каждого запроса свое время, режимы пишут в разные дни
+        service = services[0]
+        start = timezone.localdate() + timedelta(days=400 + 200 * mode_index)
+
+        def booking(index):
+            index += 1
+            doctor = doctors[index % len(doctors)]
+            slot = index // len(doctors)
+            minutes = SEED_DAY_START + (slot % SEED_SLOTS_PER_DAY) * SEED_SLOT
+            body = json.dumps({
+                'patient_name': f'Пациент {index}', 'patient_phone': '+996700000000',
+                'doctor': doctor.pk, 'service': service.pk,
+                'date': (start + timedelta(days=slot // SEED_SLOTS_PER_DAY)).isoformat(),
+                'time': time(minutes // 60, minutes % 60).strftime('%H:%M'),
+            }).encode()
+            return 'POST', '/api/appointments/', '', body, [(b'content-type', b'application/json')]
+
+        return booking
+
+    async def load(self, app, make_request, clients, per_client):
+        async def send(index):
+            status, _ = await asgi_request(app, *make_request(index))
+            return status
+
+        return await run_clients(send, clients, per_client)
@@ -0,0 +1,209 @@
+import itertools
+import random
+import threading
+import time as clock
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api import write_queue
+from api.benchmarks import SEED_DAY_START, SEED_SLOT, SEED_SLOTS_PER_DAY, iter_seed_appointments, seed_catalog
+from api.catalog import bump_catalog_version
+from api.models import Appointment, Doctor, Service
+from api.stats import record as record_stats
+
+# Настройки до изменений: журнал отката, синхронная запись на каждую транзакцию
+ROLLBACK_JOURNAL = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+# Режим базы после миграции 0014_sqlite_wal
+WAL = {'journal_mode': 'WAL'}
+
+CONFIGS = [
+    ('journal', 'Журнал отката', ROLLBACK_JOURNAL, False),
+    ('wal', 'WAL', WAL, False),
+    ('wal-queue', 'WAL + очередь', WAL, True),
+]
+
+# Записи, статус которых переключают "администраторы"
+ADMIN_PAGE = 100
+
+
+def close_connection():
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Конкурентная запись в SQLite: запись на прием, массовая смена статуса в админке и чтение '
+        'слотов из многих потоков - ошибки и пропускная способность с журналом отката, WAL и WAL '
+        'с очередью записи. Данные бенчмарка удаляются в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookers', type=int, default=16, help='Потоков записи на прием')
+        parser.add_argument('--admins', type=int, default=2, help='Потоков массовой смены статуса')
+        parser.add_argument('--readers', type=int, default=4, help='Потоков чтения свободных слотов')
+        parser.add_argument('--admin-pause', type=float, default=0.5, help='Пауза между действиями админки, с')
+        parser.add_argument('--read-pause', type=float, default=0.05, help='Пауза между чтениями, с')
+        parser.add_argument('--duration', type=float, default=10, help='Секунд на конфигурацию')
+        parser.add_argument('--appointments', type=int, default=20_000, help='Записей для смены статуса')
+        parser.add_argument(
+            '--timeout', type=float,
+            help='Ожидание блокировки SQLite, с (по умолчанию - OPTIONS["timeout"] из настроек)',
+        )
+        parser.add_argument('--config', action='append', choices=[name for name, *_ in CONFIGS])
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING('Бенчмарк рассчитан на SQLite'))
+            return
+        # Запросы идут из потоков со своими соединениями - данные нужны в базе
+        rng = random.Random(options['seed'])
+        services, doctors = seed_catalog(5, 20, rng)
+        appointments = list(iter_seed_appointments(doctors, services, options['appointments'], rng))
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        record_stats((appointment.tracked_values(), 1) for appointment in appointments)
+        bump_catalog_version()
+        # Настройки соединения общие для всех потоков; новые соединения читают их при открытии
+        db_options = connection.settings_dict['OPTIONS']
+        saved_options = dict(db_options)
+        if options['timeout'] is not None:
+            db_options['timeout'] = options['timeout']
+        try:
+            self.run(options, services, doctors, [appointment.pk for appointment in appointments])
+        finally:
+            db_options.clear()
+            db_options.update(saved_options)
+            self.switch(WAL)
+            Doctor.objects.filter(pk__in=[doctor.pk for doctor in doctors]).delete()
+            Service.objects.filter(pk__in=[service.pk for service in services]).delete()
+
+    def switch(self, pragmas):
+        """Закрывает все соединения, чтобы новые открылись с ``pragmas``."""
+        write_queue.submit(close_connection).result()
+        connection.close()
+        with override_settings(SQLITE_PRAGMAS={**settings.SQLITE_PRAGMAS, **(pragmas or {})}):
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                return cursor.fetchone()[0]
+
+    def run(self, options, services, doctors, appointment_ids):
+        self.stdout.write(
+            f"Потоков: запись {options['bookers']}, админка {options['admins']}, "
+            f"чтение {options['readers']}; {options['duration']:.0f} с на конфигурацию, "
+            f"ожидание блокировки {connection.settings_dict['OPTIONS'].get('timeout', 5)} с"
+        )
+        self.stdout.write(
+            f'{"Конфигурация":<16}{"Журнал":>8}{"Записей/с":>11}{"p95, мс":>9}{"Ошибок":>8}'
+            f'{"Смен/с":>8}{"Ошибок":>8}{"Чтений/с":>10}{"p95, мс":>9}'
+        )
+        slots = itertools.count()
+        for name, title, pragmas, queue in CONFIGS:
+            if options['config'] and name not in options['config']:
+                continue
+            journal = self.switch(pragmas)
+            changes = {'SQLITE_PRAGMAS': {**settings.SQLITE_PRAGMAS, **(pragmas or {})}}
+            with override_settings(BOOKING_WRITE_QUEUE=queue, DEBUG=False, ALLOWED_HOSTS=['testserver'], **changes):
+                result = self.measure(options, services, doctors, appointment_ids, slots)
+            bookings, admin_updates, reads = result
+            self.stdout.write(
+                f'{title:<16}{journal:>8}{bookings["rate"]:>11.1f}{bookings["p95"]:>9.0f}{bookings["errors"]:>8}'
+                f'{admin_updates["rate"]:>8.1f}{admin_updates["errors"]:>8}{reads["rate"]:>10.1f}{reads["p95"]:>9.0f}'
+            )
+
+    def measure(self, options, services, doctors, appointment_ids, slots):
+        stop = threading.Event()
+        lock = threading.Lock()
+        results = {kind: {'latencies': [], 'errors': 0} for kind in ('booking', 'admin', 'read')}
+        start_day = timezone.localdate() + timedelta(days=400)
+        model_admin = admin.site._registry[Appointment]
+
+        def record(kind, started, ok):
+            with lock:
+                results[kind]['latencies'].append(clock.perf_counter() - started)
+                if not ok:
+                    results[kind]['errors'] += 1
+
+        def booker():
+            client = Client(raise_request_exception=False)
+            while not stop.is_set():
+                # Свое время у каждого запроса: ошибки - только от блокировок
+                with lock:
+                    slot = next(slots)
+                doctor = doctors[slot % len(doctors)]
+                number = slot // len(doctors)
+                minutes = SEED_DAY_START + (number % SEED_SLOTS_PER_DAY) * SEED_SLOT
+                started = clock.perf_counter()
+                response = client.post(reverse('appointment-create'), {
+                    'patient_name': f'Пациент {slot}', 'patient_phone': '+996700000000',
+                    'doctor': doctor.pk, 'service': services[0].pk,
+                    'date': (start_day + timedelta(days=number // SEED_SLOTS_PER_DAY)).isoformat(),
+                    'time': time(minutes // 60, minutes % 60).strftime('%H:%M'),
+                }, content_type='application/json')
+                record('booking', started, response.status_code == 201)
+
+        def administrator(number):
+            rng = random.Random(number)
+            statuses = ['completed', 'confirmed']
+            while not stop.is_set():
+                first = rng.randrange(max(1, len(appointment_ids) - ADMIN_PAGE))
+                queryset = Appointment.objects.filter(pk__in=appointment_ids[first:first + ADMIN_PAGE])
+                started = clock.perf_counter()
+                try:
+                    model_admin.update_status(queryset, statuses[number % 2])
+                    ok = True
+                except OperationalError:
+                    ok = False
+                number += 1
+                record('admin', started, ok)
+                stop.wait(options['admin_pause'])
+
+        def reader(number):
+            client = Client(raise_request_exception=False)
+            today = timezone.localdate().isoformat()
+            while not stop.is_set():
+                doctor = doctors[number % len(doctors)]
+                number += 1
+                started = clock.perf_counter()
+                response = client.get(
+                    reverse('doctor-slots', args=[doctor.pk]), {'service': services[0].pk, 'date_from': today},
+                )
+                record('read', started, response.status_code == 200)
+                stop.wait(options['read_pause'])
+
+        def worker(target, *args):
+            try:
+                target(*args)
+            finally:
+                connection.close()
+
+        threads = (
+            [threading.Thread(target=worker, args=(booker,)) for _ in range(options['bookers'])]
+            + [threading.Thread(target=worker, args=(administrator, number)) for number in range(options['admins'])]
+            + [threading.Thread(target=worker, args=(reader, number)) for number in range(options['readers'])]
+        )
+        started = clock.perf_counter()
+        for thread in threads:
+            thread.start()
+        stop.wait(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = clock.perf_counter() - started
+
+        summary = []
+        for kind in ('booking', 'admin', 'read'):
+            latencies = sorted(results[kind]['latencies'])
+            summary.append({
+                'rate': (len(latencies) - results[kind]['errors']) / elapsed,
+                'p95': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+                'errors': results[kind]['errors'],
+            })
+        return summary
@@ -0,0 +1,187 @@
+import json
+import random
+import time as clock
+from datetime import time, timedelta
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api.benchmarks import (
+    SEED_DAY_START, SEED_SLOT, SEED_SLOTS_PER_DAY, compare, run_clients, seed_appointments, seed_catalog,
+    summarize,
+)
+from api.db import rolled_back
+from api.catalog import bump_catalog_version
+from api.models import Doctor
+
+SCENARIOS = ['home', 'services', 'doctors', 'slots', 'appointments']
+
+DEFAULT_BASELINE = settings.BASE_DIR / 'benchmarks' / 'endpoints.json'
+
+# Параметры, от которых зависят результаты: с другими сравнение неточное
+PARAMS = ['services', 'doctors', 'appointments', 'clients', 'requests']
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк главной страницы и API (услуги, врачи, слоты, запись): '
+        'одновременные клиенты, p50/p95/p99, запросов в секунду и число SQL-запросов; '
+        'сравнение с базовыми результатами. Данные создаются во временной транзакции'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--services', type=int, default=30)
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--clients', type=int, default=20, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=10, help='Запросов на клиента')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='По умолчанию - все')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='JSON с базовыми результатами')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Допустимое ухудшение задержки и пропускной способности (доля), по умолчанию 0.5',
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Записать результаты как базовые')
+        parser.add_argument('--check', action='store_true', help='Завершиться с ошибкой при регрессиях')
+
+    def handle(self, *args, **options):
+        # Запросы выполняются в потоке команды (см. measure), поэтому данные
+        # из откатываемой транзакции им видны
+        with rolled_back():
+            results = self.run(options)
+
+        params = {name: options[name] for name in PARAMS}
+        if options['save_baseline']:
+            self.save_baseline(options['baseline'], params, results)
+        else:
+            self.compare(options, params, results)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = clock.perf_counter()
+        services, doctors = seed_catalog(options['services'], options['doctors'], rng)
+        seed_appointments(doctors, services, options['appointments'], rng)
+        bump_catalog_version()
+        self.stdout.write(
+            f"Создано записей: {options['appointments']} за {clock.perf_counter() - started:.1f} с; "
+            f"клиентов: {options['clients']}, запросов на клиента: {options['requests']}"
+        )
+        self.stdout.write(
+            f'{"Сценарий":<14}{"Запр/с":>9}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"SQL":>6}{"Ошибок":>8}'
+        )
+
+        results = {}
+        for scenario in options['scenario'] or SCENARIOS:
+            make_request = self.request_factory(scenario, services, doctors)
+            result = results[scenario] = self.measure(make_request, options['clients'], options['requests'])
+            self.stdout.write(
+                f'{scenario:<14}{result["rps"]:>9.0f}{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}'
+                f'{result["p99_ms"]:>10.1f}{result["queries"]:>6}{result["errors"]:>8}'
+            )
+        return results
+
+    def measure(self, make_request, clients, per_client):
+        """
+        Прогрев, подсчет SQL-запросов одного запроса и нагрузка. Запросы идут
+        через ``AsyncClient`` (полная цепочка middleware, без сети); синхронные
+        представления выполняются по очереди в потоке команды, как под ASGI
+        с одним потоком для ORM, поэтому задержка включает ожидание очереди.
+        """
+        client = AsyncClient(raise_request_exception=False)
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        async def send(index):
+            method, path, data = make_request(index)
+            if method == 'POST':
+                response = await client.post(path, json.dumps(data), content_type='application/json')
+            else:
+                response = await client.get(path, data)
+            return response.status_code
+
+        # Номера 0 и 1 - прогрев (кэш каталога) и подсчет запросов, нагрузка - с 2
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            async_to_sync(send)(0)
+            # Обертка на соединении потока команды - том, что у представлений
+            with connection.execute_wrapper(count_query):
+                async_to_sync(send)(1)
+            result = summarize(*async_to_sync(run_clients)(lambda index: send(index + 2), clients, per_client))
+        result['queries'] = queries
+        return result
+
+    def request_factory(self, scenario, services, doctors):
+        if scenario == 'home':
+            return lambda index: ('GET', reverse('home'), {})
+        if scenario == 'services':
+            return lambda index: ('GET', reverse('service-list'), {'page_size': 20})
+        if scenario == 'doctors':
+            return lambda index: ('GET', reverse('doctor-list'), {'page_size': 20})
+
+        today = timezone.localdate()
+        if scenario == 'slots':
+            # Услуга из тех, что врач оказывает
+            links = Doctor.services.through.objects.filter(doctor__in=doctors).values_list('doctor_id', 'service_id')
+            doctor_service = dict(links)
+            params = {'date_from': today.isoformat(), 'date_to': (today + timedelta(days=6)).isoformat()}
+
+            def slots(index):
+                doctor = doctors[index % len(doctors)]
+                path = reverse('doctor-slots', args=[doctor.pk])
+                return 'GET', path, {**params, 'service': doctor_service[doctor.pk]}
+
+            return slots
+
+        # appointments: у каждого запроса свой слот, после заполненных дней
+        start = today + timedelta(days=400)
+
+        def booking(index):
+            doctor = doctors[index % len(doctors)]
+            slot = index // len(doctors)
+            minutes = SEED_DAY_START + (slot % SEED_SLOTS_PER_DAY) * SEED_SLOT
+            return 'POST', reverse('appointment-create'), {
+                'patient_name': f'Пациент {index}', 'patient_phone': '+996700000000',
+                'doctor': doctor.pk, 'service': services[index % len(services)].pk,
+                'date': (start + timedelta(days=slot // SEED_SLOTS_PER_DAY)).isoformat(),
+                'time': time(minutes // 60, minutes % 60).strftime('%H:%M'),
+            }
+
+        return booking
+
+    def save_baseline(self, path, params, results):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'results': results}, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Базовые результаты записаны в {path}'))
+
+    def compare(self, options, params, results):
+        try:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(
+                f"Нет базовых результатов {options['baseline']} - запишите их с --save-baseline"
+            ))
+            return
+
+        if baseline['params'] != params:
+            self.stdout.write(self.style.WARNING(
+                f"Параметры отличаются от базовых {baseline['params']} - сравнение неточное"
+            ))
+        regressions = compare(results, baseline['results'], options['tolerance'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('Регрессий относительно базовых результатов нет'))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(regression))
+        if options['check']:
+            raise CommandError(f'Регрессий: {len(regressions)}')
@@ -0,0 +1,73 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.benchmarks import WORKING_HOURS
+from api.db import rolled_back
+from api.models import Appointment, Doctor, Service
+from api.scheduling import get_free_slots
+from api.working_hours import compile_working_hours
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк расчета свободного времени (данные создаются во временной транзакции)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--per-day', type=int, default=6, help='Записей на врача в рабочий день')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        today = timezone.localdate()
+        days = options['days']
+
+        service = Service.objects.create(name='Бенчмарк', price=1000, duration=60)
+        doctors = Doctor.objects.bulk_create([
+            Doctor(
+                name=f'Врач {i}', specialty='Терапевт',
+                working_hours=WORKING_HOURS, compiled_schedule=compile_working_hours(WORKING_HOURS),
+            )
+            for i in range(options['doctors'])
+        ])
+
+        appointments = []
+        for doctor in doctors:
+            for offset in range(days):
+                day = today + timedelta(days=offset)
+                if day.weekday() == 6:
+                    continue
+                hours = rng.sample(range(9, 17), min(options['per_day'], 8))
+                for hour in hours:
+                    appointments.append(Appointment(
+                        doctor=doctor, service=service, date=day,
+                        time=f'{hour:02d}:00', end_time=f'{hour + 1:02d}:00',
+                        status=rng.choice(['pending', 'confirmed', 'cancelled']),
+                    ))
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        self.stdout.write(f'Создано врачей: {len(doctors)}, записей: {len(appointments)}')
+
+        date_to = today + timedelta(days=days - 1)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            total_slots = 0
+            for doctor in doctors:
+                slots = get_free_slots(doctor, service, today, date_to)
+                total_slots += sum(len(times) for times in slots.values())
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Врачей: {len(doctors)}, дней: {days}, свободных слотов: {total_slots}\n'
+            f'Время: {elapsed:.3f} с ({elapsed / len(doctors) * 1000:.2f} мс на врача), '
+            f'SQL-запросов: {len(queries)}'
+        ))
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.catalog import bump_catalog_version
+from api.images import DOCTOR_PHOTO, IMAGE_ERRORS, SERVICE_IMAGE, generate_derivatives, variants_are_current
+from api.models import Doctor, Service
+
+TARGETS = [
+    (Service, 'image', 'image_variants', SERVICE_IMAGE),
+    (Doctor, 'photo', 'photo_variants', DOCTOR_PHOTO),
+]
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий (WebP/JPEG) для уже загруженных фото врачей и изображений услуг'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Количество процессов')
+        parser.add_argument('--force', action='store_true', help='Пересоздать даже актуальные копии')
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, field_name, variants_name, spec in TARGETS:
+            rows = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list('pk', field_name, variants_name)
+            for pk, name, variants in rows:
+                if options['force'] or not variants_are_current(variants, name):
+                    jobs.append((model, pk, variants_name, name, spec))
+
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('Все изображения уже обработаны'))
+            return
+
+        self.stdout.write(f'Изображений к обработке: {len(jobs)}')
+        done = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            futures = {}
+            for job in jobs:
+                model, pk, variants_name, name, spec = job
+                future = executor.submit(generate_derivatives, settings.MEDIA_ROOT, name, **spec)
+                futures[future] = job
+
+            for future in as_completed(futures):
+                model, pk, variants_name, name, spec = futures[future]
+                try:
+                    variants = future.result()
+                except IMAGE_ERRORS as e:
+                    self.stdout.write(self.style.ERROR(f'{name}: {e}'))
+                    variants = {'source': name}
+                else:
+                    done += 1
+                    self.stdout.write(self.style.SUCCESS(f'Обработано: {name}'))
+                # update() не вызывает save() и сигналы - версию каталога поднимаем один раз ниже
+                model.objects.filter(pk=pk).update(**{variants_name: variants})
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Готово! Обработано: {done} из {len(jobs)}'))
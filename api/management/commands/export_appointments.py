@@ -0,0 +1,61 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.models import Appointment
+from api.transfer import FORMATS, LINE_WRITERS, guess_format, iter_export_rows
+
+
+def date_argument(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f'Некорректная дата: {value} (ожидается ГГГГ-ММ-ДД)')
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Потоковый экспорт записей на прием в JSONL/CSV (память не зависит от объема таблицы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для записи, "-" - стандартный вывод')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию - по расширению файла, иначе jsonl')
+        parser.add_argument('--date-from', type=date_argument, help='Дата приема от (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', type=date_argument, help='Дата приема до (ГГГГ-ММ-ДД)')
+        parser.add_argument('--status', action='append', choices=[value for value, _ in Appointment.STATUS_CHOICES])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = Appointment.objects.all()
+        if options['date_from']:
+            queryset = queryset.filter(date__gte=options['date_from'])
+        if options['date_to']:
+            queryset = queryset.filter(date__lte=options['date_to'])
+        if options['status']:
+            queryset = queryset.filter(status__in=options['status'])
+
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        path = options['path']
+        lines = LINE_WRITERS[options['format'] or guess_format(path)](
+            counted(iter_export_rows(queryset, chunk_size=options['chunk_size']))
+        )
+
+        if path == '-':
+            sys.stdout.writelines(lines)
+            return
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                stream.writelines(lines)
+        except OSError as e:
+            raise CommandError(f'Не удалось записать файл: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Экспортировано записей: {count}'))
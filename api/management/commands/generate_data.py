@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import synthetic_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает синтетических врачей и записи в объеме продакшена (детерминированно по --seed). '
+        'Данные остаются в базе - запускайте на отдельной'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--appointments', type=int, default=1_000_000)
+        parser.add_argument('--patients', type=int, help='Размер пула пациентов, по умолчанию записей / 6')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=50_000, help='Записей в одной транзакции')
+        numpy_group = parser.add_mutually_exclusive_group()
+        numpy_group.add_argument('--numpy', action='store_true', dest='numpy', default=None,
+                                 help='Векторная выборка через NumPy (по умолчанию - если установлен)')
+        numpy_group.add_argument('--no-numpy', action='store_false', dest='numpy')
+
+    def handle(self, *args, **options):
+        if options['numpy'] and synthetic_data.numpy is None:
+            raise CommandError('NumPy не установлен')
+        if options['doctors'] < 1:
+            raise CommandError('Нужен хотя бы один врач')
+
+        use_numpy = synthetic_data.numpy is not None if options['numpy'] is None else options['numpy']
+        total = options['appointments']
+        started = time.perf_counter()
+
+        def progress(written):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Записей: {written}/{total}, {written / elapsed:.0f} в секунду')
+
+        doctors = synthetic_data.generate(
+            doctors=options['doctors'], appointments=total, patients=options['patients'],
+            seed=options['seed'], batch_size=options['batch_size'], use_numpy=use_numpy, progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано врачей: {len(doctors)}, записей: {total} за {time.perf_counter() - started:.1f} с '
+            f'({"NumPy" if use_numpy else "random"})'
+        ))
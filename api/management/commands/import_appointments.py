@@ -0,0 +1,82 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.db import rolled_back
+from api.transfer import FORMATS, RowError, RowValidator, guess_format, import_batch, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт записей на прием из JSONL/CSV пачками (executemany); принимает и файлы export_appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с записями, "-" - стандартный ввод')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию - по расширению файла, иначе jsonl')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Записей в одной транзакции')
+        parser.add_argument('--dry-run', action='store_true', help='Проверить файл, ничего не сохраняя')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError(f'Не удалось открыть файл: {e}')
+
+        try:
+            if options['dry_run']:
+                with rolled_back():
+                    self.run(stream, fmt, options)
+            else:
+                self.run(stream, fmt, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def run(self, stream, fmt, options):
+        validate = RowValidator()
+        started = time.perf_counter()
+        created = conflicts = invalid = rolled = 0
+        batch = []
+
+        def flush():
+            nonlocal created, conflicts, rolled
+            result = import_batch(batch)
+            created += result.created
+            conflicts += len(result.conflicts)
+            for line, (doctor_id, date, slot_time) in result.conflicts:
+                self.stdout.write(self.style.WARNING(
+                    f'Строка {line}: время занято (врач {doctor_id}, {date} {slot_time:%H:%M})'
+                ))
+            if result.rolled_back:
+                rolled += len(batch)
+                self.stdout.write(self.style.ERROR(
+                    f'Пачка до строки {batch[-1][0]} отменена: время заняли во время импорта'
+                ))
+            batch.clear()
+
+        for line, row in read_rows(stream, fmt):
+            try:
+                batch.append((line, validate(row)))
+            except RowError as e:
+                invalid += 1
+                self.stdout.write(self.style.ERROR(f'Строка {line}: {e}'))
+                continue
+            if len(batch) >= options['batch_size']:
+                flush()
+        if batch:
+            flush()
+
+        elapsed = time.perf_counter() - started
+        prefix = 'Проверка завершена (изменения отменены)' if options['dry_run'] else 'Готово!'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} Создано: {created}, конфликтов: {conflicts}, ошибок: {invalid}, '
+            f'отменено: {rolled} за {elapsed:.1f} с'
+        ))
@@ -1,63 +1,55 @@
 from django.core.management.base import BaseCommand
-from api.models import Doctor, Service
+from api.models import Doctor
 from api.fixtures.doctors_data import DOCTORS_DATA
+from api.fixture_sync import apply_doctors, describe_changes, plan_doctors
+
+WORKING_HOURS = {
+    'пн': '09:00-18:00',
+    'вт': '09:00-18:00',
+    'ср': '09:00-18:00',
+    'чт': '09:00-18:00',
+    'пт': '09:00-18:00',
+    'сб': '10:00-16:00',
+    'вс': 'выходной'
+}
 
 
 class Command(BaseCommand):
     help = 'Загрузка начальных данных врачей стоматологии'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Показать изменения, ничего не сохраняя')
+
     def handle(self, *args, **options):
-        created_count = 0
-        updated_count = 0
-
-        for doctor_data in DOCTORS_DATA:
-            # Создаем или обновляем врача
-            doctor, created = Doctor.objects.update_or_create(
-                name=doctor_data['name'],
-                defaults={
-                    'specialty': doctor_data['specialty'],
-                    'experience': doctor_data['experience'],
-                    'education': doctor_data['education'],
-                    'description': doctor_data['description'],
-                    'is_active': True,
-                    'working_hours': {
-                        'пн': '09:00-18:00',
-                        'вт': '09:00-18:00',
-                        'ср': '09:00-18:00',
-                        'чт': '09:00-18:00',
-                        'пт': '09:00-18:00',
-                        'сб': '10:00-16:00',
-                        'вс': 'выходной'
-                    }
-                }
+        plan = plan_doctors([
+            {**doctor_data, 'is_active': True, 'working_hours': WORKING_HOURS}
+            for doctor_data in DOCTORS_DATA
+        ])
+
+        for doctor_name, service_name in plan.missing:
+            self.stdout.write(
+                self.style.ERROR(f'Услуга "{service_name}" не найдена для врача {doctor_name}')
+            )
+        for doctor in plan.created:
+            self.stdout.write(self.style.SUCCESS(f'Создан врач: {doctor.name}'))
+        for doctor, changes in plan.updated:
+            self.stdout.write(
+                self.style.WARNING(f'Обновлен врач: {doctor.name} ({describe_changes(Doctor, changes)})')
             )
+        for doctor_name, service_name, *_ in plan.links_added:
+            self.stdout.write(f'Врачу {doctor_name} добавлена услуга: {service_name}')
+        for doctor_name, service_name, *_ in plan.links_removed:
+            self.stdout.write(f'У врача {doctor_name} убрана услуга: {service_name}')
 
-            # Добавляем услуги врачу
-            services_to_add = []
-            for service_name in doctor_data['services_names']:
-                try:
-                    service = Service.objects.get(name=service_name)
-                    services_to_add.append(service)
-                except Service.DoesNotExist:
-                    self.stdout.write(
-                        self.style.ERROR(f'Услуга "{service_name}" не найдена для врача {doctor.name}')
-                    )
-
-            doctor.services.set(services_to_add)
-
-            if created:
-                created_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'Создан врач: {doctor.name}')
-                )
-            else:
-                updated_count += 1
-                self.stdout.write(
-                    self.style.WARNING(f'Обновлен врач: {doctor.name}')
-                )
+        if options['dry_run']:
+            self.stdout.write('Режим проверки: изменения не сохранены')
+        else:
+            apply_doctors(plan)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f'Загрузка завершена! Создано: {created_count}, Обновлено: {updated_count}'
+                f'Загрузка завершена! Создано: {len(plan.created)}, Обновлено: {len(plan.updated)}, '
+                f'Без изменений: {plan.unchanged}, '
+                f'Связей добавлено: {len(plan.links_added)}, удалено: {len(plan.links_removed)}'
             )
-        )
\ No newline at end of file
+        )
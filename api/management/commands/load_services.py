@@ -1,39 +1,35 @@
 from django.core.management.base import BaseCommand
 from api.models import Service
 from api.fixtures.services_data import SERVICES_DATA
+from api.fixture_sync import apply_services, describe_changes, plan_services
 
 
 class Command(BaseCommand):
     help = 'Загрузка начальных данных услуг стоматологии'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Показать изменения, ничего не сохраняя')
+
     def handle(self, *args, **options):
-        created_count = 0
-        updated_count = 0
+        plan = plan_services([
+            {**service_data, 'is_active': True} for service_data in SERVICES_DATA
+        ])
 
-        for service_data in SERVICES_DATA:
-            service, created = Service.objects.update_or_create(
-                name=service_data['name'],
-                defaults={
-                    'description': service_data['description'],
-                    'price': service_data['price'],
-                    'duration': service_data['duration'],
-                    'is_active': True
-                }
+        for service in plan.created:
+            self.stdout.write(self.style.SUCCESS(f'Создана услуга: {service.name}'))
+        for service, changes in plan.updated:
+            self.stdout.write(
+                self.style.WARNING(f'Обновлена услуга: {service.name} ({describe_changes(Service, changes)})')
             )
 
-            if created:
-                created_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'Создана услуга: {service.name}')
-                )
-            else:
-                updated_count += 1
-                self.stdout.write(
-                    self.style.WARNING(f'Обновлена услуга: {service.name}')
-                )
+        if options['dry_run']:
+            self.stdout.write('Режим проверки: изменения не сохранены')
+        else:
+            apply_services(plan)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f'Загрузка завершена! Создано: {created_count}, Обновлено: {updated_count}'
+                f'Загрузка завершена! Создано: {len(plan.created)}, Обновлено: {len(plan.updated)}, '
+                f'Без изменений: {plan.unchanged}'
             )
-        )
\ No newline at end of file
+        )
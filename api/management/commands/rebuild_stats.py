@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сводные таблицы статистики с записями на прием и исправляет расхождения'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fixed = rebuild_stats()
+        for model, count in fixed.items():
+            self.stdout.write(f'{model._meta.verbose_name}: исправлено строк {count}')
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.perf_counter() - started:.1f} с'))
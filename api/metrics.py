@@ -0,0 +1,126 @@
+"""
+Метрики запросов в памяти процесса и их вывод в текстовом формате Prometheus.
+
+Заполняются ``PerformanceMiddleware`` (``api/middleware.py``), отдаются на
+``/metrics``. У каждого процесса (воркера) свои значения - Prometheus
+собирает их с каждого воркера отдельно.
+"""
+import threading
+from bisect import bisect_left
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _labels(names, values, extra=''):
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # значения меток -> [число попаданий в каждый интервал..., в +Inf, сумма]
+        self.series = {}
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, label_values):
+        self.series[label_values] = self.series.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class RequestMetrics:
+    """Метрики запросов по представлениям (имя URL)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._create()
+
+    def _create(self):
+        self.requests = Counter('clinic_requests_total', 'Запросы', ('view', 'method', 'status'))
+        self.duration = Histogram(
+            'clinic_request_duration_seconds', 'Время обработки запроса', ('view',), SECONDS_BUCKETS,
+        )
+        self.db = Histogram('clinic_request_db_seconds', 'Время SQL-запросов', ('view',), SECONDS_BUCKETS)
+        self.queries = Histogram('clinic_request_queries', 'Число SQL-запросов', ('view',), QUERIES_BUCKETS)
+        self.serialize_time = Histogram(
+            'clinic_request_serialize_seconds', 'Время сериализации DRF (Serializer.data)', ('view',), SECONDS_BUCKETS,
+        )
+        self.render_time = Histogram(
+            'clinic_request_render_seconds', 'Время рендеринга ответа (шаблон, JSON DRF)', ('view',), SECONDS_BUCKETS,
+        )
+        self.size = Histogram(
+            'clinic_response_size_bytes', 'Размер ответа (без потоковых)', ('view',), BYTES_BUCKETS,
+        )
+
+    def observe(self, view, method, status, duration, queries, db, serialize, render, size):
+        key = (view,)
+        with self.lock:
+            self.requests.inc((view, method, str(status)))
+            self.duration.observe(key, duration)
+            self.db.observe(key, db)
+            self.queries.observe(key, queries)
+            self.serialize_time.observe(key, serialize)
+            self.render_time.observe(key, render)
+            if size is not None:
+                self.size.observe(key, size)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (
+                self.requests, self.duration, self.db, self.queries, self.serialize_time, self.render_time, self.size,
+            ):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self._create()
+
+
+registry = RequestMetrics()
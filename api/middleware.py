@@ -0,0 +1,172 @@
+"""
+Замер запросов: число SQL-запросов, время БД, сериализации DRF, рендеринга
+и размер ответа.
+
+Значения отдаются в заголовке ``Server-Timing`` (видно во вкладке Network
+браузера) и копятся в гистограммах ``api/metrics.py`` по имени URL
+представления - DRF API, главная страница и админка одинаково.
+
+SQL-запросы считает обертка ``execute_wrapper`` на соединениях с базой;
+она пишет в счетчики текущего запроса через contextvar, поэтому видит и
+запросы async-представлений, которые ORM выполняет в потоках
+``sync_to_async``. Рендеринг - это ``render()`` ответов-шаблонов (DRF
+``Response``, страницы админки). Сериализация - чтение ``.data`` сериализаторов
+DRF (``BaseSerializer.data`` заменяется оберткой при включении middleware):
+она идет внутри представления, в том числе кэшируемого каталога, который
+отдает готовый JSON в ``HttpResponse`` без рендеринга.
+
+Включается ``settings.PERF_METRICS``. Выключенный middleware бросает
+``MiddlewareNotUsed`` и исключается из цепочки, а обертки SQL и сериализации
+не ставятся - накладных расходов нет.
+"""
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+from .metrics import registry
+
+_serializer_data = BaseSerializer.data
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db', 'serialize', 'serializing', 'render', 'render_started')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+        self.render = 0.0
+        self.render_started = None
+
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db += perf_counter() - started
+
+
+def timed_serializer_data(serializer):
+    stats = current_stats.get()
+    # Вложенный .data (сериализатор внутри сериализатора) уже замеряется внешним
+    if stats is None or stats.serializing:
+        return _serializer_data.fget(serializer)
+    stats.serializing = True
+    started = perf_counter()
+    try:
+        return _serializer_data.fget(serializer)
+    finally:
+        stats.serializing = False
+        stats.serialize += perf_counter() - started
+
+
+def install_serializer_timer():
+    # Serializer.data и ListSerializer.data берут результат через super().data
+    if BaseSerializer.data is _serializer_data:
+        BaseSerializer.data = property(timed_serializer_data)
+
+
+def install_query_recorder(connection, **kwargs):
+    # execute_wrappers живут в объекте соединения и переживают переподключения
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name if match.url_name else match.route
+
+
+def server_timing(stats, total):
+    return ', '.join([
+        f'db;dur={stats.db * 1000:.1f};desc="{stats.queries} queries"',
+        f'serialize;dur={stats.serialize * 1000:.1f}',
+        f'render;dur={stats.render * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(install_query_recorder)
+        install_serializer_timer()
+
+        # Без MiddlewareMixin: под ASGI он вызывает каждый хук через
+        # sync_to_async, а хук шаблонных ответов должен быть того же вида,
+        # что и обработчик
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # Соединения, открытые до включения метрик (тесты, runserver)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    def process_template_response(self, request, response):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.render_started = perf_counter()
+            response.add_post_render_callback(lambda response: self.rendered(stats))
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return self.process_template_response(request, response)
+
+    @staticmethod
+    def rendered(stats):
+        stats.render = perf_counter() - stats.render_started
+
+    def finish(self, request, response, stats):
+        total = perf_counter() - stats.started
+        size = None if response.streaming else len(response.content)
+        registry.observe(
+            view_name(request), request.method, response.status_code,
+            total, stats.queries, stats.db, stats.serialize, stats.render, size,
+        )
+        response.headers['Server-Timing'] = server_timing(stats, total)
+        return response
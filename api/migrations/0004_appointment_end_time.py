@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+
+
+def fill_end_time(apps, schema_editor):
+    Appointment = apps.get_model('api', 'Appointment')
+    appointments = list(Appointment.objects.select_related('service'))
+    for appointment in appointments:
+        start = datetime.combine(appointment.date, appointment.time)
+        end_time = (start + timedelta(minutes=appointment.service.duration)).time()
+        appointment.end_time = end_time if end_time > appointment.time else time.max
+    Appointment.objects.bulk_update(appointments, ['end_time'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_service_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_time',
+            field=models.TimeField(editable=False, null=True, verbose_name='Время окончания'),
+        ),
+        migrations.RunPython(fill_end_time, migrations.RunPython.noop),
+    ]
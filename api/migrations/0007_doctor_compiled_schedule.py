@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:51
+
+import api.working_hours
+from django.db import migrations, models
+
+
+def compile_schedules(apps, schema_editor):
+    Doctor = apps.get_model('api', 'Doctor')
+    doctors = list(Doctor.objects.all())
+    for doctor in doctors:
+        doctor.compiled_schedule = api.working_hours.compile_working_hours(doctor.working_hours)
+    Doctor.objects.bulk_update(doctors, ['compiled_schedule'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='compiled_schedule',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Компилированный график'),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='working_hours',
+            field=models.JSONField(default=dict, help_text='JSON с графиком работы по дням недели', validators=[api.working_hours.validate_working_hours], verbose_name='График работы'),
+        ),
+        migrations.RunPython(compile_schedules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_doctor_compiled_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='photo_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Размеры фотографии'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Размеры изображения'),
+        ),
+    ]
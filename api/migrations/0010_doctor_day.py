@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('appointments', models.JSONField(default=list, verbose_name='Записи')),
+                ('free', models.JSONField(default=list, verbose_name='Свободное время')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('doctor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.doctor', verbose_name='Врач')),
+            ],
+            options={
+                'verbose_name': 'Расписание врача на день',
+                'verbose_name_plural': 'Расписание врачей по дням',
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='doctor_day_unique')],
+            },
+        ),
+    ]
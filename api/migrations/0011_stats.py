@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def fill_stats(apps, schema_editor):
+    # Счетчики по уже существующим записям - как в api.stats.rebuild_stats
+    Appointment = apps.get_model('api', 'Appointment')
+    DailyStat = apps.get_model('api', 'DailyStat')
+    MonthlyStat = apps.get_model('api', 'MonthlyStat')
+    appointments = Appointment.objects.order_by()
+    DailyStat.objects.bulk_create(
+        DailyStat(count=row.pop('n'), **row)
+        for row in appointments.values('date', 'service_id', 'status').annotate(n=Count('pk'))
+    )
+    MonthlyStat.objects.bulk_create(
+        MonthlyStat(count=row.pop('n'), **row)
+        for row in appointments.annotate(month=TruncMonth('date'))
+        .values('month', 'doctor_id', 'service_id', 'status').annotate(n=Count('pk'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_doctor_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('status', models.CharField(max_length=10, verbose_name='Статус')),
+                ('count', models.IntegerField(default=0, verbose_name='Записей')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Статистика по дням',
+                'verbose_name_plural': 'Статистика по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'service', 'status'), name='daily_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('status', models.CharField(max_length=10, verbose_name='Статус')),
+                ('count', models.IntegerField(default=0, verbose_name='Записей')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.doctor', verbose_name='Врач')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Статистика по месяцам',
+                'verbose_name_plural': 'Статистика по месяцам',
+                'constraints': [models.UniqueConstraint(fields=('month', 'doctor', 'service', 'status'), name='monthly_stat_unique')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
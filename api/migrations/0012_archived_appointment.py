@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('patient_name', models.CharField(max_length=100, verbose_name='ФИО пациента')),
+                ('patient_phone', models.CharField(max_length=20, verbose_name='Телефон пациента')),
+                ('patient_email', models.EmailField(blank=True, max_length=254, verbose_name='Email пациента')),
+                ('date', models.DateField(verbose_name='Дата приема')),
+                ('time', models.TimeField(verbose_name='Время приема')),
+                ('end_time', models.TimeField(null=True, verbose_name='Время окончания')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий пациента')),
+                ('admin_notes', models.TextField(blank=True, verbose_name='Заметки администратора')),
+                ('status', models.CharField(choices=[('pending', '⏳ Ожидает подтверждения'), ('confirmed', '✅ Подтверждена'), ('cancelled', '❌ Отменена'), ('completed', '✅ Завершена')], max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('archived_at', models.DateTimeField(verbose_name='Дата архивации')),
+                ('doctor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.doctor', verbose_name='Врач')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Архивная запись',
+                'verbose_name_plural': 'Архив записей',
+                'ordering': ['-date', '-time'],
+                'indexes': [models.Index(fields=['date', 'time'], name='archive_date_time_idx'), models.Index(fields=['doctor', 'date'], name='archive_doctor_date_idx')],
+            },
+        ),
+    ]
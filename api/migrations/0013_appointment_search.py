@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+import api.search
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    api.search.install(schema_editor)
+
+
+def uninstall_search(apps, schema_editor):
+    api.search.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_archived_appointment'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
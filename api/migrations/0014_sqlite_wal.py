@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:10
+
+from django.db import migrations
+
+
+def set_journal_mode(mode):
+    def operation(apps, schema_editor):
+        # Режим хранится в файле базы; вне транзакции - внутри SQLite его не меняет
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode = {mode}')
+    return operation
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0013_appointment_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode('WAL'), set_journal_mode('DELETE')),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:40
+
+import api.search
+from django.db import migrations
+
+
+def reinstall_search(apps, schema_editor):
+    # Триггеры и телефоны в индексе - с новой очисткой номера
+    api.search.uninstall(schema_editor)
+    api.search.install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_sqlite_wal'),
+    ]
+
+    operations = [
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,43 @@
+import logging
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator
+from datetime import time as datetime_time
 from decimal import Decimal
 
+from .images import DOCTOR_PHOTO, IMAGE_ERRORS, SERVICE_IMAGE, generate_derivatives, variants_are_current
+from .working_hours import compile_working_hours, validate_working_hours
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_image_variants(instance, field_name, variants_name, spec):
+    """
+    Пересоздает уменьшенные копии изображения, если файл сменился.
+    Возвращает True, если описание производных изменилось и его нужно сохранить.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_name)
+
+    if not field_file:
+        new_variants = {}
+    elif variants_are_current(variants, field_file.name):
+        return False
+    else:
+        try:
+            new_variants = generate_derivatives(settings.MEDIA_ROOT, field_file.name, **spec)
+        except IMAGE_ERRORS as e:
+            # Копии не создать - показываем оригинал
+            logger.warning('Производные для %s не созданы: %s', field_file.name, e)
+            new_variants = {'source': field_file.name}
+
+    if new_variants == variants:
+        return False
+    setattr(instance, variants_name, new_variants)
+    return True
+
 
 class Service(models.Model):
     name = models.CharField(max_length=100, verbose_name='Название услуги')
@@ -24,6 +60,9 @@ class Service(models.Model):
         null=True,
         verbose_name='Изображение услуги'
     )
+    # Уменьшенные копии изображения (см. api/images.py)
+    image_variants = models.JSONField(default=dict, editable=False, verbose_name='Размеры изображения')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Услуга'
@@ -33,6 +72,42 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.name} - {self.price} руб."
 
+    def save(self, *args, **kwargs):
+        duration_changed = bool(self.pk) and Service.objects.filter(pk=self.pk).exclude(
+            duration=self.duration
+        ).exists()
+        super().save(*args, **kwargs)
+
+        if refresh_image_variants(self, 'image', 'image_variants', SERVICE_IMAGE):
+            super().save(update_fields=['image_variants'])
+
+        if duration_changed:
+            refresh_end_times([self])
+
+
+def refresh_end_times(services, batch_size=1000):
+    """
+    Время окончания записей хранится денормализованно - пересчитываем его
+    после смены длительности услуг ``services``. Только для активных записей
+    с сегодняшнего дня: ``end_time`` нужен проверкам пересечений, а прошедшие,
+    отмененные и завершенные записи сохраняют фактическую длительность.
+    Записи обновляются пачками по ``batch_size``.
+    """
+    by_id = {service.pk: service for service in services}
+    pending = Appointment.objects.active().filter(
+        service_id__in=by_id, date__gte=timezone.localdate(),
+    ).only('doctor_id', 'service_id', 'date', 'time', 'end_time', 'status').order_by('pk')
+    last_pk = 0
+    while True:
+        appointments = list(pending.filter(pk__gt=last_pk)[:batch_size])
+        if not appointments:
+            break
+        for appointment in appointments:
+            appointment.service = by_id[appointment.service_id]
+            appointment.end_time = appointment.compute_end_time()
+        Appointment.objects.bulk_update(appointments, ['end_time'])
+        last_pk = appointments[-1].pk
+
 
 class Doctor(models.Model):
     name = models.CharField(max_length=100, verbose_name='ФИО врача')
@@ -51,12 +126,22 @@ class Doctor(models.Model):
         null=True,
         verbose_name='Фотография'
     )
+    # Уменьшенные копии фотографии (см. api/images.py)
+    photo_variants = models.JSONField(default=dict, editable=False, verbose_name='Размеры фотографии')
     is_active = models.BooleanField(default=True, verbose_name='Активен')
     working_hours = models.JSONField(
         default=dict,
         verbose_name='График работы',
-        help_text='JSON с графиком работы по дням недели'
+        help_text='JSON с графиком работы по дням недели',
+        validators=[validate_working_hours]
     )
+    # Заполняется при сохранении из working_hours (см. api/working_hours.py)
+    compiled_schedule = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Компилированный график'
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Врач'
@@ -66,6 +151,42 @@ class Doctor(models.Model):
     def __str__(self):
         return f"{self.name} - {self.specialty}"
 
+    def save(self, *args, **kwargs):
+        self.compiled_schedule = compile_working_hours(self.working_hours)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'working_hours' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'compiled_schedule'}
+        super().save(*args, **kwargs)
+
+        if refresh_image_variants(self, 'photo', 'photo_variants', DOCTOR_PHOTO):
+            super().save(update_fields=['photo_variants'])
+
+class CatalogVersion(models.Model):
+    """Версия каталога услуг и врачей, увеличивается при любом их изменении."""
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = 'Версии каталога'
+
+    def __str__(self):
+        return f"Каталог v{self.version}"
+
+
+# Статусы, которые занимают время врача
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__in=Appointment.ACTIVE_STATUSES)
+
+    def overlapping(self, doctor, date, start, end):
+        """Активные записи врача на дату, пересекающиеся с интервалом [start, end)."""
+        return self.active().filter(doctor=doctor, date=date, time__lt=end, end_time__gt=start)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', '⏳ Ожидает подтверждения'),
@@ -73,6 +194,8 @@ class Appointment(models.Model):
         ('cancelled', '❌ Отменена'),
         ('completed', '✅ Завершена'),
     ]
+    ACTIVE_STATUSES = ACTIVE_STATUSES
+    TRACKED_FIELDS = ('doctor_id', 'service_id', 'date', 'status')
 
     # Данные пациента (с временным default)
     patient_name = models.CharField(
@@ -92,9 +215,12 @@ class Appointment(models.Model):
 
     # Остальные поля без изменений...
     service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
-    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, verbose_name='Врач')
+    # Отдельный индекс по doctor_id не нужен - его покрывает appt_doctor_date_idx
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, db_index=False, verbose_name='Врач')
     date = models.DateField(verbose_name='Дата приема')
     time = models.TimeField(verbose_name='Время приема')
+    # Заполняется при сохранении из time + service.duration, нужно для поиска пересечений
+    end_time = models.TimeField(null=True, editable=False, verbose_name='Время окончания')
     comment = models.TextField(blank=True, verbose_name='Комментарий пациента')
     admin_notes = models.TextField(blank=True, verbose_name='Заметки администратора')
 
@@ -107,15 +233,46 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Запись на прием'
         verbose_name_plural = 'Записи на прием'
         ordering = ['-date', '-time']
-        unique_together = ['doctor', 'date', 'time']
+        indexes = [
+            # Запись и свободное время: doctor=, date=/BETWEEN, status IN (...), time <, end_time >.
+            # end_time в индексе делает его покрывающим для обоих запросов
+            models.Index(fields=['doctor', 'date', 'status', 'time', 'end_time'], name='appt_doctor_date_idx'),
+            # Сортировка списка (-date, -time), фильтры "на сегодня"/"предстоящие"/"прошедшие", date_hierarchy
+            models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+            # Фильтр по статусу с той же сортировкой и подсчет записей по статусу
+            models.Index(fields=['status', 'date', 'time'], name='appt_status_date_idx'),
+        ]
+        constraints = [
+            # Отмененные и завершенные записи время не занимают
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='appointment_active_slot_unique',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient_name} - {self.doctor.name} - {self.date} {self.time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения при загрузке: если их поменяют, запись надо убрать из
+        # старого дня расписания (api/daily_schedule.py) и старой строки
+        # статистики (api/stats.py)
+        instance.loaded_values = instance.tracked_values()
+        return instance
+
+    def tracked_values(self):
+        """Поля, от которых зависят расписание по дням и статистика; None - поле не загружено."""
+        return {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+
     def get_duration(self):
         return self.service.duration if self.service else 30
 
@@ -125,4 +282,116 @@ class Appointment(models.Model):
             start_time = datetime.combine(self.date, self.time)
             end_time = start_time + timedelta(minutes=self.get_duration())
             return end_time.time()
-        return None
\ No newline at end of file
+        return None
+
+    def compute_end_time(self):
+        end_time = self.get_end_time()
+        # Прием, заканчивающийся после полуночи, ограничиваем концом суток
+        if end_time is not None and end_time <= self.time:
+            return datetime_time.max
+        return end_time
+
+    def save(self, *args, **kwargs):
+        # Значения могли прийти строками ('10:00') - приводим к типам полей
+        for name in ('date', 'time'):
+            setattr(self, name, self._meta.get_field(name).to_python(getattr(self, name)))
+        self.end_time = self.compute_end_time()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('time' in update_fields or 'service' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'end_time'}
+        super().save(*args, **kwargs)
+
+
+class ArchivedAppointment(models.Model):
+    """
+    Старые завершенные и отмененные записи, перенесенные из ``Appointment``
+    командой ``archive_appointments`` (см. api/archive.py). Только для просмотра.
+    """
+    # id исходной записи
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID')
+    patient_name = models.CharField(max_length=100, verbose_name='ФИО пациента')
+    patient_phone = models.CharField(max_length=20, verbose_name='Телефон пациента')
+    patient_email = models.EmailField(blank=True, verbose_name='Email пациента')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
+    # Отдельный индекс по doctor_id не нужен - его покрывает archive_doctor_date_idx
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, db_index=False, verbose_name='Врач')
+    date = models.DateField(verbose_name='Дата приема')
+    time = models.TimeField(verbose_name='Время приема')
+    end_time = models.TimeField(null=True, verbose_name='Время окончания')
+    comment = models.TextField(blank=True, verbose_name='Комментарий пациента')
+    admin_notes = models.TextField(blank=True, verbose_name='Заметки администратора')
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES, verbose_name='Статус')
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    archived_at = models.DateTimeField(verbose_name='Дата архивации')
+
+    class Meta:
+        verbose_name = 'Архивная запись'
+        verbose_name_plural = 'Архив записей'
+        ordering = ['-date', '-time']
+        indexes = [
+            # Сортировка списка (-date, -time) и date_hierarchy
+            models.Index(fields=['date', 'time'], name='archive_date_time_idx'),
+            # Фильтр по врачу и каскадное удаление врача
+            models.Index(fields=['doctor', 'date'], name='archive_doctor_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient_name} - {self.date} {self.time}"
+
+
+class DoctorDay(models.Model):
+    """
+    Расписание врача на один день: записи и свободные промежутки.
+    Пересчитывается при изменении записей этого дня (см. api/daily_schedule.py).
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, db_index=False, verbose_name='Врач')
+    date = models.DateField(verbose_name='Дата')
+    # [{'id', 'time', 'end', 'status', 'patient_name', 'patient_phone', 'service'}, ...] по времени
+    appointments = models.JSONField(default=list, verbose_name='Записи')
+    # [['09:00', '10:30'], ...] - рабочее время без активных записей
+    free = models.JSONField(default=list, verbose_name='Свободное время')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Расписание врача на день'
+        verbose_name_plural = 'Расписание врачей по дням'
+        constraints = [
+            # Индекс ограничения обслуживает и чтение: doctor_id IN (...) AND date BETWEEN
+            models.UniqueConstraint(fields=['doctor', 'date'], name='doctor_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date}"
+
+
+class DailyStat(models.Model):
+    """Число записей по дню, услуге и статусу (см. api/stats.py)."""
+    date = models.DateField(verbose_name='Дата')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
+    status = models.CharField(max_length=10, verbose_name='Статус')
+    count = models.IntegerField(default=0, verbose_name='Записей')
+
+    class Meta:
+        verbose_name = 'Статистика по дням'
+        verbose_name_plural = 'Статистика по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'service', 'status'], name='daily_stat_unique'),
+        ]
+
+
+class MonthlyStat(models.Model):
+    """Число записей по месяцу, врачу, услуге и статусу (см. api/stats.py)."""
+    # Первое число месяца
+    month = models.DateField(verbose_name='Месяц')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, verbose_name='Врач')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name='Услуга')
+    status = models.CharField(max_length=10, verbose_name='Статус')
+    count = models.IntegerField(default=0, verbose_name='Записей')
+
+    class Meta:
+        verbose_name = 'Статистика по месяцам'
+        verbose_name_plural = 'Статистика по месяцам'
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'doctor', 'service', 'status'], name='monthly_stat_unique'),
+        ]
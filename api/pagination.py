@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NameCursorPagination(CursorPagination):
+    """Курсорная пагинация каталога в порядке Meta.ordering моделей (по имени)."""
+    ordering = ('name', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,123 @@
+"""
+Расчет свободного времени врачей.
+
+График работы берется из компилированного ``Doctor.compiled_schedule``
+(см. ``api/working_hours.py``), длительность приема - из ``Service.duration``,
+занятое время - из активных записей ``Appointment``. Все записи врача
+за диапазон дат читаются одним запросом.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Appointment
+from .working_hours import format_minutes, shifts_for
+
+# Шаг сетки начала приема (мин)
+SLOT_STEP = 15
+
+# Максимальная длина запрашиваемого диапазона (дней)
+MAX_RANGE_DAYS = 90
+
+
+def to_minutes(value):
+    """time(9, 30) -> 570; time.max считается концом суток."""
+    if value.hour == 23 and value.minute == 59 and value.second == 59:
+        return 24 * 60
+    return value.hour * 60 + value.minute + (1 if value.second or value.microsecond else 0)
+
+
+def get_busy_intervals(doctor, date_from, date_to):
+    """
+    Занятые интервалы врача за диапазон дат: {дата: [(начало, конец), ...]}.
+
+    Один запрос на врача и диапазон.
+    """
+    rows = Appointment.objects.active().filter(
+        doctor=doctor,
+        date__range=(date_from, date_to),
+    ).order_by().values_list('date', 'time', 'end_time')
+
+    busy = defaultdict(list)
+    for day, start, end in rows:
+        busy[day].append((to_minutes(start), to_minutes(end)))
+    return busy
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_starts(shifts, busy, duration, not_before=0):
+    """
+    Свободные начала приема длительностью ``duration`` внутри смен ``shifts``,
+    не пересекающиеся с ``busy``. Все значения - минуты от начала суток.
+    """
+    merged = _merge(busy)
+    starts = [interval[0] for interval in merged]
+    ends = [interval[1] for interval in merged]
+
+    result = []
+    for shift_start, shift_end in shifts:
+        candidate = shift_start
+        if candidate < not_before:
+            # Выравниваем по сетке смены
+            candidate += -(-(not_before - candidate) // SLOT_STEP) * SLOT_STEP
+        while candidate + duration <= shift_end:
+            # Первый занятый интервал, который заканчивается позже начала
+            index = bisect_right(ends, candidate)
+            if index < len(merged) and starts[index] < candidate + duration:
+                # Перепрыгиваем занятый интервал, оставаясь на сетке
+                candidate += -(-(ends[index] - candidate) // SLOT_STEP) * SLOT_STEP
+                continue
+            result.append(candidate)
+            candidate += SLOT_STEP
+    return result
+
+
+def free_gaps(shifts, busy):
+    """Промежутки смен ``shifts`` без занятых интервалов ``busy`` (минуты)."""
+    merged = _merge(busy)
+    gaps = []
+    for shift_start, shift_end in shifts:
+        start = shift_start
+        for busy_start, busy_end in merged:
+            if busy_end <= start or busy_start >= shift_end:
+                continue
+            if busy_start > start:
+                gaps.append((start, busy_start))
+            start = max(start, busy_end)
+        if start < shift_end:
+            gaps.append((start, shift_end))
+    return gaps
+
+
+def get_free_slots(doctor, service, date_from, date_to):
+    """
+    Свободные времена начала приема у врача на услугу за диапазон дат.
+
+    Возвращает {дата: ['09:00', '09:15', ...]} только для дней,
+    в которых есть хотя бы одно свободное время.
+    """
+    busy = get_busy_intervals(doctor, date_from, date_to)
+
+    now = timezone.localtime()
+    slots = {}
+    day = date_from
+    while day <= date_to:
+        if day >= now.date():
+            not_before = now.hour * 60 + now.minute + 1 if day == now.date() else 0
+            starts = free_starts(shifts_for(doctor.compiled_schedule, day.weekday()), busy.get(day, []), service.duration, not_before)
+            if starts:
+                slots[day] = [format_minutes(start) for start in starts]
+        day += timedelta(days=1)
+    return slots
@@ -0,0 +1,122 @@
+"""
+Полнотекстовый поиск записей для регистратуры (SQLite FTS5).
+
+``search_fields`` админки превращаются в ``LIKE '%...%'`` по четырем полям
+с JOIN врача - полный просмотр таблицы на каждый поиск. Вместо этого
+поиск идет по теневой FTS5-таблице ``api_appointment_search``: rowid -
+id записи, колонки - имя, email пациента, имя врача и телефон.
+
+Таблицу поддерживают триггеры SQLite (создаются миграцией), а не сигналы:
+записи вставляются и удаляются и мимо ``save()`` - ``bulk_create``,
+импорт и генератор данных через ``executemany``, перенос в архив,
+каскадное удаление. Переименование врача обновляет его записи в индексе.
+
+Имена, email и врач ищутся по началу слов (``иван`` находит "Иванов
+Иван"). Телефон хранится только цифрами - целиком и последними
+``LOCAL_DIGITS`` цифрами, поэтому "+996 (700) 12-34", "0700/1234" и
+"0700 1234" находят один номер.
+"""
+import re
+
+from django.db.models.expressions import RawSQL
+
+TABLE = 'api_appointment_search'
+
+# Последние цифры номера без кода страны: 700 123 456
+LOCAL_DIGITS = 9
+
+# Длина поля Appointment.patient_phone: триггеры проверяют каждый символ
+PHONE_LENGTH = 20
+
+TEXT_COLUMNS = '{patient_name patient_email doctor_name}'
+
+WORD = re.compile(r'\w+')
+
+
+def _phone_sql(column):
+    # Только цифры, как phone_digits при записи. Функции Python и WITH в
+    # триггерах недоступны, поэтому символы перебираются по одному
+    digits = ' || '.join(
+        f"CASE WHEN substr({column}, {i}, 1) GLOB '[0-9]' THEN substr({column}, {i}, 1) ELSE '' END"
+        for i in range(1, PHONE_LENGTH + 1)
+    )
+    digits = f'({digits})'
+    return f"{digits} || ' ' || substr({digits}, -{LOCAL_DIGITS})"
+
+
+def _index_sql(row, source):
+    return (
+        f'INSERT INTO {TABLE} (rowid, patient_name, patient_email, doctor_name, phone) '
+        f'SELECT {row}.id, {row}.patient_name, {row}.patient_email, api_doctor.name, '
+        f'{_phone_sql(row + ".patient_phone")} FROM {source}'
+    )
+
+
+# Строка new триггера и ее врач
+NEW_ROW = 'api_doctor WHERE api_doctor.id = new.doctor_id'
+
+
+def install(schema_editor):
+    """Создает таблицу, триггеры и индексирует существующие записи (только SQLite)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    statements = [
+        f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+        f"patient_name, patient_email, doctor_name, phone, "
+        f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+        f'''CREATE TRIGGER {TABLE}_insert AFTER INSERT ON api_appointment BEGIN
+            {_index_sql('new', NEW_ROW)};
+        END''',
+        f'''CREATE TRIGGER {TABLE}_delete AFTER DELETE ON api_appointment BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+        END''',
+        # save() обновляет все поля - индекс трогаем, только если изменились искомые
+        f'''CREATE TRIGGER {TABLE}_update
+        AFTER UPDATE OF patient_name, patient_phone, patient_email, doctor_id ON api_appointment
+        WHEN old.patient_name IS NOT new.patient_name OR old.patient_phone IS NOT new.patient_phone
+            OR old.patient_email IS NOT new.patient_email OR old.doctor_id IS NOT new.doctor_id
+        BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+            {_index_sql('new', NEW_ROW)};
+        END''',
+        f'''CREATE TRIGGER {TABLE}_doctor AFTER UPDATE OF name ON api_doctor
+        WHEN old.name IS NOT new.name BEGIN
+            UPDATE {TABLE} SET doctor_name = new.name
+            WHERE rowid IN (SELECT id FROM api_appointment WHERE doctor_id = new.id);
+        END''',
+        _index_sql('api_appointment', 'api_appointment JOIN api_doctor ON api_doctor.id = api_appointment.doctor_id'),
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def uninstall(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('insert', 'delete', 'update', 'doctor'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLE}_{trigger}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def _phone_query(digits):
+    # Ведущие нули - префикс выхода на межгород или за границу: 0700..., 00996...
+    return f'phone : "{digits.lstrip("0") or digits}"*'
+
+
+def match_query(term):
+    """Выражение MATCH для строки поиска или None, если в ней нет слов."""
+    words = WORD.findall(term)
+    parts = [f'{TEXT_COLUMNS} : "{word}"*' for word in words if not word.isdigit()]
+    # Числа вместе - один телефон, записанный с пробелами, скобками и т.п.
+    phone_digits = ''.join(word for word in words if word.isdigit())
+    if phone_digits:
+        parts.append(_phone_query(phone_digits))
+    return ' AND '.join(parts) or None
+
+
+def search(queryset, term):
+    """Записи из ``queryset``, найденные по строке ``term``."""
+    query = match_query(term)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [query]))
@@ -1,20 +1,72 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
+from .booking import claim_slot, claim_slots
+from .images import FORMATS, build_srcset
 from .models import Service, Doctor, Appointment
+from .scheduling import MAX_RANGE_DAYS
+
+
+
+class SparseFieldsMixin:
+    """Принимает fields=[...] и оставляет в выводе только эти поля."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SrcsetField(serializers.Field):
+    """{'webp': 'url 150w, url 300w', 'jpeg': ...} из описания производных изображения."""
 
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
 
+    def to_representation(self, variants):
+        if not variants.get('webp'):
+            return None
+        return {key: build_srcset(variants, key, default_storage.url) for key in FORMATS}
+
+
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    image_srcset = SrcsetField(source='image_variants')
 
-class ServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
-        fields = '__all__'
+        exclude = ['image_variants']
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     services = ServiceSerializer(many=True, read_only=True)
+    photo_srcset = SrcsetField(source='photo_variants')
 
     class Meta:
         model = Doctor
-        fields = '__all__'
+        exclude = ['compiled_schedule', 'photo_variants']
+
+
+# Компактные представления для /api/catalog/
+class CatalogServiceSerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source='image_variants')
+
+    class Meta:
+        model = Service
+        fields = ['id', 'name', 'description', 'price', 'duration', 'image', 'image_srcset']
+
+
+class CatalogDoctorSerializer(serializers.ModelSerializer):
+    photo_srcset = SrcsetField(source='photo_variants')
+
+    class Meta:
+        model = Doctor
+        fields = ['id', 'name', 'specialty', 'experience', 'description', 'photo', 'photo_srcset']
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -57,10 +109,131 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         patient_phone = validated_data.pop('patient_phone')
         patient_email = validated_data.pop('patient_email', '')
 
-        appointment = Appointment.objects.create(
+        appointment = claim_slot(
             patient_name=patient_name,
             patient_phone=patient_phone,
             patient_email=patient_email,
             **validated_data
         )
-        return appointment
\ No newline at end of file
+        return appointment
+
+class AppointmentSearchSerializer(serializers.ModelSerializer):
+    doctor = serializers.CharField(source='doctor.name')
+    service = serializers.CharField(source='service.name')
+
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient_name', 'patient_phone', 'patient_email',
+            'doctor', 'service', 'date', 'time', 'status',
+        ]
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class PreloadedPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """
+    Берет объект из словаря ``context['preloaded'][модель]`` (ключ - id
+    строкой), загруженного один раз на пачку; если там нет - как обычно.
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.queryset.model, {})
+        obj = preloaded.get(str(data))
+        return obj if obj is not None else super().to_internal_value(data)
+
+
+class AppointmentBatchItemSerializer(AppointmentCreateSerializer):
+    service = PreloadedPrimaryKeyField(queryset=Service.objects.all())
+    doctor = PreloadedPrimaryKeyField(queryset=Doctor.objects.all())
+
+    def validate_date(self, value):
+        if value < timezone.localdate():
+            raise serializers.ValidationError("Нельзя записаться на прошедшую дату.")
+        return value
+
+
+# Наибольший id (BigAutoField)
+MAX_ID = 2 ** 63 - 1
+
+
+class AppointmentBatchSerializer(serializers.Serializer):
+    MAX_SIZE = 20
+
+    appointments = AppointmentBatchItemSerializer(many=True, allow_empty=False, max_length=MAX_SIZE)
+
+    def to_internal_value(self, data):
+        # Врачи и услуги всех записей - двумя запросами, а не по два на запись
+        items = data.get('appointments') if isinstance(data, dict) else None
+        if isinstance(items, list):
+            items = [item for item in items[:self.MAX_SIZE] if isinstance(item, dict)]
+            self.context['preloaded'] = {
+                model: {str(obj.pk): obj for obj in model.objects.filter(pk__in=ids)}
+                for model, ids in [
+                    (Service, self._ids(items, 'service')),
+                    (Doctor, self._ids(items, 'doctor')),
+                ]
+            }
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def _ids(items, name):
+        # Id вне диапазона BigAutoField SQLite не принимает (OverflowError);
+        # такие записи получат обычную ошибку поля
+        ids = {int(item[name]) for item in items if str(item.get(name)).isdecimal()}
+        return {pk for pk in ids if pk <= MAX_ID}
+
+    def create(self, validated_data):
+        return claim_slots([
+            Appointment(status='pending', **item) for item in validated_data['appointments']
+        ])
+
+
+class ScheduleQuerySerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+    period = serializers.ChoiceField(choices=['day', 'week'], default='day')
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.filter(is_active=True), required=False)
+
+    def validate(self, attrs):
+        day = attrs.get('date') or timezone.localdate()
+        if attrs['period'] == 'week':
+            # Неделя с понедельника
+            day -= timedelta(days=day.weekday())
+            attrs['date_to'] = day + timedelta(days=6)
+        else:
+            attrs['date_to'] = day
+        attrs['date_from'] = day
+        return attrs
+
+
+class SlotQuerySerializer(serializers.Serializer):
+    service = serializers.PrimaryKeyRelatedField(
+        queryset=Service.objects.filter(is_active=True),
+        error_messages={'does_not_exist': 'Услуга {pk_value} не найдена или врач ее не оказывает.'},
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        doctor = self.context.get('doctor')
+        if doctor is not None:
+            # Только услуги врача - тем же запросом, что ищет услугу
+            self.fields['service'].queryset = doctor.services.filter(is_active=True)
+
+    def validate(self, attrs):
+        date_from = attrs.get('date_from') or timezone.localdate()
+        date_to = attrs.get('date_to') or date_from
+
+        if date_to < date_from:
+            raise serializers.ValidationError("Дата окончания раньше даты начала.")
+
+        if (date_to - date_from) >= timedelta(days=MAX_RANGE_DAYS):
+            raise serializers.ValidationError(f"Диапазон не может превышать {MAX_RANGE_DAYS} дней.")
+
+        attrs['date_from'] = date_from
+        attrs['date_to'] = date_to
+        return attrs
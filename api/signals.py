@@ -0,0 +1,86 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .daily_schedule import forget_doctor_days, forget_service_days, refresh_days
+from .models import Appointment, ArchivedAppointment, Service, Doctor
+from .stats import record as record_stats, removal
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def catalog_changed(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Doctor.services.through)
+def doctor_services_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_catalog()
+
+
+@receiver(post_save, sender=Service)
+def service_days_changed(sender, instance, created, raw=False, **kwargs):
+    # Название и длительность услуги есть в расписании по дням
+    if not created and not raw:
+        forget_service_days([instance.pk])
+
+
+@receiver(pre_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    # Записи на услугу удалятся каскадно без пересчета дней (см. ниже)
+    forget_service_days([instance.pk])
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_days_changed(sender, instance, created, raw=False, **kwargs):
+    # Свободное время считается по графику врача
+    if not created and not raw:
+        forget_doctor_days([instance.pk])
+
+
+@receiver(pre_delete, sender=Doctor)
+def doctor_deleted(sender, instance, **kwargs):
+    # Записи врача (и архивные) удалятся каскадно без сигналов (см. ниже);
+    # строки MonthlyStat врача тоже, а в DailyStat врача нет - вычитаем его записи
+    record_stats(removal(Appointment.objects.filter(doctor=instance)))
+    record_stats(removal(ArchivedAppointment.objects.filter(doctor=instance)))
+
+
+def _loaded_values(instance):
+    # None - запись создана не из базы или поля были отложены
+    values = getattr(instance, 'loaded_values', None)
+    return values if values and None not in values.values() else None
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    values = instance.tracked_values()
+    loaded = None if created else _loaded_values(instance)
+
+    days = {(values['doctor_id'], values['date'])}
+    if loaded:
+        # Запись могли перенести на другой день или к другому врачу
+        days.add((loaded['doctor_id'], loaded['date']))
+    refresh_days(days)
+
+    if created:
+        record_stats([(values, 1)])
+    elif loaded and loaded != values:
+        record_stats([(loaded, -1), (values, 1)])
+    instance.loaded_values = values
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, origin=None, **kwargs):
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Appointment:
+        # Каскадное удаление вместе с врачом или услугой: их строки расписания
+        # и статистики удаляются каскадно, остальное - в *_deleted выше
+        return
+    values = _loaded_values(instance) or instance.tracked_values()
+    refresh_days({(values['doctor_id'], values['date'])})
+    record_stats([(values, -1)])
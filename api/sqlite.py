@@ -0,0 +1,21 @@
+"""
+Настройка соединений с SQLite: ``settings.SQLITE_PRAGMAS`` выполняются на
+каждом новом соединении (приемник ``connection_created``).
+
+Эти PRAGMA действуют только на соединение и файл базы не меняют.
+``journal_mode = WAL`` хранится в самом файле базы - его один раз включает
+миграция ``0014_sqlite_wal`` (чтение не блокирует запись и наоборот). Время ожидания блокировки задает
+``OPTIONS['timeout']`` в ``DATABASES``.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Напрямую через sqlite3: мимо execute_wrapper и журнала запросов
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,172 @@
+"""
+Статистика записей для панели администратора.
+
+Считать ее по ``Appointment`` при каждом открытии - просмотр всей таблицы,
+поэтому счетчики хранятся в двух сводных таблицах:
+
+- ``DailyStat`` - число записей по (дата, услуга, статус): график по дням;
+- ``MonthlyStat`` - по (месяц, врач, услуга, статус): разбивка по врачам,
+  услугам и статусам.
+
+Выручка не хранится: это сумма ``count * Service.price`` по строкам, так что
+новая цена учитывается сразу, как и при расчете по самим записям.
+
+Счетчики меняются на разницу (``record``) в той же транзакции, что и записи:
+сигналы записи (``api/signals.py``), запись пачкой, импорт и массовая смена
+статуса в админке (``status_change`` считается до ``queryset.update``).
+Если счетчики все же разошлись с записями (правка базы вручную, ``save()``
+записи, созданной не из базы), команда ``rebuild_stats`` их сверяет и
+исправляет.
+
+Записи, перенесенные в архив (``api/archive.py``), из статистики не
+выпадают: перенос счетчики не меняет, а сверка считает обе таблицы.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Appointment, ArchivedAppointment, DailyStat, MonthlyStat
+
+# Статусы, которые дают выручку
+REVENUE_STATUSES = ('completed',)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(month):
+    return month_start(month + timedelta(days=31)) - timedelta(days=1)
+
+
+# Сводная таблица, поля ключа и ключ по значениям полей записи
+ROLLUPS = [
+    (
+        DailyStat, ('date', 'service_id', 'status'),
+        lambda values: (values['date'], values['service_id'], values['status']),
+    ),
+    (
+        MonthlyStat, ('month', 'doctor_id', 'service_id', 'status'),
+        lambda values: (month_start(values['date']), values['doctor_id'], values['service_id'], values['status']),
+    ),
+]
+
+
+def _upsert(model, columns, deltas):
+    """Прибавляет ``deltas`` {ключ: разница} к счетчикам одним ``executemany``."""
+    if not deltas:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    names = ', '.join(quote(model._meta.get_field(name).column) for name in columns)
+    count = quote('count')
+    sql = (
+        f'INSERT INTO {table} ({names}, {count}) VALUES ({", ".join(["%s"] * (len(columns) + 1))}) '
+        f'ON CONFLICT ({names}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}'
+    )
+    # Первое поле ключа - дата
+    adapt = connection.ops.adapt_datefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(adapt(key[0]), *key[1:], delta) for key, delta in deltas.items()])
+
+
+def record(changes):
+    """
+    Учитывает изменения числа записей: ``changes`` - пары (значения полей
+    ``Appointment.TRACKED_FIELDS``, разница), например ``(values, 1)`` для
+    новой записи и ``(values, -1)`` для удаленной.
+    """
+    changes = list(changes)
+    for model, columns, key in ROLLUPS:
+        deltas = Counter()
+        for values, delta in changes:
+            deltas[key(values)] += delta
+        _upsert(model, columns, {k: delta for k, delta in deltas.items() if delta})
+
+
+def _grouped(queryset):
+    """(значения полей, число записей) одним запросом с группировкой."""
+    rows = queryset.order_by().values(*Appointment.TRACKED_FIELDS).annotate(n=Count('pk'))
+    for row in rows:
+        n = row.pop('n')
+        yield row, n
+
+
+def removal(queryset):
+    """Изменения счетчиков для удаления записей без сигналов (каскадом)."""
+    return [(row, -n) for row, n in _grouped(queryset)]
+
+
+def status_change(queryset, status):
+    """
+    Изменения счетчиков для ``queryset.update(status=status)`` - считаются
+    до update, он сигналов не отправляет.
+    """
+    changes = []
+    for row, n in _grouped(queryset.exclude(status=status)):
+        changes.append((row, -n))
+        changes.append(({**row, 'status': status}, n))
+    return changes
+
+
+def _fresh_counts(model, columns):
+    counts = Counter()
+    for source in (Appointment, ArchivedAppointment):
+        appointments = source.objects.order_by()
+        if model is MonthlyStat:
+            appointments = appointments.annotate(month=TruncMonth('date'))
+        rows = appointments.values(*columns).annotate(n=Count('pk')).values_list(*columns, 'n')
+        counts.update({tuple(row[:-1]): row[-1] for row in rows})
+    return counts
+
+
+def rebuild_stats():
+    """
+    Сверяет счетчики с записями и исправляет расхождения.
+    Возвращает {сводная таблица: число исправленных строк}.
+    """
+    fixed = {}
+    with transaction.atomic():
+        for model, columns, _ in ROLLUPS:
+            fresh = _fresh_counts(model, columns)
+            current = {tuple(row[:-1]): row[-1] for row in model.objects.values_list(*columns, 'count')}
+            deltas = {key: fresh.get(key, 0) - current.get(key, 0) for key in fresh.keys() | current.keys()}
+            deltas = {key: delta for key, delta in deltas.items() if delta}
+            _upsert(model, columns, deltas)
+            model.objects.filter(count=0).delete()
+            fixed[model] = len(deltas)
+    return fixed
+
+
+def _totals():
+    revenue = F('count') * F('service__price')
+    return {
+        'total': Sum('count'),
+        'completed': Sum('count', filter=Q(status='completed')),
+        'cancelled': Sum('count', filter=Q(status='cancelled')),
+        'revenue': Sum(revenue, filter=Q(status__in=REVENUE_STATUSES), output_field=DecimalField()),
+    }
+
+
+def dashboard(month):
+    """Статистика за месяц (первое число ``month``) - только из сводных таблиц."""
+    monthly = MonthlyStat.objects.filter(month=month, count__gt=0).order_by()
+    daily = DailyStat.objects.filter(date__range=(month, month_end(month)), count__gt=0).order_by()
+    revenue = Sum(F('count') * F('service__price'), output_field=DecimalField())
+    statuses = dict(Appointment.STATUS_CHOICES)
+
+    by_status = [
+        {'status': statuses.get(row['status'], row['status']), 'count': row['total'], 'amount': row['amount']}
+        for row in monthly.values('status').annotate(total=Sum('count'), amount=revenue).order_by('status')
+    ]
+    return {
+        'totals': monthly.aggregate(**_totals()),
+        'by_status': by_status,
+        'by_doctor': list(monthly.values('doctor__name').annotate(**_totals()).order_by('-total', 'doctor__name')),
+        'by_service': list(monthly.values('service__name').annotate(**_totals()).order_by('-total', 'service__name')),
+        'by_day': list(daily.values('date').annotate(**_totals()).order_by('date')),
+    }
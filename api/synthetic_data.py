@@ -0,0 +1,385 @@
+"""
+Синтетические данные в объеме продакшена для локальных замеров.
+
+Врачи получают специализацию и услуги из ``api/fixtures`` (терапевт - кариес,
+пульпит, гигиена; хирург - удаление, имплантация и т.д.) и один из типовых
+графиков работы. Записи раскладываются по ``compiled_schedule`` каждого врача
+на сетке ``UNIT`` минут без пересечений, так что соблюдаются и рабочие часы,
+и ``appointment_active_slot_unique``. Дни заполняются от ``end`` назад, пока
+не наберется нужное число записей; прошедшие записи в основном завершены или
+отменены, будущие - ожидают или подтверждены. Пациенты берутся из общего
+пула, поэтому у многих несколько визитов.
+
+Генерация детерминирована: те же параметры и ``seed`` дают те же данные.
+С NumPy раскладка и выборки статусов и пациентов считаются векторно по
+врачу и периоду; без него - ``random``. Генераторы случайных чисел разные,
+так что данные с NumPy и без него не совпадают.
+
+Записи вставляются пачками через ``executemany``: ``bulk_create`` на
+миллионах строк в несколько раз медленнее (создание объектов модели и не
+больше 999 параметров в одном INSERT у SQLite). Сигналы при этом не
+отправляются - счетчики статистики обновляются в той же транзакции, что
+и пачка.
+"""
+import random
+from bisect import bisect_right
+from collections import Counter
+from datetime import time, timedelta
+from itertools import accumulate
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .fixtures.doctors_data import DOCTORS_DATA
+from .fixtures.services_data import SERVICES_DATA
+from .models import Appointment, Doctor, Service
+from .stats import record as record_stats
+from .working_hours import compile_working_hours, shifts_for
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Шаг сетки записей, минут
+UNIT = 15
+
+# Сколько дней раскладывается за раз для каждого врача
+PERIOD_DAYS = 28
+
+# Перерыв перед записью в шагах сетки: часть рабочего времени остается свободной
+GAP_WEIGHTS = {0: 50, 1: 20, 2: 15, 4: 10, 8: 5}
+
+PAST_STATUS_WEIGHTS = {'completed': 80, 'cancelled': 14, 'confirmed': 4, 'pending': 2}
+FUTURE_STATUS_WEIGHTS = {'pending': 35, 'confirmed': 50, 'cancelled': 15}
+
+# Остальные услуги врача - с весом 1
+SERVICE_WEIGHTS = {
+    'Консультация стоматолога': 4,
+    'Профессиональная гигиена полости рта': 2,
+    'Лечение кариеса': 3,
+    'Рентген диагностика': 2,
+}
+
+WORKING_HOURS_TEMPLATES = [
+    {
+        'пн': '09:00-18:00', 'вт': '09:00-18:00', 'ср': '09:00-18:00', 'чт': '09:00-18:00',
+        'пт': '09:00-18:00', 'сб': '10:00-16:00', 'вс': 'выходной',
+    },
+    {
+        'пн': '09:00-13:00, 14:00-18:00', 'вт': '09:00-13:00, 14:00-18:00', 'ср': '09:00-13:00, 14:00-18:00',
+        'чт': '09:00-13:00, 14:00-18:00', 'пт': '09:00-13:00, 14:00-18:00', 'сб': 'выходной', 'вс': 'выходной',
+    },
+    {
+        'пн': '08:00-14:00', 'вт': '14:00-20:00', 'ср': '08:00-14:00', 'чт': '14:00-20:00',
+        'пт': '08:00-14:00', 'сб': '09:00-15:00', 'вс': 'выходной',
+    },
+    {
+        'пн': '10:00-19:00', 'вт': 'выходной', 'ср': '10:00-19:00', 'чт': 'выходной',
+        'пт': '10:00-19:00', 'сб': '10:00-17:00', 'вс': '10:00-15:00',
+    },
+]
+
+MALE_NAMES = [
+    'Азамат', 'Бакыт', 'Эрлан', 'Нурлан', 'Айбек', 'Тимур', 'Данияр', 'Руслан',
+    'Иван', 'Алексей', 'Сергей', 'Марат', 'Канат', 'Улан', 'Эмиль', 'Адилет',
+]
+FEMALE_NAMES = [
+    'Айгерим', 'Айдана', 'Мээрим', 'Гульнара', 'Жаркын', 'Асель', 'Динара', 'Нургуль',
+    'Анна', 'Елена', 'Мария', 'Алия', 'Чолпон', 'Бегимай', 'Айжан', 'Камила',
+]
+# Мужская форма; женская - с окончанием "а"
+SURNAMES = [
+    'Асанов', 'Касымов', 'Тилеков', 'Сагынбеков', 'Омуралиев', 'Токтогулов', 'Абдыкеримов', 'Жумабаев',
+    'Исаков', 'Садыков', 'Бекмуратов', 'Алиев', 'Иванов', 'Петров', 'Смирнов', 'Кузнецов',
+    'Осмонов', 'Мамытов', 'Турдубаев', 'Эсенов',
+]
+
+# Доля пациентов, оставивших email
+EMAIL_SHARE = 0.4
+
+COLUMNS = (
+    'patient_name', 'patient_phone', 'patient_email', 'doctor', 'service', 'date', 'time', 'end_time',
+    'status', 'comment', 'admin_notes', 'created_at', 'updated_at',
+)
+
+
+def person_name(rng):
+    if rng.random() < 0.5:
+        return f'{rng.choice(SURNAMES)} {rng.choice(MALE_NAMES)}'
+    return f'{rng.choice(SURNAMES)}а {rng.choice(FEMALE_NAMES)}'
+
+
+def make_patients(count, rng):
+    """Пул пациентов: (ФИО, телефон, email)."""
+    patients = []
+    for index in range(count):
+        email = f'patient{index}@example.com' if rng.random() < EMAIL_SHARE else ''
+        patients.append((person_name(rng), f'+996{rng.randint(500000000, 799999999)}', email))
+    return patients
+
+
+def ensure_services():
+    """Услуги из ``api/fixtures`` (недостающие создаются) по названию."""
+    services = {service.name: service for service in Service.objects.filter(
+        name__in=[data['name'] for data in SERVICES_DATA],
+    )}
+    missing = [Service(**data) for data in SERVICES_DATA if data['name'] not in services]
+    services.update((service.name, service) for service in Service.objects.bulk_create(missing))
+    return services
+
+
+def create_doctors(count, services, rng):
+    """Врачи со специализацией и услугами из ``DOCTORS_DATA``: [(врач, [услуги])]."""
+    templates = [
+        (data['specialty'], [services[name] for name in data['services_names'] if name in services])
+        for data in DOCTORS_DATA
+    ]
+    doctors = []
+    for index in range(count):
+        specialty, doctor_services = templates[index % len(templates)]
+        working_hours = rng.choice(WORKING_HOURS_TEMPLATES)
+        doctors.append((Doctor(
+            name=person_name(rng), specialty=specialty, experience=rng.randint(1, 30),
+            working_hours=working_hours, compiled_schedule=compile_working_hours(working_hours),
+        ), doctor_services))
+
+    Doctor.objects.bulk_create([doctor for doctor, _ in doctors])
+    Doctor.services.through.objects.bulk_create([
+        Doctor.services.through(doctor_id=doctor.pk, service_id=service.pk)
+        for doctor, doctor_services in doctors
+        for service in doctor_services
+    ])
+    invalidate_catalog()
+    return doctors
+
+
+def timeline(schedule, days):
+    """
+    Рабочее время врача за ``days`` одной лентой в шагах сетки.
+    Возвращает (смены [(день, первый шаг смены, начало смены на ленте)],
+    концы смен на ленте по возрастанию).
+    """
+    shifts, bounds, total = [], [], 0
+    for day in days:
+        for start, end in shifts_for(schedule, day.weekday()):
+            first, last = -(-start // UNIT), end // UNIT
+            if last > first:
+                shifts.append((day, first, total))
+                total += last - first
+                bounds.append(total)
+    return shifts, bounds
+
+
+class PythonSampler:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.gaps = list(GAP_WEIGHTS)
+        self.gap_weights = list(accumulate(GAP_WEIGHTS.values()))
+
+    def place(self, bounds, durations, weights):
+        """
+        Записи подряд по ленте со случайными перерывами; запись, не влезающая
+        в остаток смены, переносится на начало следующей.
+        Возвращает (начала на ленте, номера услуг).
+        """
+        choices = self.rng.choices
+        services = range(len(durations))
+        cum_weights = list(accumulate(weights))
+        starts, picked = [], []
+        position, shift = 0, 0
+        while True:
+            position += choices(self.gaps, cum_weights=self.gap_weights)[0]
+            while shift < len(bounds) and position >= bounds[shift]:
+                shift += 1
+            if shift == len(bounds):
+                return starts, picked
+            service = choices(services, cum_weights=cum_weights)[0]
+            end = position + durations[service]
+            if end > bounds[shift]:
+                position = bounds[shift]
+                continue
+            starts.append(position)
+            picked.append(service)
+            position = end
+
+    def pick(self, count, weights):
+        return self.rng.choices(range(len(weights)), weights, k=count)
+
+    def integers(self, count, high):
+        randrange = self.rng.randrange
+        return [randrange(high) for _ in range(count)]
+
+
+class NumpySampler:
+    def __init__(self, seed):
+        self.rng = numpy.random.default_rng(seed)
+        self.gaps = numpy.array(list(GAP_WEIGHTS))
+        self.gap_p = self.probabilities(list(GAP_WEIGHTS.values()))
+
+    @staticmethod
+    def probabilities(weights):
+        weights = numpy.asarray(weights, dtype=float)
+        return weights / weights.sum()
+
+    def place(self, bounds, durations, weights):
+        """
+        Как ``PythonSampler.place``, но записи, не влезающие в остаток смены,
+        отбрасываются: положения всех записей - один ``cumsum``.
+        """
+        if not bounds:
+            return [], []
+        bounds = numpy.asarray(bounds)
+        durations = numpy.asarray(durations)
+        # Каждая запись занимает хотя бы шаг - больше записей на ленте не бывает
+        count = int(bounds[-1])
+        services = self.rng.choice(len(durations), size=count, p=self.probabilities(weights))
+        lengths = self.rng.choice(self.gaps, size=count, p=self.gap_p) + durations[services]
+        ends = numpy.cumsum(lengths)
+        starts = ends - durations[services]
+        shifts = numpy.searchsorted(bounds, starts, side='right')
+        inside = shifts < len(bounds)
+        fits = inside & (ends <= bounds[numpy.minimum(shifts, len(bounds) - 1)])
+        kept = numpy.flatnonzero(fits)
+        return starts[kept].tolist(), services[kept].tolist()
+
+    def pick(self, count, weights):
+        return self.rng.choice(len(weights), size=count, p=self.probabilities(weights)).tolist()
+
+    def integers(self, count, high):
+        return self.rng.integers(high, size=count).tolist()
+
+
+class AppointmentWriter:
+    """Копит строки записей и вставляет их пачками вместе со счетчиками статистики."""
+
+    def __init__(self, batch_size, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.rows = []
+        self.stats = Counter()
+        self.written = 0
+
+        self.connection = connections[router.db_for_write(Appointment)]
+        ops = self.connection.ops
+        quote = ops.quote_name
+        fields = [Appointment._meta.get_field(name) for name in COLUMNS]
+        self.sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(Appointment._meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        now = ops.adapt_datetimefield_value(timezone.now())
+        self.now = now
+        self.adapt_date = ops.adapt_datefield_value
+        # Время на сетке и концы приемов: минуты -> значение для базы
+        self.times = {}
+        self.adapt_time = ops.adapt_timefield_value
+
+    def time_value(self, minutes):
+        value = self.times.get(minutes)
+        if value is None:
+            # Прием до полуночи заканчивается в time.max, как в Appointment.compute_end_time
+            as_time = time.max if minutes >= 24 * 60 else time(minutes // 60, minutes % 60)
+            value = self.times[minutes] = self.adapt_time(as_time)
+        return value
+
+    def add(self, doctor_id, service_id, day, start, end, status, patient):
+        name, phone, email = patient
+        self.rows.append((
+            name, phone, email, doctor_id, service_id, self.adapt_date(day),
+            self.time_value(start), self.time_value(end), status, '', '', self.now, self.now,
+        ))
+        self.stats[doctor_id, service_id, day, status] += 1
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        with transaction.atomic(using=self.connection.alias):
+            with self.connection.cursor() as cursor:
+                cursor.executemany(self.sql, self.rows)
+            record_stats(
+                (dict(zip(Appointment.TRACKED_FIELDS, key)), count) for key, count in self.stats.items()
+            )
+        self.written += len(self.rows)
+        self.rows = []
+        self.stats = Counter()
+        if self.progress:
+            self.progress(self.written)
+
+
+def generate(doctors=200, appointments=1_000_000, patients=None, seed=42, end=None,
+             batch_size=50_000, use_numpy=None, progress=None):
+    """
+    Создает ``doctors`` врачей и ``appointments`` записей к ним (дни - от
+    ``end``, по умолчанию месяц вперед, в прошлое). ``use_numpy=None`` - NumPy,
+    если установлен. ``progress(записано)`` вызывается после каждой пачки.
+    Возвращает созданных врачей.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImproperlyConfigured('NumPy не установлен')
+    rng = random.Random(seed)
+    # Отдельный поток случайных чисел для раскладки записей
+    sampler = (NumpySampler if use_numpy else PythonSampler)(seed + 1)
+    today = timezone.localdate()
+    end = end or today + timedelta(days=30)
+
+    services = ensure_services()
+    created = create_doctors(doctors, services, rng)
+    pool = make_patients(patients or max(1, appointments // 6), rng)
+
+    # Нагрузка врачей неравномерная
+    loads = [rng.uniform(0.5, 1.5) for _ in created]
+    quotas = [int(appointments * load / sum(loads)) for load in loads]
+    for index in range(appointments - sum(quotas)):
+        quotas[index % len(quotas)] += 1
+
+    plans = []
+    for (doctor, doctor_services), quota in zip(created, quotas):
+        if quota and doctor_services and any(doctor.compiled_schedule.values()):
+            plans.append([doctor, doctor_services, quota])
+
+    statuses = {
+        True: (list(PAST_STATUS_WEIGHTS), list(PAST_STATUS_WEIGHTS.values())),
+        False: (list(FUTURE_STATUS_WEIGHTS), list(FUTURE_STATUS_WEIGHTS.values())),
+    }
+    writer = AppointmentWriter(batch_size, progress)
+    period_end = end
+    while plans:
+        days = [period_end - timedelta(days=offset) for offset in range(PERIOD_DAYS - 1, -1, -1)]
+        for plan in plans:
+            doctor, doctor_services, quota = plan
+            shifts, bounds = timeline(doctor.compiled_schedule, days)
+            durations = [max(1, -(-service.duration // UNIT)) for service in doctor_services]
+            weights = [SERVICE_WEIGHTS.get(service.name, 1) for service in doctor_services]
+            starts, picked = sampler.place(bounds, durations, weights)
+            # Последний (самый ранний) период заполняется с конца
+            starts, picked = starts[-quota:], picked[-quota:]
+            plan[2] -= len(starts)
+
+            placed = []
+            for start, service in zip(starts, picked):
+                day, first, offset = shifts[bisect_right(bounds, start)]
+                minutes = (first + start - offset) * UNIT
+                placed.append((day, minutes, doctor_services[service]))
+            past = sum(1 for day, _, _ in placed if day < today)
+            names, weights = statuses[True]
+            picked_statuses = [names[index] for index in sampler.pick(past, weights)]
+            names, weights = statuses[False]
+            picked_statuses += [names[index] for index in sampler.pick(len(placed) - past, weights)]
+            picked_patients = sampler.integers(len(placed), len(pool))
+
+            for (day, minutes, service), status, patient in zip(placed, picked_statuses, picked_patients):
+                writer.add(doctor.pk, service.pk, day, minutes, minutes + service.duration, status, pool[patient])
+
+        plans = [plan for plan in plans if plan[2] > 0]
+        period_end -= timedelta(days=PERIOD_DAYS)
+
+    writer.flush()
+    return [doctor for doctor, _ in created]
@@ -0,0 +1,12 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from api.images import build_srcset
+
+register = template.Library()
+
+
+@register.filter
+def srcset(variants, key):
+    """{{ service.image_variants|srcset:'webp' }} -> 'url 400w, url 800w'."""
+    return build_srcset(variants, key, default_storage.url)
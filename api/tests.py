@@ -1,3 +1,1662 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from importlib import import_module
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import archive, catalog, search, synthetic_data, write_queue
+from .benchmarks import compare
+from .fixtures.doctors_data import DOCTORS_DATA
+from .fixtures.services_data import SERVICES_DATA
+from .metrics import registry as metrics_registry
+from .middleware import install_query_recorder
+from .models import Service, Doctor, Appointment, ArchivedAppointment, CatalogVersion, DailyStat, DoctorDay, MonthlyStat
+from .serializers import DoctorSerializer
+from .urls import build_urlconf
+from .scheduling import free_starts, get_free_slots
+from .stats import rebuild_stats
+from .working_hours import compile_working_hours, shifts_for, validate_working_hours
+
+WORKING_HOURS = {
+    'пн': '09:00-18:00',
+    'вт': '09:00-18:00',
+    'ср': '09:00-18:00',
+    'чт': '09:00-18:00',
+    'пт': '09:00-18:00',
+    'сб': '10:00-16:00',
+    'вс': 'выходной'
+}
+
+def first_monday_of_next_month(today):
+    month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return month + timedelta(days=-month.weekday() % 7)
+
+
+# Понедельник, на котором "сейчас" раннее утро. Берется от сегодняшней даты:
+# записи на него не должны попадать в прошлое
+MONDAY = first_monday_of_next_month(date.today())
+
+
+def frozen_now(day=MONDAY, hour=7):
+    now = timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+    return mock.patch('api.scheduling.timezone.localtime', return_value=now)
+
+
+class ClinicTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(name='Лечение кариеса', price=4500, duration=60)
+        cls.short_service = Service.objects.create(name='Консультация стоматолога', price=500, duration=30)
+        cls.doctor = Doctor.objects.create(
+            name='Иванов Иван', specialty='Терапевт', working_hours=WORKING_HOURS
+        )
+        cls.doctor.services.set([cls.service, cls.short_service])
+
+
+class WorkingHoursTests(TestCase):
+    def test_compile(self):
+        schedule = compile_working_hours(WORKING_HOURS)
+        self.assertEqual(schedule['0'], [[540, 1080]])
+        self.assertEqual(schedule['5'], [[600, 960]])
+        self.assertEqual(schedule['6'], [])
+
+    def test_split_shifts(self):
+        schedule = compile_working_hours({'пн': '14:00-18:00, 09:00-13:00', 'вт': '09:00-12:00; 13:00-15:00'})
+        self.assertEqual(shifts_for(schedule, 0), [(540, 780), (840, 1080)])
+        self.assertEqual(shifts_for(schedule, 1), [(540, 720), (780, 900)])
+
+    def test_invalid_values_are_days_off(self):
+        schedule = compile_working_hours({'пн': '18:00-09:00', 'вт': 'abc', 'ср': None})
+        self.assertEqual(schedule['0'], [])
+        self.assertEqual(schedule['1'], [])
+        self.assertEqual(schedule['2'], [])
+
+    def test_validation(self):
+        validate_working_hours(WORKING_HOURS)
+        for value in [{'пн': '18:00-09:00'}, {'пн': '09:00-13:00, 12:00-18:00'}, {'mon': '09:00-18:00'},
+                      {'пн': 9}, ['пн']]:
+            with self.subTest(value=value), self.assertRaises(ValidationError):
+                validate_working_hours(value)
+
+    def test_compiled_on_save(self):
+        doctor = Doctor.objects.create(name='Врач', specialty='Хирург', working_hours={'пн': '09:00-10:00'})
+        doctor.working_hours = {'пн': '10:00-11:00'}
+        doctor.save(update_fields=['working_hours'])
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.compiled_schedule['0'], [[600, 660]])
+
+    def test_free_starts_skip_busy(self):
+        starts = free_starts([(540, 720)], [(600, 660)], 60)
+        self.assertEqual(starts, [540, 660])
+
+    def test_free_starts_not_before(self):
+        starts = free_starts([(540, 660)], [], 30, not_before=601)
+        self.assertEqual(starts, [615, 630])
+
+
+class DoctorSlotsTests(ClinicTestCase):
+    def test_busy_time_is_excluded(self):
+        Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00', status='confirmed'
+        )
+        Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='12:00', status='cancelled'
+        )
+        with frozen_now():
+            slots = get_free_slots(self.doctor, self.short_service, MONDAY, MONDAY)[MONDAY]
+
+        self.assertIn('09:30', slots)
+        self.assertNotIn('09:45', slots)
+        self.assertNotIn('10:30', slots)
+        self.assertIn('11:00', slots)
+        self.assertIn('12:00', slots)
+        self.assertEqual(slots[-1], '17:30')
+
+    def test_single_query_for_range(self):
+        with frozen_now(), self.assertNumQueries(1):
+            slots = get_free_slots(self.doctor, self.service, MONDAY, MONDAY + timedelta(days=13))
+        # Воскресенья - выходные
+        self.assertEqual(len(slots), 12)
+
+    def test_endpoint(self):
+        url = reverse('doctor-slots', args=[self.doctor.id])
+        with frozen_now():
+            response = APIClient().get(url, {
+                'service': self.service.id, 'date_from': MONDAY.isoformat(), 'date_to': MONDAY.isoformat(),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['duration'], 60)
+        self.assertEqual(response.data['slots'][MONDAY.isoformat()][0], '09:00')
+
+    def test_endpoint_rejects_foreign_service(self):
+        other = Service.objects.create(name='Имплантация', price=30000, duration=60)
+        url = reverse('doctor-slots', args=[self.doctor.id])
+        response = APIClient().get(url, {'service': other.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('service', response.data)
+
+    def test_endpoint_rejects_long_range(self):
+        url = reverse('doctor-slots', args=[self.doctor.id])
+        response = APIClient().get(url, {
+            'service': self.service.id,
+            'date_from': MONDAY.isoformat(),
+            'date_to': (MONDAY + timedelta(days=365)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_split_shift_slots(self):
+        self.doctor.working_hours = {'пн': '09:00-10:00, 15:00-16:00'}
+        self.doctor.save()
+        with frozen_now():
+            slots = get_free_slots(self.doctor, self.short_service, MONDAY, MONDAY)[MONDAY]
+        self.assertEqual(slots, ['09:00', '09:15', '09:30', '15:00', '15:15', '15:30'])
+
+
+class BookingOverlapTests(ClinicTestCase):
+    def book(self, time, service=None):
+        return APIClient().post(reverse('appointment-create'), {
+            'patient_name': 'Петров Петр',
+            'patient_phone': '+996 555 123 456',
+            'service': (service or self.short_service).id,
+            'doctor': self.doctor.id,
+            'date': MONDAY.isoformat(),
+            'time': time,
+        }, format='json')
+
+    def test_end_time_is_stored(self):
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00'
+        )
+        self.assertEqual(appointment.end_time.isoformat(), '11:00:00')
+
+    def test_overlap_is_rejected(self):
+        Appointment.objects.create(doctor=self.doctor, service=self.service, date=MONDAY, time='10:00')
+
+        self.assertEqual(self.book('10:30').status_code, 400)
+        self.assertEqual(self.book('09:45').status_code, 400)
+        self.assertEqual(self.book('09:30').status_code, 201)
+        self.assertEqual(self.book('11:00').status_code, 201)
+
+    def test_overlap_is_single_query(self):
+        with self.assertNumQueries(1):
+            exists = Appointment.objects.overlapping(
+                self.doctor, MONDAY, datetime.strptime('10:00', '%H:%M').time(),
+                datetime.strptime('10:30', '%H:%M').time(),
+            ).exists()
+        self.assertFalse(exists)
+
+    def test_duration_change_updates_end_time(self):
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00'
+        )
+        # Прошедшие и неактивные записи не переписываются
+        past = Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=timezone.localdate() - timedelta(days=1), time='10:00'
+        )
+        completed = Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='12:00', status='completed'
+        )
+        self.service.duration = 90
+        with mock.patch('api.models.Appointment.objects.bulk_update', wraps=Appointment.objects.bulk_update) as update:
+            self.service.save()
+        self.assertEqual([len(call.args[0]) for call in update.call_args_list], [1])
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.end_time.isoformat(), '11:30:00')
+        for unchanged, end in ((past, '11:00:00'), (completed, '13:00:00')):
+            unchanged.refresh_from_db()
+            self.assertEqual(unchanged.end_time.isoformat(), end)
+
+
+class BatchBookingTests(ClinicTestCase):
+    def item(self, time, service=None, **extra):
+        return {
+            'patient_name': 'Петров Петр',
+            'patient_phone': '+996 555 123 456',
+            'service': (service or self.short_service).id,
+            'doctor': self.doctor.id,
+            'date': MONDAY.isoformat(),
+            'time': time,
+            **extra,
+        }
+
+    def book(self, *items):
+        return APIClient().post(
+            reverse('appointment-batch-create'), {'appointments': list(items)}, format='json'
+        )
+
+    def test_all_created(self):
+        response = self.book(self.item('09:00'), self.item('09:30'), self.item('10:00', service=self.service))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created'] * 3)
+        times = Appointment.objects.order_by('time').values_list('time', 'end_time', 'status')
+        self.assertEqual(
+            [(start.isoformat(), end.isoformat(), state) for start, end, state in times],
+            [('09:00:00', '09:30:00', 'pending'), ('09:30:00', '10:00:00', 'pending'),
+             ('10:00:00', '11:00:00', 'pending')],
+        )
+
+    def test_conflict_saves_nothing(self):
+        Appointment.objects.create(doctor=self.doctor, service=self.service, date=MONDAY, time='10:00')
+        # Вторая пересекается с записью в базе, четвертая - с первой из пачки
+        response = self.book(self.item('09:00'), self.item('10:30'), self.item('12:00'), self.item('09:15'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']], ['skipped', 'conflict', 'skipped', 'conflict']
+        )
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_invalid_items(self):
+        response = self.book(
+            self.item('09:00'),
+            self.item('09:30', doctor=999),
+            self.item('10:00', date=(MONDAY.replace(year=2000)).isoformat()),
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['skipped', 'invalid', 'invalid'])
+        self.assertIn('doctor', results[1]['errors'])
+        self.assertIn('date', results[2]['errors'])
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_past_date_in_clinic_timezone(self):
+        # Сегодня - по часовому поясу клиники, а не сервера
+        with mock.patch('api.serializers.timezone.localdate', return_value=MONDAY + timedelta(days=1)):
+            response = self.book(self.item('09:00'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data['results'][0]['errors'])
+
+    def test_out_of_range_ids(self):
+        response = self.book(self.item('09:00', doctor='99999999999999999999999'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('doctor', response.data['results'][0]['errors'])
+
+    def test_size_limits(self):
+        self.assertEqual(self.book().status_code, 400)
+        items = [self.item('09:00')] * 21
+        self.assertEqual(self.book(*items).status_code, 400)
+
+    def test_queries_do_not_grow_with_batch(self):
+        def queries(count):
+            Appointment.objects.all().delete()
+            items = [self.item('10:00', date=(MONDAY + timedelta(days=i)).isoformat()) for i in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.book(*items).status_code, 201)
+            return len(context.captured_queries)
+
+        self.assertEqual(queries(2), queries(20))
+
+
+class DoctorScheduleTests(ClinicTestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def schedule(self, **params):
+        response = self.api.get(reverse('doctor-schedule'), {'date': MONDAY.isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def day(self, day=MONDAY):
+        return DoctorDay.objects.get(doctor=self.doctor, date=day)
+
+    def test_day(self):
+        Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00', status='confirmed',
+            patient_name='Петров Петр',
+        )
+        Appointment.objects.create(
+            doctor=self.doctor, service=self.short_service, date=MONDAY, time='12:00', status='cancelled',
+        )
+        data = self.schedule()
+        self.assertEqual((data['date_from'], data['date_to']), (MONDAY.isoformat(), MONDAY.isoformat()))
+        [day] = data['doctors'][0]['days']
+        self.assertEqual(
+            [(a['time'], a['end'], a['status']) for a in day['appointments']],
+            [('10:00', '11:00', 'confirmed'), ('12:00', '12:30', 'cancelled')],
+        )
+        self.assertEqual(day['appointments'][0]['service'], self.service.name)
+        # Отмененная запись время не занимает
+        self.assertEqual(day['free'], [['09:00', '10:00'], ['11:00', '18:00']])
+
+    def test_week(self):
+        data = self.schedule(date=(MONDAY + timedelta(days=2)).isoformat(), period='week', doctor=self.doctor.id)
+        days = data['doctors'][0]['days']
+        self.assertEqual([d['date'] for d in days], [(MONDAY + timedelta(days=i)).isoformat() for i in range(7)])
+        self.assertEqual(days[5]['free'], [['10:00', '16:00']])
+        self.assertEqual(days[6]['free'], [])
+
+    def test_staff_only(self):
+        url = reverse('doctor-schedule')
+        self.assertEqual(APIClient().get(url).status_code, 401)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user('patient', password='password'))
+        self.assertEqual(client.get(url).status_code, 403)
+
+    def test_read_without_rebuild(self):
+        self.schedule(period='week')
+        # Врачи и расписание - без пересчета
+        with self.assertNumQueries(2):
+            self.schedule(period='week')
+
+    def test_maintained_on_writes(self):
+        self.schedule()
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00',
+        )
+        self.assertEqual(self.day().free, [['09:00', '10:00'], ['11:00', '18:00']])
+
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertEqual(self.day().free, [['09:00', '18:00']])
+
+        # Перенос на другой день пересчитывает оба дня
+        moved = Appointment.objects.get(pk=appointment.pk)
+        moved.date = MONDAY + timedelta(days=1)
+        moved.status = 'confirmed'
+        moved.save()
+        self.assertEqual(self.day().appointments, [])
+        self.assertEqual(self.day(moved.date).appointments[0]['id'], moved.pk)
+
+        moved.delete()
+        self.assertEqual(self.day(moved.date).free, [['09:00', '18:00']])
+
+    def test_batch_booking_and_admin_actions(self):
+        self.schedule()
+        response = APIClient().post(reverse('appointment-batch-create'), {'appointments': [{
+            'patient_name': 'Петров Петр', 'patient_phone': '+996 555 123 456',
+            'service': self.service.id, 'doctor': self.doctor.id,
+            'date': MONDAY.isoformat(), 'time': '09:00',
+        }]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.day().free, [['10:00', '18:00']])
+
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin:api_appointment_changelist'), {
+            'action': 'cancel_selected',
+            '_selected_action': list(Appointment.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.day().appointments[0]['status'], 'cancelled')
+        self.assertEqual(self.day().free, [['09:00', '18:00']])
+
+    def test_admin_actions_skip_taken_time(self):
+        def create(time, status):
+            return Appointment.objects.create(
+                patient_name=f'Пациент {time}', doctor=self.doctor, service=self.service,
+                date=MONDAY, time=time, status=status,
+            )
+
+        # Отмененная запись на то же время и пересекающиеся записи
+        same = create('10:00', 'cancelled')
+        create('10:00', 'confirmed')
+        overlapping = create('10:30', 'cancelled')
+        first, second = create('12:00', 'completed'), create('12:30', 'cancelled')
+        free = create('15:00', 'cancelled')
+
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin:api_appointment_changelist'), {
+            'action': 'confirm_selected',
+            '_selected_action': [a.pk for a in (same, overlapping, first, second, free)],
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        statuses = dict(Appointment.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[a.pk] for a in (same, overlapping, first, second, free)],
+            ['cancelled', 'cancelled', 'confirmed', 'cancelled', 'confirmed'],
+        )
+        self.assertContains(response, '2 записей подтверждено.')
+        self.assertContains(response, f'Время уже занято, записи пропущены: Пациент 10:00 ({MONDAY:%d.%m.%Y} 10:00)')
+
+    def test_cascade_delete(self):
+        Appointment.objects.create(doctor=self.doctor, service=self.short_service, date=MONDAY, time='10:00')
+        self.schedule()
+        self.short_service.delete()
+        self.assertEqual(self.schedule()['doctors'][0]['days'][0]['appointments'], [])
+        self.doctor.delete()
+        self.assertFalse(DoctorDay.objects.exists())
+
+    def test_working_hours_change(self):
+        self.schedule()
+        self.doctor.working_hours = {'пн': '12:00-14:00'}
+        self.doctor.save()
+        self.assertEqual(self.schedule()['doctors'][0]['days'][0]['free'], [['12:00', '14:00']])
+
+
+class StatsTests(ClinicTestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def create(self, time, status='pending', day=MONDAY, service=None):
+        return Appointment.objects.create(
+            doctor=self.doctor, service=service or self.service, date=day, time=time, status=status,
+        )
+
+    def assertStatsCurrent(self):
+        # Сверка с пересчетом по записям ничего не исправляет
+        self.assertEqual(set(rebuild_stats().values()), {0})
+
+    def test_maintained_on_save_and_delete(self):
+        first = self.create('09:00')
+        self.create('11:00', status='completed')
+        self.assertStatsCurrent()
+
+        first = Appointment.objects.get(pk=first.pk)
+        first.status = 'confirmed'
+        first.save()
+        self.assertStatsCurrent()
+
+        # Перенос в другой месяц
+        first.date = MONDAY + timedelta(days=31)
+        first.save()
+        self.assertStatsCurrent()
+        self.assertEqual(MonthlyStat.objects.get(month=first.date.replace(day=1), status='confirmed').count, 1)
+
+        first.delete()
+        self.assertStatsCurrent()
+
+    def test_bulk_paths(self):
+        response = APIClient().post(reverse('appointment-batch-create'), {'appointments': [
+            {'patient_name': 'Петров Петр', 'patient_phone': '+996 555 123 456', 'service': self.service.id,
+             'doctor': self.doctor.id, 'date': MONDAY.isoformat(), 'time': time}
+            for time in ('09:00', '10:00', '11:00')
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertStatsCurrent()
+
+        self.client.force_login(self.staff)
+        for action in ('confirm_selected', 'mark_completed', 'cancel_selected'):
+            self.client.post(reverse('admin:api_appointment_changelist'), {
+                'action': action,
+                '_selected_action': list(Appointment.objects.values_list('pk', flat=True)[:2]),
+            })
+            self.assertStatsCurrent()
+
+    def test_cascade_delete(self):
+        self.create('09:00', service=self.short_service)
+        self.create('10:00')
+        self.short_service.delete()
+        self.assertStatsCurrent()
+        self.doctor.delete()
+        self.assertStatsCurrent()
+        self.assertFalse(DailyStat.objects.exclude(count=0).exists())
+
+    def test_rebuild_fixes_drift(self):
+        self.create('09:00')
+        Appointment.objects.update(status='cancelled')
+        fixed = rebuild_stats()
+        self.assertEqual(fixed[DailyStat], 2)
+        self.assertStatsCurrent()
+        output = io.StringIO()
+        call_command('rebuild_stats', stdout=output)
+        self.assertIn('исправлено строк 0', output.getvalue())
+
+    def test_dashboard_reads_only_rollups(self):
+        self.create('09:00', status='completed')
+        self.create('10:00', status='completed', service=self.short_service)
+        self.create('11:00', status='cancelled')
+        self.create('09:00', day=MONDAY + timedelta(days=1))
+
+        self.client.force_login(self.staff)
+        url = reverse('admin:api_appointment_stats')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'month': f'{MONDAY:%Y-%m}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if '"api_appointment"' in q['sql']])
+
+        totals = response.context['totals']
+        self.assertEqual((totals['total'], totals['completed'], totals['cancelled']), (4, 2, 1))
+        self.assertEqual(totals['revenue'], 5000)
+        self.assertEqual([row['date'] for row in response.context['by_day']], [MONDAY, MONDAY + timedelta(days=1)])
+        self.assertEqual(response.context['by_doctor'][0]['total'], 4)
+
+        # Цена берется текущая
+        Service.objects.filter(pk=self.service.pk).update(price=5000)
+        response = self.client.get(url, {'month': f'{MONDAY:%Y-%m}'})
+        self.assertEqual(response.context['totals']['revenue'], 5500)
+
+    def test_migration_fills_existing_rows(self):
+        self.create('09:00', status='completed')
+        self.create('10:00', status='completed')
+        self.create('09:00', day=MONDAY + timedelta(days=31))
+        # База до миграции: записи есть, сводных таблиц еще нет
+        DailyStat.objects.all().delete()
+        MonthlyStat.objects.all().delete()
+
+        import_module('api.migrations.0011_stats').fill_stats(django_apps, None)
+        self.assertStatsCurrent()
+        self.assertEqual(DailyStat.objects.get(date=MONDAY, status='completed').count, 2)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 200
+
+    def setUp(self):
+        self.service = Service.objects.create(name='Лечение кариеса', price=4500, duration=60)
+        self.doctor = Doctor.objects.create(name='Иванов Иван', specialty='Терапевт', working_hours=WORKING_HOURS)
+
+    def test_only_one_booking_wins(self):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+        lock = threading.Lock()
+
+        def book(index):
+            client = APIClient()
+            barrier.wait()
+            try:
+                response = client.post(reverse('appointment-create'), {
+                    'patient_name': f'Пациент {index}',
+                    'patient_phone': '+996 555 123 456',
+                    'service': self.service.id,
+                    'doctor': self.doctor.id,
+                    'date': MONDAY.isoformat(),
+                    # Половина потоков - на то же время, половина - на пересекающееся
+                    'time': '10:00' if index % 2 else '10:30',
+                }, format='json')
+                with lock:
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(statuses), self.THREADS)
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(400), self.THREADS - 1)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_cancelled_appointment_frees_slot(self):
+        Appointment.objects.create(
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00', status='cancelled'
+        )
+        Appointment.objects.create(doctor=self.doctor, service=self.service, date=MONDAY, time='10:00')
+        self.assertEqual(Appointment.objects.count(), 2)
+
+
+class SqliteConnectionTests(TestCase):
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class WriteQueueTests(TransactionTestCase):
+    def test_runs_in_writer_thread(self):
+        self.assertEqual(write_queue.run(lambda: threading.current_thread().name), 'booking-writer')
+        with self.assertRaises(ZeroDivisionError):
+            write_queue.run(lambda: 1 / 0)
+
+    def test_inline(self):
+        # Данные открытой транзакции из другого потока не видны - выполняется на месте
+        with transaction.atomic():
+            self.assertEqual(write_queue.run(lambda: threading.current_thread().name), threading.current_thread().name)
+        with override_settings(BOOKING_WRITE_QUEUE=False):
+            self.assertEqual(write_queue.run(lambda: threading.current_thread().name), threading.current_thread().name)
+
+    def test_survives_connection_errors(self):
+        with mock.patch('api.write_queue.close_old_connections', side_effect=[RuntimeError('база'), None]):
+            with self.assertRaises(RuntimeError):
+                write_queue.run(lambda: 1)
+            self.assertEqual(write_queue.run(lambda: 2), 2)
+
+    def test_dead_writer_is_replaced(self):
+        write_queue.run(lambda: None)
+        writer = write_queue._writer
+        # Завершаем поток записи изнутри
+        stop = mock.Mock(**{'set_running_or_notify_cancel.side_effect': SystemExit})
+        write_queue._jobs.put((stop, None, (), {}))
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(write_queue.run(lambda: threading.current_thread().name), 'booking-writer')
+        self.assertIsNot(write_queue._writer, writer)
+
+class CatalogCacheTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_doctor_list_has_no_n_plus_one(self):
+        for i in range(5):
+            doctor = Doctor.objects.create(name=f'Врач {i}', specialty='Хирург')
+            doctor.services.set([self.service])
+        cache.clear()
+        # Версия каталога, врачи и их услуги - независимо от числа врачей
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('doctor-list'))
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_cache_hit_does_no_queries(self):
+        self.client.get(reverse('service-list'))
+        self.client.get(reverse('doctor-list'))
+        with self.assertNumQueries(0):
+            services = self.client.get(reverse('service-list'))
+            doctors = self.client.get(reverse('doctor-list'))
+        self.assertEqual(len(services.json()['results']), 2)
+        self.assertEqual(doctors.json()['results'][0]['name'], 'Иванов Иван')
+
+    def test_service_change_invalidates_cache(self):
+        self.client.get(reverse('service-list'))
+        Service.objects.create(name='Отбеливание зубов', price=15000, duration=90)
+        self.assertEqual(len(self.client.get(reverse('service-list')).json()['results']), 3)
+
+    def test_doctor_services_change_invalidates_cache(self):
+        self.client.get(reverse('doctor-list'))
+        self.doctor.services.remove(self.service)
+        services = self.client.get(reverse('doctor-list')).json()['results'][0]['services']
+        self.assertEqual([service['id'] for service in services], [self.short_service.id])
+
+
+class ConditionalCatalogTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_etag_revalidation(self):
+        response = self.client.get(reverse('service-list'))
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('service-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('doctor-list'))
+        response = self.client.get(reverse('doctor-list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_bumps_version(self):
+        etag = self.client.get(reverse('doctor-list'))['ETag']
+        self.doctor.services.clear()
+
+        response = self.client.get(reverse('doctor-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['services'], [])
+
+
+    def test_change_in_another_worker(self):
+        etag = self.client.get(reverse('doctor-list'))['ETag']
+        # Другой воркер: версия в базе выросла, локальный кэш не сброшен
+        CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(reverse('doctor-list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        later = time.time() + catalog.STATE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            response = self.client.get(reverse('doctor-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+class CatalogBootstrapTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_payload(self):
+        inactive = Service.objects.create(name='Архивная услуга', price=100, is_active=False)
+        self.doctor.services.add(inactive)
+
+        data = self.client.get(reverse('catalog')).json()
+        self.assertEqual(data['version'], CatalogVersion.objects.get().version)
+        self.assertEqual({service['id'] for service in data['services']}, {self.service.id, self.short_service.id})
+        self.assertNotIn('education', data['doctors'][0])
+        self.assertEqual(
+            sorted(data['doctor_services'][str(self.doctor.id)]),
+            sorted([self.service.id, self.short_service.id]),
+        )
+
+    def test_cached_and_conditional(self):
+        etag = self.client.get(reverse('catalog'))['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('catalog')).status_code, 200)
+            response = self.client.get(reverse('catalog'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogPaginationTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_cursor_pages_follow_name_order(self):
+        for name in ['Брекеты', 'Виниры', 'Импланты']:
+            Service.objects.create(name=name, price=1000)
+
+        names = []
+        url = reverse('service-list') + '?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            names += [service['name'] for service in data['results']]
+            url = data['next']
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 5)
+
+    def test_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('service-list'), {'fields': 'id,name,price'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'name', 'price'})
+        select = next(query['sql'] for query in queries if 'FROM "api_service"' in query['sql'])
+        self.assertNotIn('"description"', select)
+
+    def test_doctor_fields_skip_services_prefetch(self):
+        cache.clear()
+        data = self.client.get(reverse('doctor-list'), {'fields': 'id,name'}).json()
+        self.assertEqual(data['results'], [{'id': self.doctor.id, 'name': 'Иванов Иван'}])
+        self.assertNotIn('compiled_schedule', self.client.get(reverse('doctor-list')).json()['results'][0])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('service-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_variants_have_own_etag(self):
+        full = self.client.get(reverse('service-list'))['ETag']
+        sparse = self.client.get(reverse('service-list'), {'fields': 'id,name'})['ETag']
+        self.assertNotEqual(full, sparse)
+
+    @override_settings(ALLOWED_HOSTS=['internal', 'clinic.example'])
+    def test_links_follow_request_host(self):
+        Service.objects.create(name='Брекеты', price=1000)
+        self.client.get(reverse('service-list'), {'page_size': 1}, HTTP_HOST='internal')
+        data = self.client.get(reverse('service-list'), {'page_size': 1}, HTTP_HOST='clinic.example', secure=True).json()
+        self.assertTrue(data['next'].startswith('https://clinic.example/'))
+
+
+class HomePageCacheTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_sections_skip_db(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Лечение кариеса')
+        self.assertContains(response, 'Иванов Иван')
+
+    def test_catalog_change_refreshes_sections(self):
+        self.client.get(reverse('home'))
+        Doctor.objects.create(name='Петрова Анна', specialty='Ортодонт')
+        self.assertContains(self.client.get(reverse('home')), 'Петрова Анна')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, name, size=(1200, 900)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 100, 50)).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_derivatives_on_upload(self):
+        doctor = Doctor.objects.create(name='Врач', specialty='Хирург', photo=self.upload('face.jpg'))
+        doctor.refresh_from_db()
+
+        self.assertEqual(doctor.photo_variants['source'], doctor.photo.name)
+        with Image.open(os.path.join(self.media_root, doctor.photo_variants['webp']['150'])) as image:
+            self.assertEqual(image.size, (150, 150))
+            self.assertEqual(image.format, 'WEBP')
+
+        data = DoctorSerializer(doctor).data
+        self.assertIn('300w', data['photo_srcset']['webp'])
+        self.assertNotIn('photo_variants', data)
+
+    def test_small_image_is_not_upscaled(self):
+        service = Service.objects.create(name='Услуга', price=100, image=self.upload('small.jpg', (300, 200)))
+        with Image.open(os.path.join(self.media_root, service.image_variants['jpeg']['800'])) as image:
+            self.assertEqual(image.size, (300, 200))
+
+    def test_template_srcset(self):
+        Service.objects.create(name='Услуга', price=100, image=self.upload('tooth.jpg'))
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'tooth_400.webp 400w')
+
+    def test_backfill_command(self):
+        service = Service.objects.create(name='Услуга', price=100, image=self.upload('tooth.jpg'))
+        Service.objects.filter(pk=service.pk).update(image_variants={})
+
+        call_command('build_image_derivatives', workers=2, stdout=io.StringIO())
+        service.refresh_from_db()
+        self.assertEqual(set(service.image_variants['webp']), {'400', '800'})
+
+    def test_decompression_bomb_is_skipped(self):
+        # Лимит Pillow ниже размера картинки - она считается "бомбой"
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            with self.assertLogs('api.models', 'WARNING'):
+                service = Service.objects.create(name='Услуга', price=100, image=self.upload('bomb.jpg'))
+            self.assertEqual(service.image_variants, {'source': service.image.name})
+
+            Service.objects.filter(pk=service.pk).update(image_variants={})
+            output = io.StringIO()
+            call_command('build_image_derivatives', workers=1, stdout=output)
+        self.assertIn('bomb.jpg: Image size', output.getvalue())
+        service.refresh_from_db()
+        self.assertEqual(service.image_variants, {'source': service.image.name})
+
+
+class AdminQueryCountTests(ClinicTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def add_rows(self, start, count):
+        for i in range(start, start + count):
+            doctor = Doctor.objects.create(name=f'Врач {i}', specialty='Хирург')
+            service = Service.objects.create(name=f'Услуга {i}', price=100)
+            Appointment.objects.create(
+                patient_name=f'Пациент {i}', doctor=doctor, service=service, date=MONDAY, time='10:00'
+            )
+
+    def test_changelists_do_constant_queries(self):
+        urls = [
+            reverse('admin:api_service_changelist'),
+            reverse('admin:api_doctor_changelist'),
+            reverse('admin:api_appointment_changelist'),
+        ]
+        self.add_rows(0, 2)
+        before = [self.count_queries(url) for url in urls]
+        self.add_rows(2, 10)
+        after = [self.count_queries(url) for url in urls]
+        self.assertEqual(before, after)
+
+    def test_counts_are_annotated(self):
+        self.add_rows(0, 3)
+        response = self.client.get(reverse('admin:api_doctor_changelist') + '?o=6')
+        self.assertContains(response, f'?doctor__id__exact={self.doctor.id}">0</a>', html=False)
+
+
+class AppointmentIndexTests(ClinicTestCase):
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING {index}', plan)
+        self.assertNotIn('SCAN api_appointment\n', plan + '\n')
+        return plan
+
+    def test_booking_overlap(self):
+        queryset = Appointment.objects.overlapping(
+            self.doctor, MONDAY, datetime.strptime('10:00', '%H:%M').time(), datetime.strptime('11:00', '%H:%M').time()
+        )
+        # Как в .exists(): без сортировки и без колонок таблицы
+        self.assertUsesIndex(queryset.order_by().values('pk')[:1], 'COVERING INDEX appt_doctor_date_idx')
+
+    def test_free_slots_range(self):
+        queryset = Appointment.objects.active().filter(
+            doctor=self.doctor, date__range=(MONDAY, MONDAY + timedelta(days=30))
+        ).order_by().values_list('date', 'time', 'end_time')
+        self.assertUsesIndex(queryset, 'COVERING INDEX appt_doctor_date_idx')
+
+    def test_changelist_order_without_sort(self):
+        plan = self.assertUsesIndex(Appointment.objects.all()[:100], 'INDEX appt_date_time_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_today_filter(self):
+        plan = self.assertUsesIndex(Appointment.objects.filter(date=MONDAY)[:100], 'INDEX appt_date_time_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_date_hierarchy(self):
+        self.assertUsesIndex(Appointment.objects.filter(date__year=MONDAY.year, date__month=MONDAY.month), 'INDEX appt_date_time_idx')
+
+    def test_status_filter(self):
+        plan = self.assertUsesIndex(Appointment.objects.filter(status='pending')[:100], 'INDEX appt_status_date_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertUsesIndex(Appointment.objects.filter(status='confirmed').order_by(), 'INDEX appt_status_date_idx')
+
+
+class AppointmentTransferTests(ClinicTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        return path
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command(*args, stdout=out)
+        return out.getvalue()
+
+    def row(self, time, **extra):
+        return {
+            'patient_name': 'Пациент', 'patient_phone': '+996700000000',
+            'doctor': self.doctor.id, 'service': self.short_service.id,
+            'date': MONDAY.isoformat(), 'time': time, **extra,
+        }
+
+    def jsonl(self, *rows):
+        return ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+    def test_round_trip(self):
+        Appointment.objects.create(
+            patient_name='Петров', patient_phone='+996700000001', doctor=self.doctor,
+            service=self.service, date=MONDAY, time='09:00', status='confirmed',
+        )
+        Appointment.objects.create(
+            patient_name='Сидоров', patient_phone='+996700000002', doctor=self.doctor,
+            service=self.short_service, date=MONDAY, time='09:00', status='cancelled', comment='Перенос, "позже"',
+        )
+
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.directory, f'export.{fmt}')
+                self.assertIn('Экспортировано записей: 2', self.run_command('export_appointments', path))
+
+                exported = list(Appointment.objects.order_by('id').values(
+                    'patient_name', 'doctor', 'service', 'date', 'time', 'end_time', 'status', 'comment'
+                ))
+                Appointment.objects.all().delete()
+
+                # Файл экспорта импортируется без правок
+                output = self.run_command('import_appointments', path, '--batch-size', '1')
+                self.assertIn('Создано: 2, конфликтов: 0, ошибок: 0', output)
+                imported = list(Appointment.objects.order_by('id').values(
+                    'patient_name', 'doctor', 'service', 'date', 'time', 'end_time', 'status', 'comment'
+                ))
+                self.assertEqual(imported, exported)
+
+    def test_export_filters(self):
+        for day, status in ((MONDAY, 'pending'), (MONDAY + timedelta(days=1), 'completed')):
+            Appointment.objects.create(
+                patient_name='Петров', patient_phone='+996700000001', doctor=self.doctor,
+                service=self.service, date=day, time='09:00', status=status,
+            )
+        path = os.path.join(self.directory, 'export.jsonl')
+        self.run_command('export_appointments', path, '--date-from', str(MONDAY + timedelta(days=1)))
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['status'] for line in f], ['completed'])
+
+        self.run_command('export_appointments', path, '--status', 'pending')
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['status'] for line in f], ['pending'])
+
+    def test_conflicts_reported_per_row(self):
+        Appointment.objects.create(
+            patient_name='Петров', patient_phone='+996700000001', doctor=self.doctor,
+            service=self.service, date=MONDAY, time='09:00', status='confirmed',
+        )
+        path = self.write('import.jsonl', self.jsonl(
+            self.row('09:00'),                        # занято в базе
+            self.row('10:00'),
+            self.row('10:00'),                        # занято строкой выше
+            self.row('09:00', status='cancelled'),    # отмененные не конфликтуют
+            self.row('09:30'),                        # внутри записи 09:00-10:00 в базе
+            self.row('10:15'),                        # внутри строки 10:00-10:30
+            self.row('10:30'),
+        ))
+
+        output = self.run_command('import_appointments', path)
+        for line in (1, 3, 5, 6):
+            self.assertIn(f'Строка {line}: время занято', output)
+        self.assertIn('Создано: 3, конфликтов: 4, ошибок: 0', output)
+        self.assertEqual(Appointment.objects.count(), 4)
+        self.assertEqual(
+            Appointment.objects.get(time='10:00').end_time, datetime.strptime('10:30', '%H:%M').time()
+        )
+
+    def test_invalid_rows(self):
+        path = self.write('import.jsonl', '\n'.join([
+            '{"patient_name": "Без телефона"}',
+            'не json',
+            json.dumps(self.row('11:00', doctor=999)),
+            json.dumps(self.row('25:00')),
+            json.dumps(self.row('11:00', status='unknown')),
+            json.dumps(self.row('11:00', extra='1')),
+            json.dumps(self.row('11:00')),
+        ]))
+
+        output = self.run_command('import_appointments', path)
+        for line in range(1, 7):
+            self.assertIn(f'Строка {line}:', output)
+        self.assertIn('Создано: 1, конфликтов: 0, ошибок: 6', output)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_dry_run(self):
+        path = self.write('import.csv', 'patient_name,patient_phone,doctor,service,date,time\n'
+                                        f'Пациент,+996700000000,{self.doctor.id},{self.service.id},{MONDAY},12:00\n')
+        output = self.run_command('import_appointments', path, '--dry-run')
+        self.assertIn('Создано: 1', output)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_batch_query_count(self):
+        path = self.write('import.jsonl', self.jsonl(*(
+            self.row(f'{hour:02d}:{minute:02d}') for hour in range(9, 18) for minute in (0, 30)
+        )))
+        with CaptureQueriesContext(connection) as queries:
+            self.run_command('import_appointments', path, '--batch-size', '6')
+        # 2 справочника + на каждую из 3 пачек: поиск конфликтов, один INSERT
+        # записей и по одному в каждую сводную таблицу статистики
+        # (плюс SAVEPOINT/RELEASE вложенной транзакции)
+        selects = [q for q in queries.captured_queries if 'SELECT' in q['sql'] or 'INSERT' in q['sql']]
+        self.assertEqual(len(selects), 2 + 3 * 4)
+        self.assertEqual(Appointment.objects.count(), 18)
+
+
+class FixtureLoadingTests(TestCase):
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command(*args, stdout=out)
+        return out.getvalue()
+
+    def catalog_version(self):
+        return CatalogVersion.objects.get_or_create(pk=1)[0].version
+
+    def test_load_from_scratch(self):
+        self.run_command('load_services')
+        self.assertEqual(Service.objects.count(), len(SERVICES_DATA))
+
+        output = self.run_command('load_doctors')
+        self.assertIn(f'Создано: {len(DOCTORS_DATA)}', output)
+        for doctor_data in DOCTORS_DATA:
+            doctor = Doctor.objects.get(name=doctor_data['name'])
+            self.assertEqual(
+                set(doctor.services.values_list('name', flat=True)), set(doctor_data['services_names'])
+            )
+            self.assertEqual(doctor.compiled_schedule['0'], [[540, 1080]])
+
+    def test_second_run_changes_nothing(self):
+        self.run_command('load_services')
+        self.run_command('load_doctors')
+        version = self.catalog_version()
+
+        output = self.run_command('load_services')
+        self.assertIn(f'Создано: 0, Обновлено: 0, Без изменений: {len(SERVICES_DATA)}', output)
+        output = self.run_command('load_doctors')
+        self.assertIn('Создано: 0, Обновлено: 0', output)
+        self.assertIn('Связей добавлено: 0, удалено: 0', output)
+        self.assertEqual(self.catalog_version(), version)
+
+    def test_dry_run_reports_diff(self):
+        self.run_command('load_services')
+        service = Service.objects.get(name=SERVICES_DATA[0]['name'])
+        service.price = 1
+        service.save()
+        Service.objects.filter(name=SERVICES_DATA[1]['name']).delete()
+
+        output = self.run_command('load_services', '--dry-run')
+        self.assertIn(f'Создана услуга: {SERVICES_DATA[1]["name"]}', output)
+        self.assertIn(f'Обновлена услуга: {service.name} (Цена: 1.00 -> {SERVICES_DATA[0]["price"]})', output)
+        self.assertEqual(Service.objects.get(pk=service.pk).price, 1)
+        self.assertEqual(Service.objects.count(), len(SERVICES_DATA) - 1)
+
+        self.run_command('load_doctors')
+        doctor = Doctor.objects.get(name=DOCTORS_DATA[0]['name'])
+        doctor.services.add(service)
+        doctor.services.remove(*doctor.services.exclude(pk=service.pk)[:1])
+        links = set(Doctor.services.through.objects.values_list('doctor_id', 'service_id'))
+
+        output = self.run_command('load_doctors', '--dry-run')
+        self.assertIn(f'Врачу {doctor.name} добавлена услуга', output)
+        self.assertEqual(set(Doctor.services.through.objects.values_list('doctor_id', 'service_id')), links)
+
+    def test_updates_derived_fields(self):
+        self.run_command('load_services')
+        self.run_command('load_doctors')
+        service = Service.objects.get(name=SERVICES_DATA[0]['name'])
+        doctor = Doctor.objects.get(name=DOCTORS_DATA[0]['name'])
+        appointment = Appointment.objects.create(
+            patient_name='Петров', patient_phone='+996700000001', doctor=doctor,
+            service=service, date=MONDAY, time='09:00', status='confirmed',
+        )
+        doctor.working_hours = {'пн': '10:00-12:00'}
+        doctor.save()
+        version = self.catalog_version()
+
+        services = [{**row, 'duration': 90} if row['name'] == service.name else row for row in SERVICES_DATA]
+        with mock.patch('api.management.commands.load_services.SERVICES_DATA', services):
+            self.run_command('load_services')
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.end_time, datetime.strptime('10:30', '%H:%M').time())
+
+        self.run_command('load_doctors')
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.compiled_schedule['0'], [[540, 1080]])
+        self.assertGreater(self.catalog_version(), version)
+
+    def test_query_count_does_not_grow(self):
+        def load(services, doctors):
+            services_data = [
+                {'name': f'Услуга {i}', 'description': '', 'price': 100 + i, 'duration': 30}
+                for i in range(services)
+            ]
+            doctors_data = [
+                {'name': f'Врач {i}', 'specialty': 'Терапевт', 'experience': i, 'education': '',
+                 'description': '', 'services_names': [f'Услуга {j}' for j in range(i % 5)]}
+                for i in range(doctors)
+            ]
+            with mock.patch('api.management.commands.load_services.SERVICES_DATA', services_data), \
+                    mock.patch('api.management.commands.load_doctors.DOCTORS_DATA', doctors_data), \
+                    CaptureQueriesContext(connection) as queries:
+                self.run_command('load_services')
+                self.run_command('load_doctors')
+            Doctor.objects.all().delete()
+            Service.objects.all().delete()
+            return len(queries)
+
+        load(1, 1)  # создает строку CatalogVersion
+        # До ~90 строк (999 параметров SQLite) bulk_create - один INSERT
+        self.assertEqual(load(5, 3), load(80, 80))
+
+
+class AdminExportTests(ClinicTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.confirmed = Appointment.objects.create(
+            patient_name='Петров Петр', patient_phone='+996700000001', doctor=self.doctor,
+            service=self.service, date=MONDAY, time='09:00', status='confirmed', comment='Боль, "ночью"',
+        )
+        self.pending = Appointment.objects.create(
+            patient_name='Сидорова Анна', patient_phone='+996700000002', doctor=self.doctor,
+            service=self.short_service, date=MONDAY + timedelta(days=31), time='10:00', status='pending',
+        )
+        self.url = reverse('admin:api_appointment_export')
+
+    def export_csv(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_csv(self):
+        header, *rows = self.export_csv('?format=csv')
+        self.assertEqual(header[:3], ['ID', 'Пациент', 'Телефон'])
+        row = next(row for row in rows if row[0] == str(self.confirmed.id))
+        self.assertEqual(row[4:11], [
+            'Иванов Иван', 'Лечение кариеса', '4500.00', f'{MONDAY:%d.%m.%Y}', '09:00', self.confirmed.get_status_display(), 'Боль, "ночью"',
+        ])
+
+    def test_csv_formulas_neutralized(self):
+        Appointment.objects.filter(pk=self.confirmed.pk).update(
+            patient_name='=HYPERLINK("http://example.com","Петров")', comment='@SUM(1+1)',
+            admin_notes='-2+3', patient_phone='+996 (700) 00-00-01',
+        )
+        _, *rows = self.export_csv('?format=csv&status__exact=confirmed')
+        [row] = rows
+        self.assertEqual(
+            (row[1], row[2], row[10], row[11]),
+            ('\'=HYPERLINK("http://example.com","Петров")', '+996 (700) 00-00-01', "'@SUM(1+1)", '-2+3'),
+        )
+
+    def test_changelist_filters_apply(self):
+        cases = {
+            '?status__exact=pending': [self.pending],
+            '?q=Петров': [self.confirmed],
+            f'?date__year={MONDAY.year}&date__month={MONDAY.month}': [self.confirmed],
+            '?status=pending': [self.pending],
+            '': [self.pending, self.confirmed],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                _, *rows = self.export_csv(query)
+                self.assertEqual([row[0] for row in rows], [str(a.id) for a in expected])
+
+    def test_invalid_filter_redirects(self):
+        response = self.client.get(self.url + '?unknown=1')
+        self.assertRedirects(response, reverse('admin:api_appointment_changelist') + '?e=1')
+        self.assertEqual(self.client.get(self.url + '?format=pdf').status_code, 400)
+
+    def test_xlsx(self):
+        response = self.client.get(self.url + '?format=xlsx&status__exact=confirmed')
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t xml:space="preserve">Петров Петр</t>', sheet)
+        self.assertIn('<c r="G2"><v>4500.00</v></c>', sheet)
+        self.assertIn('Боль, "ночью"', sheet)
+        self.assertNotIn('Сидорова', sheet)
+
+    def test_action_exports_selected(self):
+        response = self.client.post(reverse('admin:api_appointment_changelist'), {
+            'action': 'export_csv', '_selected_action': [self.pending.id],
+        })
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('Сидорова Анна', content)
+        self.assertNotIn('Петров Петр', content)
+
+    def test_changelist_links(self):
+        response = self.client.get(reverse('admin:api_appointment_changelist') + '?status__exact=pending')
+        self.assertContains(response, f'{self.url}?status__exact=pending&amp;format=xlsx')
+
+    def test_query_count_does_not_grow(self):
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.export_csv('?format=csv')
+            return len(queries)
+
+        before = count()
+        for i in range(20):
+            Appointment.objects.create(
+                patient_name=f'Пациент {i}', patient_phone='+996700000003', doctor=self.doctor,
+                service=self.service, date=MONDAY + timedelta(days=i + 1), time='09:00',
+            )
+        self.assertEqual(count(), before)
+
+
+@override_settings(ROOT_URLCONF=build_urlconf(async_api=True))
+class AsyncApiTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_catalog_matches_sync(self):
+        response = await self.async_client.get('/api/catalog/')
+        self.assertEqual(response.status_code, 200)
+        # Промах кэша строится async-ORM, второй ответ - из кэша
+        cached = await self.async_client.get('/api/catalog/')
+        self.assertEqual(cached.content, response.content)
+
+        with override_settings(ROOT_URLCONF='config.urls'):
+            await cache.aclear()
+            sync = await sync_to_async(self.client.get)('/api/catalog/')
+        self.assertEqual(json.loads(response.content), json.loads(sync.content))
+        self.assertEqual(response['ETag'], sync['ETag'])
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        not_modified = await self.async_client.get('/api/catalog/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_cache_hit_stays_on_event_loop(self):
+        await self.async_client.get('/api/services/?page_size=1')
+        with mock.patch('api.async_views.sync_to_async', side_effect=AssertionError('переход в поток')):
+            response = await self.async_client.get('/api/services/?page_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    async def test_lists_match_sync(self):
+        for url in ['/api/services/?fields=id,name', '/api/doctors/?page_size=1', '/api/services/?fields=unknown']:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                with override_settings(ROOT_URLCONF='config.urls'):
+                    sync = await sync_to_async(self.client.get)(url)
+                self.assertEqual(response.status_code, sync.status_code)
+                self.assertEqual(response.json(), sync.json())
+
+    async def test_links_follow_request_scheme(self):
+        await self.async_client.get('/api/services/?page_size=1')
+        response = await self.async_client.get('/api/services/?page_size=1', secure=True)
+        self.assertTrue(response.json()['next'].startswith('https://testserver/'))
+
+    async def test_booking(self):
+        payload = {
+            'patient_name': 'Петров Петр', 'patient_phone': '+996700000001',
+            'doctor': self.doctor.id, 'service': self.service.id,
+            'date': MONDAY.isoformat(), 'time': '10:00',
+        }
+        response = await self.async_client.post('/api/appointments/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Appointment.objects.filter(patient_name='Петров Петр', status='pending').aexists())
+
+        response = await self.async_client.post(
+            '/api/appointments/', {**payload, 'time': '10:30'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Это время уже занято', response.json()['error'])
+
+        response = await self.async_client.post(
+            '/api/appointments/', {**payload, 'date': '2000-01-03'}, content_type='application/json'
+        )
+        self.assertIn('прошедшую дату', response.json()['error'])
+
+        response = await self.async_client.post(
+            '/api/appointments/', {**payload, 'doctor': 999}, content_type='application/json'
+        )
+        self.assertIn('doctor', response.json())
+        self.assertEqual(await Appointment.objects.acount(), 1)
+
+
+@override_settings(PERF_METRICS=True, METRICS_TOKEN='')
+class PerformanceMiddlewareTests(ClinicTestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.reset()
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def timing(self, response):
+        return dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('service-list'))
+        self.assertEqual(response.status_code, 200)
+        timing = self.timing(response)
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', timing['db'])
+        self.assertIn('render;dur=', timing['render'])
+        self.assertIn('total;dur=', timing['total'])
+
+    def test_serialization_timed(self):
+        def serialize_ms(response):
+            return float(self.timing(response)['serialize'].split('dur=')[1])
+
+        # Промах кэша каталога: ответ собирается сериализаторами, рендеринга нет
+        response = self.client.get(reverse('service-list'))
+        self.assertGreater(serialize_ms(response), 0)
+        self.assertEqual(self.timing(response)['render'], 'render;dur=0.0')
+        self.assertEqual(serialize_ms(self.client.get(reverse('service-list'))), 0)
+        series = metrics_registry.serialize_time.series[('service-list',)]
+        self.assertEqual(sum(series[:-1]), 2)
+        self.assertGreater(series[-1], 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('service-list'))
+        self.client.get(reverse('home'))
+        self.client.force_login(self.staff)
+        self.client.get(reverse('admin:api_appointment_changelist'))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('clinic_requests_total{view="service-list",method="GET",status="200"} 1', text)
+        self.assertIn('clinic_requests_total{view="home",method="GET",status="200"} 1', text)
+        self.assertIn('clinic_request_duration_seconds_bucket{view="home",le="+Inf"} 1', text)
+        self.assertIn('clinic_request_queries_count{view="admin:api_appointment_changelist"} 1', text)
+        self.assertIn('# TYPE clinic_response_size_bytes histogram', text)
+        # Админка - шаблонный ответ, его рендеринг замеряется отдельно
+        self.assertGreater(metrics_registry.render_time.series[('admin:api_appointment_changelist',)][-1], 0)
+
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            url = reverse('metrics')
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+    @override_settings(ROOT_URLCONF=build_urlconf(async_api=True))
+    async def test_async_views(self):
+        # ORM async-представлений работает в основном потоке теста, а его
+        # соединение открыто до включения метрик (новые получают обертку
+        # через connection_created)
+        await sync_to_async(install_query_recorder)(connection)
+        response = await self.async_client.get('/api/catalog/')
+        self.assertEqual(response.status_code, 200)
+        # Запросы async-ORM выполняются в потоках, но учитываются
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    @override_settings(PERF_METRICS=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('service-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics_registry.requests.series, {})
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+class EndpointBenchmarkTests(TestCase):
+    RESULT = {'rps': 100.0, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 25.0, 'errors': 0, 'queries': 3}
+
+    def test_compare(self):
+        baseline = {'slots': self.RESULT}
+        self.assertEqual(compare({'slots': {**self.RESULT, 'p95_ms': 29.0}}, baseline, 0.5), [])
+        self.assertEqual(compare({'home': self.RESULT}, baseline, 0.5), [])
+
+        regressions = compare({'slots': {**self.RESULT, 'p95_ms': 31.0, 'queries': 4}}, baseline, 0.5)
+        self.assertEqual(regressions, ['slots: p95 20.0 -> 31.0 мс', 'slots: SQL-запросов 3 -> 4'])
+        self.assertEqual(
+            compare({'slots': {**self.RESULT, 'rps': 60.0, 'errors': 1}}, baseline, 0.5),
+            ['slots: запр/с 100.0 -> 60.0', 'slots: ошибок 0 -> 1'],
+        )
+        # Разница в доли миллисекунды - шум
+        fast = {**self.RESULT, 'p95_ms': 0.5}
+        self.assertEqual(compare({'slots': {**fast, 'p95_ms': 1.2}}, {'slots': fast}, 0.5), [])
+
+    def test_command(self):
+        path = os.path.join(tempfile.mkdtemp(), 'endpoints.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        args = [
+            'bench_endpoints', '--services', '3', '--doctors', '2', '--appointments', '50',
+            '--clients', '2', '--requests', '2', '--baseline', path,
+        ]
+        call_command(*args, '--save-baseline', stdout=io.StringIO())
+        with open(path, encoding='utf-8') as f:
+            results = json.load(f)['results']
+        self.assertEqual(set(results), {'home', 'services', 'doctors', 'slots', 'appointments'})
+        self.assertEqual(sum(result['errors'] for result in results.values()), 0)
+        self.assertGreater(results['appointments']['queries'], 0)
+        # Данные бенчмарка откатываются
+        self.assertFalse(Appointment.objects.exists())
+
+        out = io.StringIO()
+        call_command(*args, '--tolerance', '1000', stdout=out)
+        self.assertIn('Регрессий относительно базовых результатов нет', out.getvalue())
+
+
+class SyntheticDataTests(TestCase):
+    def snapshot(self):
+        return list(Appointment.objects.order_by('date', 'time', 'doctor__name', 'pk').values_list(
+            'doctor__name', 'service__name', 'date', 'time', 'end_time', 'status', 'patient_name', 'patient_phone',
+        ))
+
+    def assert_consistent(self, appointments):
+        self.assertEqual(Appointment.objects.count(), appointments)
+        # Услуги врачей - по специализации из фикстур
+        doctor_services = {}
+        for doctor in Doctor.objects.prefetch_related('services'):
+            doctor_services[doctor.pk] = {service.pk for service in doctor.services.all()}
+            self.assertIn('Консультация стоматолога', {service.name for service in doctor.services.all()})
+
+        by_day = {}
+        for appointment in Appointment.objects.select_related('doctor', 'service'):
+            self.assertIn(appointment.service_id, doctor_services[appointment.doctor_id])
+            start = appointment.time.hour * 60 + appointment.time.minute
+            end = start + appointment.service.duration
+            shifts = shifts_for(appointment.doctor.compiled_schedule, appointment.date.weekday())
+            self.assertTrue(any(a <= start and end <= b for a, b in shifts), appointment)
+            if appointment.status in Appointment.ACTIVE_STATUSES:
+                by_day.setdefault((appointment.doctor_id, appointment.date), []).append((start, end))
+        for intervals in by_day.values():
+            intervals.sort()
+            for (_, previous_end), (next_start, _) in zip(intervals, intervals[1:]):
+                self.assertLessEqual(previous_end, next_start)
+
+        # Счетчики статистики обновлены вместе с записями
+        self.assertEqual(set(rebuild_stats().values()), {0})
+
+    def test_generate(self):
+        doctors = synthetic_data.generate(doctors=4, appointments=600, seed=7, batch_size=100, use_numpy=False)
+        self.assertEqual(len(doctors), 4)
+        self.assert_consistent(600)
+
+    @skipUnless(synthetic_data.numpy, 'NumPy не установлен')
+    def test_generate_numpy(self):
+        synthetic_data.generate(doctors=4, appointments=600, seed=7, batch_size=100, use_numpy=True)
+        self.assert_consistent(600)
+
+    def test_deterministic(self):
+        synthetic_data.generate(doctors=3, appointments=200, seed=3, use_numpy=False)
+        first = self.snapshot()
+        Appointment.objects.all().delete()
+        Doctor.objects.all().delete()
+        synthetic_data.generate(doctors=3, appointments=200, seed=3, use_numpy=False)
+        self.assertEqual(self.snapshot(), first)
+
+
+class ArchiveTests(ClinicTestCase):
+    def create(self, day, time, status):
+        return Appointment.objects.create(
+            patient_name=f'Пациент {time}', patient_phone='+996700000000',
+            doctor=self.doctor, service=self.service, date=day, time=time, status=status,
+        )
+
+    def test_moves_old_finished_appointments(self):
+        old = MONDAY - timedelta(days=800)
+        moved = [self.create(old, '09:00', 'completed'), self.create(old, '11:00', 'cancelled')]
+        kept = [self.create(old, '13:00', 'confirmed'), self.create(MONDAY, '09:00', 'completed')]
+        # Кэш дня строится заранее и должен сброситься
+        DoctorDay.objects.get_or_create(doctor=self.doctor, date=old)
+
+        out = io.StringIO()
+        call_command('archive_appointments', before=MONDAY - timedelta(days=730), batch_size=1, stdout=out)
+        self.assertIn('Перенесено в архив: 2', out.getvalue())
+        self.assertEqual(
+            set(Appointment.objects.values_list('pk', flat=True)), {appointment.pk for appointment in kept},
+        )
+        archived = ArchivedAppointment.objects.get(pk=moved[0].pk)
+        self.assertEqual(
+            (archived.patient_name, archived.date, archived.status, archived.created_at),
+            (moved[0].patient_name, old, 'completed', moved[0].created_at),
+        )
+        self.assertIsNotNone(archived.archived_at)
+        self.assertFalse(DoctorDay.objects.filter(date=old).exists())
+        # Статистика учитывает архив
+        self.assertEqual(set(rebuild_stats().values()), {0})
+
+        # Повторный запуск продолжает с того же места - переносить нечего
+        self.assertEqual(archive.archive_batch(MONDAY - timedelta(days=730), 100), 0)
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+
+    def test_active_statuses_are_not_archived(self):
+        self.create(MONDAY - timedelta(days=800), '09:00', 'pending')
+        with self.assertRaises(CommandError):
+            call_command('archive_appointments', '--status', 'pending', stdout=io.StringIO())
+        with self.assertRaises(ValueError):
+            archive.archive_batch(MONDAY, 100, ['completed', 'confirmed'])
+        self.assertFalse(ArchivedAppointment.objects.exists())
+
+    def test_dry_run(self):
+        self.create(MONDAY - timedelta(days=800), '09:00', 'completed')
+        out = io.StringIO()
+        call_command('archive_appointments', before=MONDAY, dry_run=True, stdout=out)
+        self.assertIn('для переноса: 1', out.getvalue())
+        self.assertFalse(ArchivedAppointment.objects.exists())
+
+    def test_admin_is_read_only(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.create(MONDAY - timedelta(days=800), '09:00', 'completed')
+        archive.archive_batch(MONDAY, 100)
+        changelist = reverse('admin:api_archivedappointment_changelist')
+
+        response = self.client.get(changelist, {'q': 'Пациент 09'})
+        self.assertContains(response, 'Пациент 09:00')
+        response = self.client.get(changelist, {'q': 'нет такого'})
+        self.assertNotContains(response, 'Пациент 09:00')
+        self.assertEqual(self.client.get(reverse('admin:api_archivedappointment_add')).status_code, 403)
+
+
+class SearchTests(ClinicTestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+        self.appointment = Appointment.objects.create(
+            patient_name='Сагынбеков Канат', patient_phone='+996 (700) 12-34-56', patient_email='kanat@mail.kg',
+            doctor=self.doctor, service=self.service, date=MONDAY, time='10:00',
+        )
+
+    def found(self, term):
+        return set(search.search(Appointment.objects.all(), term).values_list('pk', flat=True))
+
+    def test_match_query(self):
+        self.assertEqual(search.match_query('+996 (700) 12'), 'phone : "99670012"*')
+        self.assertEqual(search.match_query('0700'), 'phone : "700"*')
+        self.assertEqual(
+            search.match_query('Иван 12'),
+            '{patient_name patient_email doctor_name} : "Иван"* AND phone : "12"*',
+        )
+        self.assertEqual(
+            search.match_query('700 12 Иван'),
+            '{patient_name patient_email doctor_name} : "Иван"* AND phone : "70012"*',
+        )
+        self.assertIsNone(search.match_query('"*'))
+
+    def test_prefix_and_phone_digits(self):
+        pk = self.appointment.pk
+        for term in ['сагын', 'Сагынбеков кан', 'kanat', 'ивано', '996700123456', '+996 700 12', '0700 123', '700-12',
+                     '0700/12', 'сагын 700 12']:
+            with self.subTest(term=term):
+                self.assertEqual(self.found(term), {pk})
+        for term in ['кан сагынбековы', '12 34 56', 'петров']:
+            with self.subTest(term=term):
+                self.assertEqual(self.found(term), set())
+
+    def test_index_follows_writes(self):
+        pk = self.appointment.pk
+        self.appointment.patient_name = 'Асанова Айгуль'
+        self.appointment.save()
+        self.assertEqual(self.found('сагын'), set())
+        self.assertEqual(self.found('асан'), {pk})
+
+        # Массовые изменения мимо save()
+        Appointment.objects.filter(pk=pk).update(patient_phone='0555/98.76_54')
+        self.assertEqual(self.found('555987'), {pk})
+        self.assertEqual(self.found('700123'), set())
+        Doctor.objects.filter(pk=self.doctor.pk).update(name='Петров Петр')
+        self.assertEqual(self.found('петр'), {pk})
+        self.assertEqual(self.found('иванов'), set())
+
+        [created] = Appointment.objects.bulk_create([Appointment(
+            patient_name='Асанов Бакыт', patient_phone='+996555000000',
+            doctor=self.doctor, service=self.service, date=MONDAY, time='12:00', end_time='13:00',
+        )])
+        self.assertEqual(self.found('асан'), {pk, created.pk})
+
+        Appointment.objects.filter(pk=created.pk).update(status='completed', date=MONDAY - timedelta(days=800))
+        archive.archive_batch(MONDAY, 100)
+        self.appointment.delete()
+        self.assertEqual(self.found('асан'), set())
+
+    def test_admin_search(self):
+        self.client.force_login(self.staff)
+        url = reverse('admin:api_appointment_changelist')
+        self.assertContains(self.client.get(url, {'q': 'сагын'}), 'Сагынбеков Канат')
+        self.assertContains(self.client.get(url, {'q': '0700 12 34'}), 'Сагынбеков Канат')
+        self.assertNotContains(self.client.get(url, {'q': 'петров'}), 'Сагынбеков Канат')
+
+    def test_api(self):
+        url = reverse('appointment-search')
+        response = self.api.get(url, {'q': '+996 700'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(a['id'], a['doctor'], a['service'], a['status']) for a in response.data],
+            [(self.appointment.pk, self.doctor.name, self.service.name, 'pending')],
+        )
+        self.assertEqual(self.api.get(url, {'q': 'с'}).status_code, 400)
+        self.assertEqual(APIClient().get(url, {'q': 'сагын'}).status_code, 401)
@@ -0,0 +1,379 @@
+"""
+Потоковый импорт и экспорт записей на прием (CSV и JSONL).
+
+Экспорт читает записи через ``.iterator()`` порциями и пишет строки сразу,
+память не зависит от объема таблицы. Импорт читает файл построчно,
+проверяет строки и сохраняет их пачками (``executemany``): одна пачка -
+одна транзакция и один запрос на поиск конфликтов с уже существующими
+активными записями (ограничение ``appointment_active_slot_unique``).
+
+Выгрузка для сотрудников (``iter_report``) - те же записи в CSV или XLSX
+для Excel: имена врачей и услуг вместо id, статус по-русски.
+"""
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, time as datetime_time
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from .booking import find_conflicts
+from .daily_schedule import forget_days
+from .models import Appointment, Doctor, Service
+from .stats import record as record_stats
+from .xlsx import CONTENT_TYPE as XLSX_CONTENT_TYPE, iter_xlsx
+
+EXPORT_FIELDS = [
+    'id', 'patient_name', 'patient_phone', 'patient_email',
+    'doctor_id', 'service_id', 'date', 'time', 'status',
+    'comment', 'admin_notes', 'created_at',
+]
+
+# Поля, которые принимает импорт; doctor/service - это id
+IMPORT_FIELDS = [
+    'patient_name', 'patient_phone', 'patient_email',
+    'doctor', 'service', 'date', 'time', 'status',
+    'comment', 'admin_notes',
+]
+
+# Колонки экспорта под другим именем в импорте
+IMPORT_ALIASES = {'doctor_id': 'doctor', 'service_id': 'service'}
+
+# Колонки экспорта, которые импорт пропускает: id и время создания новые
+IMPORT_IGNORED = {'id', 'created_at'}
+
+STATUSES = {value for value, _ in Appointment.STATUS_CHOICES}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(path, default='jsonl'):
+    for fmt in FORMATS:
+        if str(path).endswith('.' + fmt):
+            return fmt
+    return default
+
+
+# --- Экспорт ---
+
+def _serialize(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_export_rows(queryset, chunk_size=2000):
+    """Строки экспорта (словари) в порядке id, без загрузки всей таблицы в память."""
+    rows = queryset.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield {name: _serialize(value) for name, value in zip(EXPORT_FIELDS, row)}
+
+
+class _Echo:
+    """Псевдофайл для csv.writer, возвращающий строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+LINE_WRITERS = {'csv': iter_csv_lines, 'jsonl': iter_jsonl_lines}
+
+
+# --- Выгрузка для сотрудников ---
+
+REPORT_COLUMNS = [
+    ('ID', 'id'),
+    ('Пациент', 'patient_name'),
+    ('Телефон', 'patient_phone'),
+    ('Email', 'patient_email'),
+    ('Врач', 'doctor__name'),
+    ('Услуга', 'service__name'),
+    ('Цена', 'service__price'),
+    ('Дата', 'date'),
+    ('Время', 'time'),
+    ('Статус', 'status'),
+    ('Комментарий', 'comment'),
+    ('Заметки администратора', 'admin_notes'),
+    ('Создана', 'created_at'),
+]
+
+# Строк CSV в одном куске ответа
+REPORT_CSV_CHUNK = 500
+
+
+def iter_report_rows(queryset, chunk_size=2000):
+    """
+    Кортежи значений ``REPORT_COLUMNS``. Врач и услуга берутся JOIN-ом в том
+    же запросе, строки читаются через ``.iterator()`` порциями.
+    """
+    statuses = dict(Appointment.STATUS_CHOICES)
+    rows = queryset.values_list(*(lookup for _, lookup in REPORT_COLUMNS)).iterator(chunk_size=chunk_size)
+    for (pk, patient_name, patient_phone, patient_email, doctor, service, price,
+         date, time, status, comment, admin_notes, created_at) in rows:
+        yield (
+            pk, patient_name, patient_phone, patient_email, doctor, service, price,
+            date.strftime('%d.%m.%Y'), time.strftime('%H:%M'), statuses.get(status, status),
+            comment, admin_notes, timezone.localtime(created_at).strftime('%d.%m.%Y %H:%M'),
+        )
+
+
+# Начало ячейки, с которого Excel читает формулу
+FORMULA_PREFIXES = ('=', '@', '+', '-', '\t', '\r')
+
+# Телефон: формулой не выполнится, апостроф перед ним не нужен
+PHONE = re.compile(r'^[+\d\s()-]+$')
+
+
+def _csv_cell(value):
+    # Имена и комментарии приходят из формы записи без авторизации:
+    # "=HYPERLINK(...)" не должно выполниться в Excel у сотрудника
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not PHONE.match(value):
+        return "'" + value
+    return value
+
+
+def iter_report_csv(rows):
+    # BOM - чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+    writer = csv.writer(_Echo())
+    chunk = ['\ufeff' + writer.writerow([header for header, _ in REPORT_COLUMNS])]
+    for row in rows:
+        chunk.append(writer.writerow([_csv_cell(value) for value in row]))
+        if len(chunk) >= REPORT_CSV_CHUNK:
+            yield ''.join(chunk).encode()
+            chunk = []
+    yield ''.join(chunk).encode()
+
+
+def iter_report_xlsx(rows):
+    return iter_xlsx([header for header, _ in REPORT_COLUMNS], rows, sheet_name='Записи')
+
+
+# Формат -> (куски байт ответа, Content-Type)
+REPORT_FORMATS = {
+    'csv': (iter_report_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (iter_report_xlsx, XLSX_CONTENT_TYPE),
+}
+
+
+def iter_report(queryset, fmt):
+    write, _ = REPORT_FORMATS[fmt]
+    return write(iter_report_rows(queryset))
+
+
+# --- Импорт ---
+
+def read_rows(stream, fmt):
+    """(номер строки, словарь) из CSV с заголовком или JSONL."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError('Ожидается JSON-объект')
+
+
+class RowError(Exception):
+    pass
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{name}: ожидается id, получено {value!r}')
+
+
+def _parse_field(name, value):
+    try:
+        parsed = Appointment._meta.get_field(name).to_python(value)
+    except ValidationError:
+        parsed = None
+    if parsed is None:
+        raise RowError(f'{name}: некорректное значение {value!r}')
+    return parsed
+
+
+class RowValidator:
+    """
+    Проверяет строки импорта против справочников, загруженных один раз, и
+    возвращает значения полей записи по ``attname``.
+    """
+
+    def __init__(self):
+        self.service_durations = dict(Service.objects.values_list('id', 'duration'))
+        self.doctor_ids = set(Doctor.objects.values_list('id', flat=True))
+
+    def __call__(self, row):
+        if isinstance(row, Exception):
+            raise RowError(f'не разобрана: {row}')
+
+        if None in row:
+            # csv.DictReader складывает лишние колонки под ключ None
+            raise RowError('лишние колонки без заголовка')
+        # Файл export_appointments импортируется как есть
+        row = {IMPORT_ALIASES.get(name, name): value for name, value in row.items() if name not in IMPORT_IGNORED}
+        unknown = set(row) - set(IMPORT_FIELDS)
+        if unknown:
+            raise RowError(f"неизвестные поля: {', '.join(sorted(unknown))}")
+
+        patient_name = (row.get('patient_name') or '').strip()
+        patient_phone = (row.get('patient_phone') or '').strip()
+        patient_email = (row.get('patient_email') or '').strip()
+        if not patient_name:
+            raise RowError('patient_name: обязательное поле')
+        if not patient_phone:
+            raise RowError('patient_phone: обязательное поле')
+        if patient_email:
+            try:
+                validate_email(patient_email)
+            except ValidationError:
+                raise RowError(f'patient_email: некорректный адрес {patient_email!r}')
+
+        doctor_id = _parse_int(row.get('doctor'), 'doctor')
+        service_id = _parse_int(row.get('service'), 'service')
+        if doctor_id not in self.doctor_ids:
+            raise RowError(f'doctor: врач {doctor_id} не найден')
+        if service_id not in self.service_durations:
+            raise RowError(f'service: услуга {service_id} не найдена')
+
+        status = (row.get('status') or 'pending').strip()
+        if status not in STATUSES:
+            raise RowError(f'status: неизвестный статус {status!r}')
+
+        date = _parse_field('date', row.get('date'))
+        time = _parse_field('time', row.get('time'))
+        end = datetime.combine(date, time) + timedelta(minutes=self.service_durations[service_id])
+
+        # Словарь по attname, а не Appointment(): конструктор модели - треть
+        # времени импорта миллиона строк
+        return {
+            'patient_name': patient_name[:100],
+            'patient_phone': patient_phone[:20],
+            'patient_email': patient_email,
+            'doctor_id': doctor_id,
+            'service_id': service_id,
+            'date': date,
+            'time': time,
+            'end_time': end.time() if end.date() == date else datetime_time.max,
+            'status': status,
+            'comment': row.get('comment') or '',
+            'admin_notes': row.get('admin_notes') or '',
+        }
+
+
+@dataclass
+class BatchResult:
+    created: int = 0
+    conflicts: list = field(default_factory=list)
+    # Пачка откатилась целиком (время заняли параллельно с импортом)
+    rolled_back: bool = False
+
+
+def _slot(values):
+    return values['doctor_id'], values['date'], values['time']
+
+
+def _insert(rows):
+    """
+    INSERT пачки одним ``executemany``.
+
+    ``bulk_create`` на SQLite дробит пачку по 999 параметров (~70 строк на
+    запрос) и готовит каждое значение через поле модели - на миллионе строк
+    это большая часть времени импорта. Поля и порядок колонок берутся из модели,
+    поля auto_now/auto_now_add получают одно время на всю пачку, отсутствующие
+    в строке - значение по умолчанию.
+    """
+    connection = connections[router.db_for_write(Appointment)]
+    fields = [f for f in Appointment._meta.concrete_fields if not f.primary_key]
+    now = timezone.now()
+    # Даты и время приводим адаптерами базы напрямую, остальное (строки, id)
+    # SQLite принимает как есть
+    adapters = {
+        'DateField': connection.ops.adapt_datefield_value,
+        'TimeField': connection.ops.adapt_timefield_value,
+        'DateTimeField': connection.ops.adapt_datetimefield_value,
+    }
+    converters = []
+    for f in fields:
+        adapt = adapters.get(f.get_internal_type())
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False):
+            value = adapt(now)
+            converters.append(lambda values, value=value: value)
+        elif adapt:
+            converters.append(lambda values, name=f.attname, adapt=adapt: adapt(values[name]))
+        else:
+            default = f.get_default()
+            converters.append(lambda values, name=f.attname, default=default: values.get(name, default))
+
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(Appointment._meta.db_table),
+        ', '.join(quote(f.column) for f in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [tuple(convert(values) for convert in converters) for values in rows])
+
+
+def import_batch(batch):
+    """
+    Сохраняет пачку [(номер строки, значения полей)] в одной транзакции.
+
+    Активные записи, пересекающиеся с занятым временем (в базе или раньше в
+    этой же пачке), не сохраняются и попадают в ``conflicts``. Если время заняли
+    параллельно, пачка откатывается целиком (``rolled_back``).
+    """
+    result = BatchResult()
+
+    with transaction.atomic():
+        # find_conflicts читает только атрибуты - модель строить не нужно
+        conflicts = set(find_conflicts([SimpleNamespace(**values) for _, values in batch]))
+        to_create = []
+        for index, (line, values) in enumerate(batch):
+            if index in conflicts:
+                result.conflicts.append((line, _slot(values)))
+            else:
+                to_create.append(values)
+
+        try:
+            with transaction.atomic():
+                _insert(to_create)
+                # Пересчитывать дни на каждой пачке импорта дорого - они
+                # построятся при первом чтении
+                forget_days((values['doctor_id'], values['date']) for values in to_create)
+                record_stats((values, 1) for values in to_create)
+        except IntegrityError:
+            result.rolled_back = True
+            return result
+
+    result.created = len(to_create)
+    return result
@@ -1,16 +1,50 @@
+from types import ModuleType
+
+from django.conf import settings
 from django.urls import path
-from .views import ( home,
-    ServiceList, DoctorList,
-    AppointmentCreate,
+from . import async_views
+from .views import ( home, metrics,
+    ServiceList, DoctorList, DoctorSlots, DoctorSchedule, CatalogBootstrap,
+    AppointmentCreate, AppointmentBatchCreate, AppointmentSearch,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
-urlpatterns = [
-    path('', home, name='home'),
-    path('api/services/', ServiceList.as_view(), name='service-list'),
-    path('api/doctors/', DoctorList.as_view(), name='doctor-list'),
 
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/appointments/', AppointmentCreate.as_view(), name='appointment-create'),
+def build_urlpatterns(async_api=False):
+    """Маршруты API; при ``async_api`` каталог и запись - async-представления (для ASGI)."""
+    if async_api:
+        catalog = async_views.catalog_bootstrap
+        services = async_views.service_list
+        doctors = async_views.doctor_list
+        appointment_create = async_views.appointment_create
+    else:
+        catalog = CatalogBootstrap.as_view()
+        services = ServiceList.as_view()
+        doctors = DoctorList.as_view()
+        appointment_create = AppointmentCreate.as_view()
+
+    return [
+        path('', home, name='home'),
+        path('metrics', metrics, name='metrics'),
+        path('api/catalog/', catalog, name='catalog'),
+        path('api/services/', services, name='service-list'),
+        path('api/doctors/', doctors, name='doctor-list'),
+        path('api/doctors/<int:pk>/slots/', DoctorSlots.as_view(), name='doctor-slots'),
+        path('api/schedule/', DoctorSchedule.as_view(), name='doctor-schedule'),
+
+        path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+        path('api/appointments/', appointment_create, name='appointment-create'),
+        path('api/appointments/batch/', AppointmentBatchCreate.as_view(), name='appointment-batch-create'),
+        path('api/appointments/search/', AppointmentSearch.as_view(), name='appointment-search'),
+
+    ]
+
+
+def build_urlconf(async_api=False):
+    """Модуль с маршрутами API - для ROOT_URLCONF в тестах и бенчмарках."""
+    module = ModuleType(f'api.urls.{"async" if async_api else "sync"}')
+    module.urlpatterns = build_urlpatterns(async_api)
+    return module
+
 
-]
\ No newline at end of file
+urlpatterns = build_urlpatterns(settings.ASYNC_API)
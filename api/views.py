@@ -1,33 +1,281 @@
 from rest_framework import generics, status, serializers  # Добавил импорт serializers
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from .models import Service, Doctor, Appointment
 from .serializers import (
     ServiceSerializer, DoctorSerializer,
-    AppointmentCreateSerializer
+    AppointmentCreateSerializer, AppointmentBatchSerializer, ScheduleQuerySerializer, SlotQuerySerializer,
+    AppointmentSearchSerializer, SearchQuerySerializer,
 )
+from .booking import BOOKING_SUCCESS_MESSAGE, SlotsUnavailable, SlotUnavailable
+from .daily_schedule import get_days
+from .scheduling import get_free_slots
+from .search import search
+from .catalog import CACHE_TIMEOUT, active_services, get_catalog_state, get_catalog_json, render_bootstrap
+from .metrics import registry
+from .pagination import NameCursorPagination
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 from django.shortcuts import render
 
 from datetime import date as datetime_date
+from urllib.parse import urlencode
+import hashlib
 
 
 
 def home(request):
+    # Секции услуг и врачей кэшируются в шаблоне по версии каталога;
+    # querysets ленивые и при попадании в кэш не выполняются
     services = Service.objects.filter(is_active=True)
     doctors = Doctor.objects.filter(is_active=True)
-    return render(request, 'clinic/index.html', {'services': services, 'doctors': doctors})
+    return render(request, 'clinic/index.html', {
+        'services': services,
+        'doctors': doctors,
+        'catalog_version': get_catalog_state()['version'],
+        'catalog_cache_timeout': CACHE_TIMEOUT,
+    })
 
-# Публичные: услуги и доктора
-class ServiceList(generics.ListAPIView):
+def metrics(request):
+    """Метрики запросов в текстовом формате Prometheus (см. api/middleware.py)."""
+    if not settings.PERF_METRICS:
+        raise Http404
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def catalog_variant(request, params, names, origin=False):
+    """
+    Часть ключа кэша из параметров запроса, от которых зависит ответ.
+    ``origin`` - в ответе абсолютные ссылки (картинки, страницы пагинации),
+    собранные из схемы и хоста запроса: ключ зависит и от них.
+    """
+    pairs = sorted((name, params[name]) for name in names if name in params)
+    if origin:
+        pairs.append(('origin', f'{request.scheme}://{request.get_host()}'))
+    return urlencode(pairs)
+
+
+def catalog_validators(kind, state, variant=''):
+    """ETag и Last-Modified ответа каталога для версии ``state``."""
+    etag = f'"{kind}-{state["version"]}'
+    if variant:
+        etag += '-' + hashlib.md5(variant.encode()).hexdigest()[:12]
+    etag += '"'
+    return etag, int(state['updated_at'].timestamp())
+
+
+def set_catalog_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Браузер хранит ответ, но каждый раз сверяет версию с сервером
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CatalogListMixin:
+    """
+    Отдает ответ из кэша каталога с ETag/Last-Modified по версии каталога.
+    Повторный запрос с If-None-Match/If-Modified-Since получает 304
+    без обращения к сериализатору.
+    """
+    catalog_kind = None
+    # Параметры запроса, от которых зависит ответ
+    variant_params = ()
+    # Ответ содержит абсолютные ссылки, собранные из запроса
+    origin_dependent = False
+
+    def get_cache_variant(self, request):
+        return catalog_variant(request, request.query_params, self.variant_params, self.origin_dependent)
+
+    def render_catalog(self, request, state):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        state = get_catalog_state()
+        variant = self.get_cache_variant(request)
+        etag, last_modified = catalog_validators(self.catalog_kind, state, variant)
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            content = get_catalog_json(
+                self.catalog_kind, lambda: self.render_catalog(request, state), state, variant
+            )
+            response = HttpResponse(content, content_type='application/json')
+        return set_catalog_headers(response, etag, last_modified)
+
+
+class SparseFieldsViewMixin:
+    """
+    ?fields=id,name,price сужает и вывод сериализатора, и SELECT (.only()).
+    Поля сортировки пагинации выбираются всегда.
+    """
+    always_selected = ('id', 'name')
+
+    def get_requested_fields(self):
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(self.get_serializer_class()().fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Неизвестные поля: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields:
+            serializer_fields = self.get_serializer_class()().fields
+            sources = {serializer_fields[name].source for name in fields}
+            concrete = {field.name for field in queryset.model._meta.concrete_fields}
+            queryset = queryset.only(*self.always_selected, *(sources & concrete))
+        return queryset
+
+
+class CatalogPageMixin(SparseFieldsViewMixin, CatalogListMixin):
+    pagination_class = NameCursorPagination
+    variant_params = ('cursor', 'page_size', 'fields')
+    origin_dependent = True
+
+    def render_catalog(self, request, state):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data).data
+
+
+# Публичные: услуги и доктора (отдаются из кэша каталога)
+class ServiceList(CatalogPageMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
-    queryset = Service.objects.filter(is_active=True)  # Добавил фильтр по активным
+    queryset = active_services()
     serializer_class = ServiceSerializer
+    catalog_kind = 'services'
 
 
-class DoctorList(generics.ListAPIView):
+class DoctorList(CatalogPageMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
-    queryset = Doctor.objects.filter(is_active=True)  # Добавил фильтр по активным
+    queryset = Doctor.objects.filter(is_active=True)
     serializer_class = DoctorSerializer
+    catalog_kind = 'doctors'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is None or 'services' in fields:
+            queryset = queryset.prefetch_related('services')
+        return queryset
+
+
+# Весь каталог одним запросом для главной страницы
+class CatalogBootstrap(CatalogListMixin, generics.GenericAPIView):
+    permission_classes = [AllowAny]
+    catalog_kind = 'bootstrap'
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    def render_catalog(self, request, state):
+        return render_bootstrap(state)
+
+
+# Свободное время врача для выбранной услуги
+class DoctorSlots(generics.RetrieveAPIView):
+    permission_classes = [AllowAny]
+    queryset = Doctor.objects.filter(is_active=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        doctor = self.get_object()
+        query = SlotQuerySerializer(data=request.query_params, context={'doctor': doctor})
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        service = query.validated_data['service']
+        slots = get_free_slots(
+            doctor, service,
+            query.validated_data['date_from'],
+            query.validated_data['date_to'],
+        )
+        return Response({
+            'doctor': doctor.id,
+            'service': service.id,
+            'duration': service.duration,
+            'slots': {day.isoformat(): times for day, times in slots.items()},
+        })
+
+
+class DoctorSchedule(generics.GenericAPIView):
+    """
+    Расписание врачей для регистратуры: записи и свободное время на день
+    (``?date=``, по умолчанию сегодня) или неделю с понедельника
+    (``?period=week``), всех активных врачей или одного (``?doctor=``).
+    Читается из материализованного ``DoctorDay``.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        query = ScheduleQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        date_from = query.validated_data['date_from']
+        date_to = query.validated_data['date_to']
+        doctor = query.validated_data.get('doctor')
+        doctors = [doctor] if doctor else list(Doctor.objects.filter(is_active=True).only('name', 'specialty'))
+        days = get_days([d.pk for d in doctors], date_from, date_to)
+        dates = sorted({day for _, day in days})
+
+        return Response({
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'doctors': [
+                {
+                    'id': d.pk,
+                    'name': d.name,
+                    'specialty': d.specialty,
+                    'days': [
+                        {'date': day.isoformat(), 'appointments': days[d.pk, day].appointments,
+                         'free': days[d.pk, day].free}
+                        for day in dates if (d.pk, day) in days
+                    ],
+                }
+                for d in doctors
+            ],
+        })
+
+
+class AppointmentSearch(generics.GenericAPIView):
+    """
+    Поиск записей для регистратуры: ``?q=`` - имя, email пациента, врач
+    (по началу слов) или телефон (по цифрам), ``?limit=`` - до 100
+    записей, новые первыми. Идет по FTS5-индексу (api/search.py).
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = AppointmentSearchSerializer
+
+    def get(self, request, *args, **kwargs):
+        query = SearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        appointments = search(
+            Appointment.objects.select_related('doctor', 'service'), query.validated_data['q'],
+        )[:query.validated_data['limit']]
+        return Response(self.get_serializer(appointments, many=True).data)
 
 
 # Создание записи (БЕЗ авторизации)
@@ -37,26 +285,18 @@ class AppointmentCreate(generics.CreateAPIView):
     serializer_class = AppointmentCreateSerializer
 
     def perform_create(self, serializer):
-        # Валидация: проверить пересечение времени у доктора
-        doctor = serializer.validated_data['doctor']
         date = serializer.validated_data['date']
-        time = serializer.validated_data['time']
-
-        # Проверяем, не занято ли время у этого врача
-        if Appointment.objects.filter(
-            doctor=doctor,
-            date=date,
-            time=time,
-            status__in=['confirmed', 'pending']  # Проверяем только активные записи
-        ).exists():
-            raise serializers.ValidationError("Это время уже занято у доктора. Пожалуйста, выберите другое время.")
 
         # Проверяем, что дата не в прошлом
         if date < datetime_date.today():
             raise serializers.ValidationError("Нельзя записаться на прошедшую дату.")
 
-        # Сохраняем запись со статусом "ожидает подтверждения"
-        serializer.save(status='pending')
+        # Проверка пересечений и сохранение выполняются атомарно,
+        # запись создается со статусом "ожидает подтверждения"
+        try:
+            serializer.save(status='pending')
+        except SlotUnavailable as e:
+            raise serializers.ValidationError(str(e))
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -64,12 +304,65 @@ class AppointmentCreate(generics.CreateAPIView):
             try:
                 self.perform_create(serializer)
                 # Успешный ответ
-                return Response({
-                    "message": "Запись успешно отправлена! Наш администратор свяжется с вами для подтверждения."
-                }, status=status.HTTP_201_CREATED)
+                return Response({"message": BOOKING_SUCCESS_MESSAGE}, status=status.HTTP_201_CREATED)
 
             except serializers.ValidationError as e:
                 # Ловим конкретную ошибку валидации из perform_create
                 return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class AppointmentBatchCreate(generics.GenericAPIView):
+    """
+    Несколько записей одним запросом (семья, план лечения):
+    ``{"appointments": [{...как для /api/appointments/...}, ...]}``.
+
+    Сохраняются все записи или ни одной. В ``results`` - итог по каждой
+    записи в порядке запроса: ``created``, ``invalid`` (с ``errors``),
+    ``conflict`` (время занято) или ``skipped`` (не сохранена из-за других).
+    """
+    permission_classes = [AllowAny]
+    serializer_class = AppointmentBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            # DRF отдает ошибки элементов списком или словарем {номер: ошибки},
+            # ошибки самого списка (нет, пустой, слишком длинный) - под non_field_errors
+            item_errors = serializer.errors.get('appointments')
+            if isinstance(item_errors, list):
+                item_errors = dict(enumerate(item_errors))
+            if not item_errors or not all(isinstance(index, int) for index in item_errors):
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'error': "Проверьте данные записей.",
+                'results': [
+                    {'index': index, 'status': 'invalid', 'errors': item_errors[index]}
+                    if item_errors.get(index) else {'index': index, 'status': 'skipped'}
+                    for index in range(len(request.data['appointments']))
+                ],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        count = len(serializer.validated_data['appointments'])
+        try:
+            serializer.save()
+        except SlotsUnavailable as e:
+            conflicts = set(e.indexes)
+            return Response({
+                'error': str(e),
+                'results': [
+                    {'index': index, 'status': 'conflict' if index in conflicts else 'skipped'}
+                    for index in range(count)
+                ],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except SlotUnavailable as e:
+            # Время заняли параллельно, после проверки
+            return Response({
+                'error': str(e),
+                'results': [{'index': index, 'status': 'skipped'} for index in range(count)],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'message': BOOKING_SUCCESS_MESSAGE,
+            'results': [{'index': index, 'status': 'created'} for index in range(count)],
+        }, status=status.HTTP_201_CREATED)
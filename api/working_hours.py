@@ -0,0 +1,105 @@
+"""
+Разбор и компиляция графика работы врача.
+
+``Doctor.working_hours`` - словарь вида ``{'пн': '09:00-18:00', 'вс': 'выходной'}``,
+смен в дне может быть несколько: ``'09:00-13:00, 14:00-18:00'``. При сохранении
+врача график компилируется в ``Doctor.compiled_schedule``:
+``{'0': [[540, 780], [840, 1080]], ...}`` - отсортированные непересекающиеся
+интервалы в минутах от начала суток по номеру дня недели (``date.weekday()``).
+Горячие пути (свободное время, расписание) работают только с компилированной
+формой и строки не разбирают.
+"""
+from django.core.exceptions import ValidationError
+
+# Ключи дней недели в порядке date.weekday()
+WEEKDAY_KEYS = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
+
+DAY_OFF = 'выходной'
+
+SHIFT_SEPARATORS = (',', ';')
+
+
+def parse_time(value):
+    """'09:30' -> 570 (минуты от начала суток)."""
+    hours, minutes = value.strip().split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def parse_day(value):
+    """
+    '09:00-13:00, 14:00-18:00' -> [(540, 780), (840, 1080)].
+
+    Бросает ValueError, если строка не разбирается или смены пересекаются.
+    """
+    if value is None or not value.strip() or value.strip().lower() == DAY_OFF:
+        return []
+
+    for separator in SHIFT_SEPARATORS[1:]:
+        value = value.replace(separator, SHIFT_SEPARATORS[0])
+
+    shifts = []
+    for part in value.split(SHIFT_SEPARATORS[0]):
+        start, end = part.split('-')
+        start, end = parse_time(start), parse_time(end)
+        if start >= end:
+            raise ValueError(part)
+        shifts.append((start, end))
+
+    shifts.sort()
+    for (_, previous_end), (next_start, _) in zip(shifts, shifts[1:]):
+        if next_start < previous_end:
+            raise ValueError(value)
+    return shifts
+
+
+def validate_working_hours(value):
+    if not isinstance(value, dict):
+        raise ValidationError('График работы должен быть словарем вида {"пн": "09:00-18:00"}.')
+
+    unknown = set(value) - set(WEEKDAY_KEYS)
+    if unknown:
+        raise ValidationError(
+            'Неизвестные дни недели: %(days)s. Допустимые: %(allowed)s.',
+            params={'days': ', '.join(sorted(unknown)), 'allowed': ', '.join(WEEKDAY_KEYS)},
+        )
+
+    for key, day in value.items():
+        try:
+            if day is not None and not isinstance(day, str):
+                raise ValueError(day)
+            parse_day(day)
+        except ValueError:
+            raise ValidationError(
+                'Некорректный график для "%(day)s": %(value)s. '
+                'Ожидается "ЧЧ:ММ-ЧЧ:ММ", несколько смен через запятую или "выходной".',
+                params={'day': key, 'value': day},
+            )
+
+
+def compile_working_hours(working_hours):
+    """
+    Компилирует ``working_hours`` в ``{'0': [[начало, конец], ...], ...}``.
+
+    Нераспознанные дни считаются выходными - старые данные не валидировались.
+    """
+    compiled = {}
+    for weekday, key in enumerate(WEEKDAY_KEYS):
+        value = (working_hours or {}).get(key) if isinstance(working_hours, dict) else None
+        try:
+            shifts = parse_day(value) if isinstance(value, str) else []
+        except ValueError:
+            shifts = []
+        compiled[str(weekday)] = [list(shift) for shift in shifts]
+    return compiled
+
+
+def shifts_for(compiled_schedule, weekday):
+    """Смены дня недели из компилированного графика: [(начало, конец), ...]."""
+    return [tuple(shift) for shift in (compiled_schedule or {}).get(str(weekday), [])]
@@ -0,0 +1,66 @@
+"""
+Очередь записи: транзакции записи на прием выполняются по одной в отдельном
+потоке процесса.
+
+SQLite допускает одну пишущую транзакцию на базу. Когда запросы пишут из
+многих потоков сразу, они ждут блокировку в busy-обработчике SQLite - он
+опрашивает ее с растущими паузами, так что при конкуренции пропускная
+способность падает, а после ``timeout`` запрос получает "database is
+locked". Поток записи берет транзакции из очереди по одной на своем
+постоянном соединении: внутри процесса ожидание - очередь, а не блокировка
+SQLite. Между процессами (несколько воркеров) транзакции по-прежнему
+упорядочивает блокировка SQLite.
+
+Транзакция в очереди короткая - только проверка времени и вставка
+(``api/booking.py``); разбор и проверка данных выполняются в потоке запроса.
+Если вызывающий уже в транзакции (тесты, вложенный вызов) или очередь
+выключена (``settings.BOOKING_WRITE_QUEUE``), функция выполняется на месте:
+из другого потока несохраненные данные транзакции не видны.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_jobs = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _work():
+    while True:
+        future, function, args, kwargs = _jobs.get()
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            # Соединение потока постоянное; закрывается по CONN_MAX_AGE или после ошибки.
+            # Ошибка здесь - ошибка этого вызова, поток записи продолжает работать
+            close_old_connections()
+            result = function(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+
+def submit(function, *args, **kwargs):
+    """Ставит вызов в очередь потока записи; возвращает ``Future``."""
+    global _writer
+    # Поток, который все-таки завершился, заменяем: иначе вызовы ждали бы вечно
+    if _writer is None or not _writer.is_alive():
+        with _writer_lock:
+            if _writer is None or not _writer.is_alive():
+                _writer = threading.Thread(target=_work, name='booking-writer', daemon=True)
+                _writer.start()
+    future = Future()
+    _jobs.put((future, function, args, kwargs))
+    return future
+
+
+def run(function, *args, **kwargs):
+    """Выполняет ``function`` в потоке записи и возвращает результат (или бросает ее исключение)."""
+    if not settings.BOOKING_WRITE_QUEUE or connection.in_atomic_block:
+        return function(*args, **kwargs)
+    return submit(function, *args, **kwargs).result()
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Каталог и запись на прием - async-представления (api/async_views.py)
+os.environ.setdefault('CLINIC_ASYNC_API', '1')
+# Запросы выполняются в разных потоках - постоянные соединения копились бы по потоку
+os.environ.setdefault('CLINIC_DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым - чтобы время запроса включало остальные middleware
+    'api.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,8 +83,60 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: транзакции записи сразу берут блокировку,
+            # конкурентные записи ждут своей очереди вместо ошибки
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Постоянные соединения (секунды); под ASGI запросы идут в разных
+        # потоках, и config/asgi.py выставляет 0
+        'CONN_MAX_AGE': int(os.environ.get('CLINIC_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # Тестовая БД в файле, чтобы потоки в тестах работали с одной базой
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
+
+# Выполняются на каждом новом соединении с SQLite (api/sqlite.py). Режим
+# журнала WAL хранится в файле базы и включается миграцией
+# (api/migrations/0014_sqlite_wal.py): иначе любая команда, открывшая
+# соединение (check, makemigrations), переписывала бы файл базы
+SQLITE_PRAGMAS = {
+    # В режиме WAL не теряет данные при падении процесса, fsync - только при checkpoint
+    'synchronous': 'NORMAL',
+    # Кэш страниц 64 МБ (отрицательное значение - в КБ)
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+# Записи на прием выполняются по одной в потоке записи процесса (api/write_queue.py)
+BOOKING_WRITE_QUEUE = os.environ.get('CLINIC_BOOKING_WRITE_QUEUE', '1') == '1'
+
+# Async-представления каталога и записи (api/async_views.py); включается
+# в config/asgi.py, под WSGI остаются синхронные DRF-представления
+ASYNC_API = os.environ.get('CLINIC_ASYNC_API') == '1'
+
+# Замер запросов (api/middleware.py): заголовок Server-Timing и метрики
+# Prometheus на /metrics. Выключенный middleware исключается из цепочки
+PERF_METRICS = os.environ.get('CLINIC_PERF_METRICS') == '1'
+# Токен для /metrics (Authorization: Bearer ...); без него - только сотрудникам
+METRICS_TOKEN = os.environ.get('CLINIC_METRICS_TOKEN', '')
+
+# Кэш каталога (api/catalog.py). LocMemCache живет внутри процесса: при
+# нескольких воркерах каждый заметит чужое изменение каталога только через
+# catalog.STATE_TIMEOUT секунд и строит ответы сам. Общий бэкенд (Redis,
+# Memcached) делает изменения видимыми сразу
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'clinic',
+    }
+}
+
 from datetime import timedelta
 
 REST_FRAMEWORK = {
@@ -21,166 +21,194 @@ function showMessage(text, type) {
     }, 5000);
 }
 
-// Загрузка услуг для главной страницы
-async function loadServices() {
-    try {
-        console.log('Загрузка услуг...');
-        const response = await fetch(API_BASE + 'services/');
-        console.log('Ответ сервера (услуги):', response.status);
+// Каталог (услуги, врачи и связи между ними) загружается один раз
+// и используется и для карточек, и для формы записи
+let catalog = null;
 
-        if (!response.ok) {
-            throw new Error(`Ошибка HTTP: ${response.status}`);
-        }
+async function loadCatalog() {
+    console.log('Загрузка каталога...');
+    const response = await fetch(API_BASE + 'catalog/');
+    console.log('Ответ сервера (каталог):', response.status);
 
-        const services = await response.json();
-        console.log('Получено услуг:', services.length);
+    if (!response.ok) {
+        throw new Error(`Ошибка HTTP: ${response.status}`);
+    }
 
-        const container = document.getElementById('servicesContainer');
+    catalog = await response.json();
+    console.log('Получено услуг:', catalog.services.length, 'врачей:', catalog.doctors.length);
+    return catalog;
+}
 
-        if (services.length === 0) {
-            container.innerHTML = `
-                <div class="col-12 text-center">
-                    <div class="alert alert-info">
-                        Услуги временно недоступны
-                    </div>
-                </div>
-            `;
-            return;
-        }
+function showLoadError(containerId, text) {
+    const container = document.getElementById(containerId);
+    if (!container) {
+        return;
+    }
+    container.innerHTML = `
+        <div class="col-12 text-center">
+            <div class="alert alert-warning">
+                ${text}
+            </div>
+        </div>
+    `;
+}
 
-        container.innerHTML = ''; // Очищаем спиннер
-
-        services.forEach(service => {
-            const col = document.createElement('div');
-            col.className = 'col-md-4 mb-4';
-            col.innerHTML = `
-                <div class="card h-100">
-                    <div class="card-body">
-                        <h5 class="card-title">${service.name}</h5>
-                        <p class="card-text">${service.description || 'Описание услуги'}</p>
-                        <div class="d-flex justify-content-between align-items-center">
-                            <span class="text-primary fw-bold">${service.price} руб.</span>
-                            <small class="text-muted">${service.duration || 30} мин.</small>
-                        </div>
-                    </div>
-                </div>
-            `;
-            container.appendChild(col);
-        });
+// Карточки услуг для главной страницы
+function renderServices(services) {
+    const container = document.getElementById('servicesContainer');
+    if (!container) {
+        return; // Карточки уже отрисованы сервером
+    }
 
-    } catch (error) {
-        console.error('Ошибка загрузки услуг:', error);
-        const container = document.getElementById('servicesContainer');
+    if (services.length === 0) {
         container.innerHTML = `
             <div class="col-12 text-center">
-                <div class="alert alert-warning">
-                    Не удалось загрузить услуги. Пожалуйста, обновите страницу.
+                <div class="alert alert-info">
+                    Услуги временно недоступны
                 </div>
             </div>
         `;
+        return;
     }
-}
-
-// Загрузка врачей для главной страницы
-async function loadDoctors() {
-    try {
-        console.log('Загрузка врачей...');
-        const response = await fetch(API_BASE + 'doctors/');
-        console.log('Ответ сервера (врачи):', response.status);
-
-        if (!response.ok) {
-            throw new Error(`Ошибка HTTP: ${response.status}`);
-        }
-
-        const doctors = await response.json();
-        console.log('Получено врачей:', doctors.length);
 
-        const container = document.getElementById('doctorsContainer');
-
-        if (doctors.length === 0) {
-            container.innerHTML = `
-                <div class="col-12 text-center">
-                    <div class="alert alert-info">
-                        Врачи временно недоступны
+    container.innerHTML = ''; // Очищаем спиннер
+
+    services.forEach(service => {
+        const col = document.createElement('div');
+        col.className = 'col-md-4 mb-4';
+        col.innerHTML = `
+            <div class="card h-100">
+                <div class="card-body">
+                    <h5 class="card-title">${service.name}</h5>
+                    <p class="card-text">${service.description || 'Описание услуги'}</p>
+                    <div class="d-flex justify-content-between align-items-center">
+                        <span class="text-primary fw-bold">${service.price} руб.</span>
+                        <small class="text-muted">${service.duration || 30} мин.</small>
                     </div>
                 </div>
-            `;
-            return;
-        }
+            </div>
+        `;
+        container.appendChild(col);
+    });
+}
 
-        container.innerHTML = ''; // Очищаем спиннер
-
-        doctors.forEach(doctor => {
-            const col = document.createElement('div');
-            col.className = 'col-md-6 col-lg-4 mb-4';
-            col.innerHTML = `
-                <div class="card h-100">
-                    <div class="card-body text-center">
-                        <div class="doctor-photo mb-3">
-                            <i class="fas fa-user-md fa-3x text-primary"></i>
-                        </div>
-                        <h5 class="card-title">${doctor.name}</h5>
-                        <h6 class="card-subtitle mb-2 text-muted">${doctor.specialty}</h6>
-                        <p class="card-text">
-                            <small>Опыт работы: ${doctor.experience || 0} лет</small>
-                        </p>
-                        <p class="card-text small">${doctor.description || 'Опытный специалист'}</p>
-                    </div>
-                </div>
-            `;
-            container.appendChild(col);
-        });
+// Карточки врачей для главной страницы
+function renderDoctors(doctors) {
+    const container = document.getElementById('doctorsContainer');
+    if (!container) {
+        return; // Карточки уже отрисованы сервером
+    }
 
-    } catch (error) {
-        console.error('Ошибка загрузки врачей:', error);
-        const container = document.getElementById('doctorsContainer');
+    if (doctors.length === 0) {
         container.innerHTML = `
             <div class="col-12 text-center">
-                <div class="alert alert-warning">
-                    Не удалось загрузить врачей. Пожалуйста, обновите страницу.
+                <div class="alert alert-info">
+                    Врачи временно недоступны
                 </div>
             </div>
         `;
+        return;
     }
+
+    container.innerHTML = ''; // Очищаем спиннер
+
+    doctors.forEach(doctor => {
+        const col = document.createElement('div');
+        col.className = 'col-md-6 col-lg-4 mb-4';
+        col.innerHTML = `
+            <div class="card h-100">
+                <div class="card-body text-center">
+                    <div class="doctor-photo mb-3">
+                        <i class="fas fa-user-md fa-3x text-primary"></i>
+                    </div>
+                    <h5 class="card-title">${doctor.name}</h5>
+                    <h6 class="card-subtitle mb-2 text-muted">${doctor.specialty}</h6>
+                    <p class="card-text">
+                        <small>Опыт работы: ${doctor.experience || 0} лет</small>
+                    </p>
+                    <p class="card-text small">${doctor.description || 'Опытный специалист'}</p>
+                </div>
+            </div>
+        `;
+        container.appendChild(col);
+    });
 }
 
-// Загрузка услуг для формы записи
-async function loadServicesForForm() {
-    try {
-        const response = await fetch(API_BASE + 'services/');
-        const services = await response.json();
-        const select = document.getElementById('serviceSelect');
+// Услуги для формы записи
+function fillServiceSelect(services) {
+    const select = document.getElementById('serviceSelect');
 
-        select.innerHTML = '<option value="">-- Выберите услугу --</option>';
-        services.forEach(service => {
-            const option = document.createElement('option');
-            option.value = service.id;
-            option.textContent = `${service.name} (${service.price} руб.)`;
-            select.appendChild(option);
-        });
-    } catch (error) {
-        console.error('Ошибка загрузки услуг для формы:', error);
-        showMessage('Ошибка загрузки списка услуг', 'danger');
+    select.innerHTML = '<option value="">-- Выберите услугу --</option>';
+    services.forEach(service => {
+        const option = document.createElement('option');
+        option.value = service.id;
+        option.textContent = `${service.name} (${service.price} руб.)`;
+        select.appendChild(option);
+    });
+}
+
+// Врачи для формы записи: если услуга выбрана - только те, кто ее оказывает
+function fillDoctorSelect() {
+    const select = document.getElementById('doctorSelect');
+    const selected = select.value;
+    const serviceId = parseInt(document.getElementById('serviceSelect').value);
+
+    const doctors = catalog.doctors.filter(doctor =>
+        !serviceId || (catalog.doctor_services[doctor.id] || []).includes(serviceId)
+    );
+
+    select.innerHTML = '<option value="">-- Выберите врача --</option>';
+    doctors.forEach(doctor => {
+        const option = document.createElement('option');
+        option.value = doctor.id;
+        option.textContent = `${doctor.name} - ${doctor.specialty}`;
+        select.appendChild(option);
+    });
+
+    if (doctors.some(doctor => String(doctor.id) === selected)) {
+        select.value = selected;
     }
 }
 
-// Загрузка врачей для формы записи
-async function loadDoctorsForForm() {
+// Загрузка свободного времени врача для выбранной услуги и даты
+async function loadSlots() {
+    const select = document.getElementById('timeInput');
+    const doctor = document.getElementById('doctorSelect').value;
+    const service = document.getElementById('serviceSelect').value;
+    const date = document.getElementById('dateInput').value;
+
+    if (!doctor || !service || !date) {
+        select.innerHTML = '<option value="">-- Выберите врача, услугу и дату --</option>';
+        return;
+    }
+
     try {
-        const response = await fetch(API_BASE + 'doctors/');
-        const doctors = await response.json();
-        const select = document.getElementById('doctorSelect');
+        select.innerHTML = '<option value="">Загрузка...</option>';
+        const params = new URLSearchParams({service: service, date_from: date, date_to: date});
+        const response = await fetch(`${API_BASE}doctors/${doctor}/slots/?${params}`);
+        if (!response.ok) {
+            throw new Error(`Ошибка HTTP: ${response.status}`);
+        }
+
+        const data = await response.json();
+        const times = data.slots[date] || [];
 
-        select.innerHTML = '<option value="">-- Выберите врача --</option>';
-        doctors.forEach(doctor => {
+        if (times.length === 0) {
+            select.innerHTML = '<option value="">Нет свободного времени</option>';
+            return;
+        }
+
+        select.innerHTML = '<option value="">-- Выберите время --</option>';
+        times.forEach(time => {
             const option = document.createElement('option');
-            option.value = doctor.id;
-            option.textContent = `${doctor.name} - ${doctor.specialty}`;
+            option.value = time;
+            option.textContent = time;
             select.appendChild(option);
         });
     } catch (error) {
-        console.error('Ошибка загрузки врачей для формы:', error);
-        showMessage('Ошибка загрузки списка врачей', 'danger');
+        console.error('Ошибка загрузки свободного времени:', error);
+        select.innerHTML = '<option value="">-- Выберите врача, услугу и дату --</option>';
+        showMessage('Ошибка загрузки свободного времени', 'danger');
     }
 }
 
@@ -232,6 +260,7 @@ document.getElementById('appointmentForm').addEventListener('submit', async (e)
         if (response.ok) {
             showMessage('✅ ' + result.message, 'success');
             document.getElementById('appointmentForm').reset();
+            loadSlots();
             // Закрываем модальное окно через 2 секунды
             setTimeout(() => {
                 const modal = bootstrap.Modal.getInstance(document.getElementById('appointmentModal'));
@@ -241,6 +270,8 @@ document.getElementById('appointmentForm').addEventListener('submit', async (e)
             }, 2000);
         } else {
             showMessage('❌ ' + (result.error || result.detail || 'Ошибка при отправке'), 'danger');
+            // Время могли занять, пока пациент заполнял форму
+            loadSlots();
         }
     } catch (error) {
         console.error('Ошибка:', error);
@@ -252,19 +283,38 @@ document.getElementById('appointmentForm').addEventListener('submit', async (e)
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Страница загружена, начинаем загрузку данных...');
 
-    // Загружаем данные для главной страницы
-    loadServices();
-    loadDoctors();
+    // Один запрос каталога для карточек и для формы записи
+    loadCatalog()
+        .then(data => {
+            renderServices(data.services);
+            renderDoctors(data.doctors);
+            fillServiceSelect(data.services);
+            fillDoctorSelect();
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки каталога:', error);
+            showLoadError('servicesContainer', 'Не удалось загрузить услуги. Пожалуйста, обновите страницу.');
+            showLoadError('doctorsContainer', 'Не удалось загрузить врачей. Пожалуйста, обновите страницу.');
+            showMessage('Ошибка загрузки списка услуг и врачей', 'danger');
+        });
 
-    // Загружаем данные для формы
-    loadServicesForForm();
-    loadDoctorsForForm();
+    // При выборе услуги оставляем только врачей, которые ее оказывают
+    document.getElementById('serviceSelect').addEventListener('change', () => {
+        if (catalog) {
+            fillDoctorSelect();
+        }
+    });
 
     // Устанавливаем минимальную дату (завтра)
     const tomorrow = new Date();
     tomorrow.setDate(tomorrow.getDate() + 1);
     document.getElementById('dateInput').min = tomorrow.toISOString().split('T')[0];
 
+    // Свободное время обновляем при смене врача, услуги или даты
+    ['doctorSelect', 'serviceSelect', 'dateInput'].forEach(id => {
+        document.getElementById(id).addEventListener('change', loadSlots);
+    });
+
     // Плавная прокрутка для навигации
     document.querySelectorAll('a[href^="#"]').forEach(anchor => {
         anchor.addEventListener('click', function (e) {